@@ -27,6 +27,8 @@ export default function ChatBox() {
   const [myDataClicked, setMyDataClicked] = useState(false);
   const messagesEndRef = useRef(null);
   const containerRef = useRef(null);
+  // Identifies this chat window so the backend keeps a separate conversation
+  const sessionIdRef = useRef(crypto.randomUUID());
   const hasUserPrompt = chatHistory.some((m) => m.sender === "user");
 
   // Fetch intro message on mount
@@ -317,7 +319,7 @@ export default function ChatBox() {
       const res = await fetch("/chat", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ query: trimmed }),
+        body: JSON.stringify({ query: trimmed, session_id: sessionIdRef.current }),
       });
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
 
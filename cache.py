@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+"""Two-tier answer cache for :func:`chatbot.handle_query`.
+
+Entries are keyed on ``(normalized question, data version)`` where the data
+version is :func:`db.get_data_version`.  Because the version changes every
+time the DuckDB file is rewritten (``load_data.py``, ``dbt run``), stale
+answers are never served; they are pruned the first time a new version is
+seen.
+
+The in-memory tier is an LRU with a TTL.  An optional SQLite tier (enabled by
+pointing ``KYDXBOT_ANSWER_CACHE_DISK`` at a file) is shared by every uvicorn
+worker on the host.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from .cache_store import CacheStore
+
+CACHE_SIZE = int(os.getenv("KYDXBOT_ANSWER_CACHE_SIZE", "256"))
+CACHE_TTL = float(os.getenv("KYDXBOT_ANSWER_CACHE_TTL", "3600"))
+CACHE_DISK = os.getenv("KYDXBOT_ANSWER_CACHE_DISK", "")
+
+
+def _reply_is_valid(reply: str) -> bool:
+    """Reject cached table replies whose PNG has since been deleted."""
+    if reply.startswith("TABLE:"):
+        return Path(reply[len("TABLE:"):]).exists()
+    return True
+
+
+class AnswerCache:
+    """LRU + TTL cache of replies with an optional shared SQLite tier."""
+
+    def __init__(
+        self,
+        maxsize: int = CACHE_SIZE,
+        ttl: float = CACHE_TTL,
+        disk_path: str | os.PathLike | None = CACHE_DISK or None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._store = CacheStore(
+            "answer cache",
+            "answers",
+            keys={"question": "TEXT", "version": "TEXT"},
+            values={"reply": "TEXT"},
+            disk_path=disk_path,
+            maxsize=maxsize,
+            ttl=ttl,
+            valid=_reply_is_valid,
+        )
+        self._lock = threading.Lock()
+        self._version: str | None = None
+
+    @property
+    def disk_path(self) -> Path | None:
+        return self._store.disk_path
+
+    def _check_version(self, version: str) -> None:
+        """Drop everything cached for an older data version."""
+        with self._lock:
+            if self._version == version:
+                return
+            changed = self._version is not None
+            self._version = version
+        self._store.clear_memory()
+        if changed:
+            self._store.delete_where(
+                "version != ? OR created < ?", (version, time.time() - self.ttl)
+            )
+
+    def get(self, question: str, version: str) -> str | None:
+        """Return the cached reply for ``question`` at ``version`` or ``None``."""
+        self._check_version(version)
+        return self._store.get((question, version))
+
+    def put(self, question: str, version: str, reply: str) -> None:
+        """Store ``reply`` for ``question`` at ``version`` in every tier."""
+        self._check_version(version)
+        self._store.put((question, version), reply)
+
+    def clear(self) -> None:
+        """Forget every cached reply, including the disk tier."""
+        self._store.clear()
+
+    def stats(self) -> dict:
+        return self._store.stats()
+
+
+__all__ = ["AnswerCache"]
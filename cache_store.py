@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+"""SQLite table with an in-memory LRU in front, shared by the caches.
+
+:class:`cache.AnswerCache`, :class:`embedding_cache.EmbeddingCache` and
+:class:`sql_cache.SqlCache` differ only in their table, key columns and how a
+value maps to columns (``encode``/``decode``); :class:`CacheStore` does the
+rest.  The disk tier is optional (``disk_path=None`` keeps memory only) and is
+shared by every uvicorn worker on the host.  WAL mode is a property of the
+database file, so it is switched on once when the table is created rather
+than on every connection.  Disk errors are logged and treated as misses.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+# Bound parameters per statement; SQLite builds before 3.32 allow only 999
+_MAX_PARAMS = 900
+
+
+class CacheStore:
+    """``key → value`` LRU (with optional TTL) over an optional SQLite table.
+
+    ``keys`` and ``values`` map column names to SQL types; a key is the tuple
+    of its key columns.  ``encode`` turns a value into its value columns and
+    ``decode`` turns them back.  With ``created`` the table also records when
+    each row was written, and ``ttl`` then hides older rows.  ``maxsize`` is
+    the number of values kept in memory (``0`` keeps none).  ``valid`` can
+    reject a cached value, which is then treated as a miss.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        table: str,
+        keys: dict[str, str],
+        values: dict[str, str],
+        disk_path: str | os.PathLike | None = None,
+        maxsize: int = 1024,
+        ttl: float | None = None,
+        created: bool = False,
+        encode: Callable[[Any], tuple] = lambda value: (value,),
+        decode: Callable[[tuple], Any] = lambda row: row[0],
+        valid: Callable[[Any], bool] = lambda value: True,
+        without_rowid: bool = False,
+    ):
+        self.name = name
+        self.table = table
+        self.key_columns = tuple(keys)
+        self.value_columns = tuple(values)
+        self.disk_path = Path(disk_path) if disk_path else None
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.created = created or ttl is not None
+        self._encode = encode
+        self._decode = decode
+        self._valid = valid
+        self._lock = threading.Lock()
+        # key -> (monotonic expiry or None, value)
+        self._entries: OrderedDict[tuple, tuple[float | None, Any]] = OrderedDict()
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        if self.disk_path is not None:
+            self._init_disk(keys, values, without_rowid)
+
+    # ── disk tier ────────────────────────────────────────────────────────────
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection to the disk tier, committed when the block exits."""
+        con = sqlite3.connect(str(self.disk_path), timeout=5)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def _init_disk(self, keys: dict[str, str], values: dict[str, str], without_rowid: bool) -> None:
+        columns = [f" {c} {t} NOT NULL," for c, t in {**keys, **values}.items()]
+        if self.created:
+            columns.append(" created REAL NOT NULL,")
+        try:
+            self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.connect() as con:
+                con.execute("PRAGMA journal_mode=WAL")
+                con.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                    + "".join(columns)
+                    + f" PRIMARY KEY ({', '.join(self.key_columns)}))"
+                    + (" WITHOUT ROWID" if without_rowid else "")
+                )
+        except Exception as e:  # noqa: BLE001
+            print(f"{self.name} disk init error", e)
+            self.disk_path = None
+
+    def _fresh(self) -> tuple[str, tuple]:
+        if self.ttl is None:
+            return "", ()
+        return " AND created >= ?", (time.time() - self.ttl,)
+
+    def _disk_get(self, key: tuple) -> Any | None:
+        where = " AND ".join(f"{c} = ?" for c in self.key_columns)
+        fresh, params = self._fresh()
+        try:
+            with self.connect() as con:
+                row = con.execute(
+                    f"SELECT {', '.join(self.value_columns)} FROM {self.table}"
+                    f" WHERE {where}{fresh}",
+                    (*key, *params),
+                ).fetchone()
+        except Exception as e:  # noqa: BLE001
+            print(f"{self.name} disk read error", e)
+            return None
+        return self._decode(row) if row else None
+
+    def _row(self, key: tuple, value: Any) -> tuple:
+        row = (*key, *self._encode(value))
+        return (*row, time.time()) if self.created else row
+
+    def _disk_put(self, key: tuple, value: Any) -> None:
+        columns = self.key_columns + self.value_columns + (("created",) if self.created else ())
+        try:
+            with self.connect() as con:
+                con.execute(
+                    f"INSERT OR REPLACE INTO {self.table} ({', '.join(columns)})"
+                    f" VALUES ({', '.join('?' * len(columns))})",
+                    self._row(key, value),
+                )
+        except Exception as e:  # noqa: BLE001
+            print(f"{self.name} disk write error", e)
+
+    def _disk_get_many(self, keys: list[tuple]) -> dict[tuple, Any]:
+        n = len(self.key_columns)
+        columns = ", ".join(self.key_columns)
+        fresh, params = self._fresh()
+        found = {}
+        try:
+            with self.connect() as con:
+                step = max(1, (_MAX_PARAMS - len(params)) // n)
+                for i in range(0, len(keys), step):
+                    chunk = keys[i:i + step]
+                    rows = ", ".join([f"({', '.join('?' * n)})"] * len(chunk))
+                    for row in con.execute(
+                        f"SELECT {columns}, {', '.join(self.value_columns)} FROM {self.table}"
+                        f" WHERE ({columns}) IN (VALUES {rows}){fresh}",
+                        (*(k for key in chunk for k in key), *params),
+                    ):
+                        found[tuple(row[:n])] = self._decode(row[n:])
+        except Exception as e:  # noqa: BLE001
+            print(f"{self.name} disk read error", e)
+        return found
+
+    def _disk_put_many(self, items: list[tuple[tuple, Any]]) -> None:
+        columns = self.key_columns + self.value_columns + (("created",) if self.created else ())
+        try:
+            with self.connect() as con:
+                con.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} ({', '.join(columns)})"
+                    f" VALUES ({', '.join('?' * len(columns))})",
+                    [self._row(key, value) for key, value in items],
+                )
+        except Exception as e:  # noqa: BLE001
+            print(f"{self.name} disk write error", e)
+
+    def delete_where(self, where: str, params: tuple = ()) -> None:
+        """Delete the disk rows matching the SQL condition ``where``."""
+        if self.disk_path is None:
+            return
+        try:
+            with self.connect() as con:
+                con.execute(f"DELETE FROM {self.table} WHERE {where}", params)
+        except Exception as e:  # noqa: BLE001
+            print(f"{self.name} disk delete error", e)
+
+    def items(self) -> list[tuple[tuple, Any]]:
+        """Every ``(key, value)`` on disk (fresh rows only under a TTL)."""
+        if self.disk_path is None:
+            return []
+        fresh, params = self._fresh()
+        columns = ", ".join(self.key_columns + self.value_columns)
+        n = len(self.key_columns)
+        try:
+            with self.connect() as con:
+                rows = con.execute(
+                    f"SELECT {columns} FROM {self.table} WHERE 1 = 1{fresh}", params
+                ).fetchall()
+        except Exception as e:  # noqa: BLE001
+            print(f"{self.name} disk read error", e)
+            return []
+        return [(tuple(row[:n]), self._decode(row[n:])) for row in rows]
+
+    # ── memory tier ──────────────────────────────────────────────────────────
+    def _remember(self, key: tuple, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _memory_get(self, key: tuple) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if (expires is None or expires > time.monotonic()) and self._valid(value):
+                self._entries.move_to_end(key)
+                self.counts["memory_hits"] += 1
+                return value
+            del self._entries[key]
+        return None
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # ── public API ───────────────────────────────────────────────────────────
+    def get(self, key: tuple) -> Any | None:
+        """Return the value cached for ``key`` or ``None``."""
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        if self.disk_path is not None:
+            value = self._disk_get(key)
+            if value is not None and self._valid(value):
+                self._remember(key, value)
+                with self._lock:
+                    self.counts["disk_hits"] += 1
+                return value
+        with self._lock:
+            self.counts["misses"] += 1
+        return None
+
+    def put(self, key: tuple, value: Any) -> None:
+        """Store ``value`` for ``key`` in every tier."""
+        self._remember(key, value)
+        if self.disk_path is not None:
+            self._disk_put(key, value)
+        with self._lock:
+            self.counts["stores"] += 1
+
+    def get_many(self, keys: Iterable[tuple]) -> list[Any | None]:
+        """The value cached for each of ``keys`` (``None`` when missing),
+        reading every memory miss from disk in one query."""
+        keys = list(keys)
+        out = [self._memory_get(key) for key in keys]
+        missing = list(dict.fromkeys(k for k, v in zip(keys, out) if v is None))
+        found = self._disk_get_many(missing) if missing and self.disk_path is not None else {}
+        found = {k: v for k, v in found.items() if self._valid(v)}
+        for key, value in found.items():
+            self._remember(key, value)
+        out = [v if v is not None else found.get(k) for k, v in zip(keys, out)]
+        with self._lock:
+            self.counts["disk_hits"] += sum(1 for k in keys if k in found)
+            self.counts["misses"] += sum(1 for v in out if v is None)
+        return out
+
+    def put_many(self, items: Iterable[tuple[tuple, Any]]) -> None:
+        """Store every ``(key, value)`` in every tier, on disk in one transaction."""
+        items = list(items)
+        for key, value in items:
+            self._remember(key, value)
+        if items and self.disk_path is not None:
+            self._disk_put_many(items)
+        with self._lock:
+            self.counts["stores"] += len(items)
+
+    def delete(self, key: tuple) -> None:
+        """Forget ``key`` in every tier."""
+        with self._lock:
+            self._entries.pop(key, None)
+        self.delete_where(" AND ".join(f"{c} = ?" for c in self.key_columns), key)
+
+    def clear(self) -> None:
+        """Forget everything, including the disk tier."""
+        self.clear_memory()
+        self.delete_where("1 = 1")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counts,
+                "entries": len(self._entries),
+                "disk": str(self.disk_path) if self.disk_path else None,
+            }
+
+
+__all__ = ["CacheStore"]
@@ -2,12 +2,25 @@
 
 import os, datetime
 import numpy as np
-from .db import get_engine
-from .pinecone_utils import get_embedding, index
-from .preloaded_questions import is_similar
-from sqlalchemy import text
-from typing import List, Tuple
-import re, math, json
+from .db import DUCKDB_PATH, QueryResult, get_engine, get_data_version, get_pool
+from .pinecone_utils import DEBUG_EMBEDDINGS, describe_embedding, get_embedding, index
+from .preloaded_questions import normalize_question
+from .coalesce import SingleFlight
+from .dimension_cache import get_dimension_cache
+from .embedding_cache import get_embedding_cache
+from .lexical_index import HYBRID_CANDIDATES, get_lexical_index
+from .metadata_filter import infer_filter
+from .cache import AnswerCache
+from .history_store import read_tail
+from .session_memory import DEFAULT_SESSION, HistoryWriter, SessionMemory
+from .schema_context import get_schema_context
+from .sql_cache import get_sql_cache
+from .sql_guard import SqlRejected, get_sql_guard
+from .intent_templates import get_intent_matcher
+from .router import get_router
+from sqlalchemy import bindparam, text
+from typing import Callable, List, Tuple
+import re, json
 from openai import OpenAI
 from pathlib import Path
 from io import StringIO
@@ -49,22 +62,38 @@ except Exception:
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Progress callback used by streaming clients: ``on_event(name, data)``
+EventCallback = Callable[[str, dict], None]
 
-def load_recent_history(limit: int = 3) -> list[dict]:
+
+def _emit(on_event: EventCallback | None, name: str, **data) -> None:
+    """Report a pipeline stage to ``on_event`` without ever failing the query."""
+    if on_event is None:
+        return
+    try:
+        on_event(name, data)
+    except Exception as e:  # noqa: BLE001
+        print("event callback error", e)
+
+
+# Recent exchanges per chat session, persisted in the background
+_sessions = SessionMemory()
+_history_writer = HistoryWriter()
+
+
+def load_recent_history(limit: int = 3, session_id: str | None = None) -> list[dict]:
     """Return the last ``limit`` conversation entries.
 
-    Each entry contains ``query_text`` and ``retrieved_response``.  If the
-    history file is missing or invalid an empty list is returned.
+    Each entry contains ``query_text`` and ``retrieved_response``.  With a
+    ``session_id`` the entries come from that session's in-memory buffer;
+    otherwise only the tail of the global history store is read.  If it is
+    missing or unreadable an empty list is returned.
     """
 
-    path = Path("chatbot_responses.json")
-    if not path.exists():
-        return []
+    if session_id is not None:
+        return _sessions.recent(session_id, limit)
     try:
-        data = json.loads(path.read_text())
-        if not isinstance(data, list):
-            return []
-        return data[-limit:]
+        return read_tail(limit)
     except Exception:
         return []
 
@@ -120,10 +149,17 @@ def _maybe_convert_text_table(text: str) -> str:
     return text
 
 
-def call_openai_fallback(user_question: str, history: list[dict] | None = None) -> str:
+def call_openai_fallback(
+    user_question: str,
+    history: list[dict] | None = None,
+    on_token: Callable[[str], None] | None = None,
+) -> str:
     """
     If SQL or Pinecone fails, fall back to a direct OpenAI completion
     using the classic completions.create(...) endpoint.
+
+    When ``on_token`` is given the completion is streamed and each text
+    fragment is passed to it as soon as it arrives.
     """
     try:
         client = OpenAI()
@@ -142,13 +178,29 @@ def call_openai_fallback(user_question: str, history: list[dict] | None = None)
 
         messages.append({"role": "user", "content": user_question})
 
-        completion = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=messages,
-        )
+        if on_token is not None:
+            parts = []
+            stream = client.chat.completions.create(
+                model="gpt-4.1",
+                messages=messages,
+                stream=True,
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                piece = chunk.choices[0].delta.content
+                if piece:
+                    parts.append(piece)
+                    on_token(piece)
+            reply = "".join(parts).strip()
+        else:
+            completion = client.chat.completions.create(
+                model="gpt-4.1",
+                messages=messages,
+            )
 
-        # Extract the text portion of the first choice
-        reply = completion.choices[0].message.content.strip()
+            # Extract the text portion of the first choice
+            reply = completion.choices[0].message.content.strip()
         reply = _maybe_convert_text_table(reply)
         return reply
 
@@ -180,208 +232,219 @@ def is_data_question(query_text: str) -> bool:
     - "What's the average order value?"
     - "List employees with more than 5 sales this quarter."
 
-    When such keywords appear, the question is routed through the SQLAgent
-    chain (LangChain → DuckDB) rather than the semantic search fallback.
+    Such questions are routed through the SQLAgent chain (LangChain → DuckDB)
+    rather than the semantic search fallback; see :mod:`router`.
     """
-
-    q = query_text.lower()
-    data_keywords = [
-        "average", "sum(", "count(", "how many", "what is", "list",
-        "top", "highest", "lowest", "per", "between", "profit",
-        "sales", "customers", "products", "revenue", "orders",
-        "invoices", "inventory", "expenses", "transactions", "employees",
-        "payroll", "income", "metrics",
-        # Consider references to generic data or database terms
-        "database", "duckdb", "dataset", "datasets", "db",
-        "loaded data", "imported data", "shared data", "the data",
-    ]
-    if any(kw in q for kw in data_keywords):
-        return True
-
-    try:
-        return is_similar(query_text)
-    except Exception:
-        return False
+    return get_router().route(query_text).is_data
 
 
 def is_db_path_question(query_text: str) -> bool:
     """Return True if the user asks for the database file location."""
-    q = query_text.lower()
-    keywords = [
-        "db path",
-        "database path",
-        "path to database",
-        "where is the database",
-        "database location",
-        "path to db",
-        "where is your db",
-        "file path",
-        "database file",
+    return get_router().is_db_path_question(query_text)
+
+def _infer_search_filter(query_text: str) -> dict | None:
+    """Metadata filter implied by the question (source, category, country)."""
+    categories: list = []
+    countries: list = []
+    cache = get_dimension_cache()
+    if cache is not None:
+        try:
+            categories = cache.distinct("products", "product_category")
+            countries = cache.distinct("customers", "customer_country")
+        except Exception as e:  # noqa: BLE001
+            print("search filter values error", e)
+    return infer_filter(query_text, categories, countries)
+
+
+def _search_hits(query_text: str, top_k: int, flt: dict | None) -> list[tuple]:
+    """Lexical fast path, else vector query fused with lexical scores."""
+    lexical = get_lexical_index()
+    lexical_result = lexical.search(query_text, filter=flt)
+    hits = lexical.fast_path(lexical_result, top_k)
+    if hits is not None:
+        return hits
+
+    # Embed the query (get_embedding validates dim/finiteness)
+    q_emb = get_embedding(query_text)
+    if DEBUG_EMBEDDINGS:
+        print(">>> query embedding", describe_embedding(q_emb))
+
+    # Pull extra vector candidates when there are lexical scores to fuse
+    pool = top_k * HYBRID_CANDIDATES if lexical_result.best > 0 else top_k
+    kwargs = {"filter": flt} if flt else {}
+    response = index.query(vector=q_emb.tolist(), top_k=pool, include_metadata=True, **kwargs)
+    matches = getattr(response, "matches", None) or response.get("matches", [])
+    vector_hits = [
+        (
+            m.id,
+            getattr(m, "score", m.get("score", 0.0)),
+            m.metadata if hasattr(m, "metadata") else m.get("metadata", {}),
+        )
+        for m in matches
     ]
-    return any(kw in q for kw in keywords)
+    return lexical.fuse(vector_hits, lexical_result, top_k)
 
-def handle_semantic_search(query_text: str, top_k: int = 3) -> str:
+
+def handle_semantic_search(query_text: str, top_k: int = 3, filter: dict | None = None) -> str:
     """
-    1) Embed the query  
-    2) Query Pinecone → top_k matches  
-    3) If ID starts with 'cust_' → fetch that customer row via SQLAlchemy engine  
-    4) If ID starts with 'prod_' → fetch that product row via SQLAlchemy engine  
-    5) Return a plain‐text summary (one line per match)
+    1) Pick a metadata filter (``filter``, or one inferred from the question:
+       customers vs products vs distribution centers, category, country) that
+       the lexical and vector indexes apply before scoring
+    2) Score the query against the local lexical (TF-IDF) index; if one
+       record clearly wins, answer from it without embedding the query
+    3) Otherwise embed the query, query Pinecone and fuse the vector scores
+       with the lexical ones
+    4) Group match IDs by prefix ('cust_', 'prod_', 'dc_') and hydrate the
+       rows from the in-memory dimension cache  
+    5) Return a plain‐text summary (one line per match, in score order)
     """
-    # ── 1) Compute the embedding vector for query_text ─────────────────────────────
-    q_emb = get_embedding(query_text)
-    
-    if hasattr(q_emb, "tolist"):
-        q_emb = q_emb.tolist()
+    # ── 1–3) Retrieve, retrying unfiltered if an inferred filter was too narrow
+    flt = filter if filter is not None else _infer_search_filter(query_text)
+    hits = _search_hits(query_text, top_k, flt)
+    if not hits and flt and filter is None:
+        hits = _search_hits(query_text, top_k, None)
 
-    # 2) Print length & types
-    print(f">>> q_emb length = {len(q_emb)}")
-    for i, x in enumerate(q_emb[:5]):
-        print(f">>> q_emb[{i}] = {x} ({type(x)})")
+    if not hits:
+        return "No relevant customers or products found."
 
-    # 3) Check NaN/Inf
-    bad = [i for i, x in enumerate(q_emb) if isinstance(x, float) and (math.isnan(x) or math.isinf(x))]
-    if bad:
-        print(f">>> Found invalid entries (NaN/Inf) at indices: {bad[:10]} …")
+    # ── 4) Group the match IDs by table (cust_/prod_/dc_) ───────────────────────
+    parsed: list[tuple] = []
+    wanted: dict[str, set[int]] = {}
+    for mid, score, meta in hits:
+        prefix = next((p for p in _MATCH_LOOKUPS if mid.startswith(p)), None)
+        if prefix is None:
+            # Fallback if Pinecone returns an unexpected ID format
+            parsed.append((None, mid, score, meta))
+            continue
+        try:
+            key = int(mid.split("_", 1)[1])
+        except ValueError:
+            parsed.append((prefix, mid, score, meta or {}))
+            continue
+        parsed.append((prefix, key, score, None))
+        wanted.setdefault(prefix, set()).add(key)
+
+    # Hydrate from the in-memory dimension cache (one IN query per table on a
+    # single connection if the cache is unavailable)
+    found: dict[str, dict[int, tuple]] = {}
+    if wanted:
+        try:
+            found = _lookup_from_cache(wanted)
+        except Exception as e:  # noqa: BLE001
+            print("dimension cache lookup error", e)
+            found = _lookup_from_db(wanted)
 
-    # 4) Cast to float
-    try:
-        q_emb = [float(x) for x in q_emb]
-        print(">>> Cast to Python floats succeeded.")
-    except Exception as e:
-        print(">>> Cast to Python floats failed:", e)
+    # ── 5) Format one line per match, preserving the score order ──────────────
+    lines: List[str] = []
+    for prefix, key, score, meta in parsed:
+        if prefix is None:
+            lines.append(f"(Match ID={key}, score={score:.3f}, metadata={meta})")
+            continue
+        _, _, _, label, fmt = _MATCH_LOOKUPS[prefix]
+        if meta is not None:
+            lines.append(f"Unparsable {label} ID='{key}', metadata: {meta}")
+            continue
+        row = found.get(prefix, {}).get(key)
+        if row:
+            lines.append(f"{fmt(row)} (score={score:.3f})")
+        else:
+            lines.append(f"{label[0].upper()}{label[1:]} ID {key} not found (score={score:.3f})")
 
-    # 5) Check dimension
-    EXPECTED_DIM = 1536
-    if len(q_emb) != EXPECTED_DIM:
-        print(f">>> DIM MISMATCH: {len(q_emb)} vs {EXPECTED_DIM}")
+    return "\n".join(lines)
 
-    # 6) Test JSON serialization
-    try:
-        temp = json.dumps({"queries": [q_emb], "top_k": 3})
-        print(">>> JSON serialization OK.")
-    except Exception as e:
-        print(">>> JSON serialization failed:", e)
 
-    # 7) Finally query Pinecone
-    response = index.query(queries=[q_emb], top_k=top_k, include_metadata=True)
-    matches = getattr(response, "matches", None) or response.get("matches", [])
+def _lookup_from_cache(wanted: dict[str, set[int]]) -> dict[str, dict[int, tuple]]:
+    cache = get_dimension_cache()
+    found = {}
+    for prefix, ids in wanted.items():
+        table, _, columns, _, _ = _MATCH_LOOKUPS[prefix]
+        found[prefix] = cache.lookup(table, ids, columns)
+    return found
 
-    if not matches:
-        return "No relevant customers or products found."
 
-    # ── 3) Obtain the SQLAlchemy engine once ──────────────────────────────────────
+def _lookup_from_db(wanted: dict[str, set[int]]) -> dict[str, dict[int, tuple]]:
+    found = {}
     ENGINE = get_engine()
+    with ENGINE.connect() as conn:
+        for prefix, ids in wanted.items():
+            table, key_col, columns, _, _ = _MATCH_LOOKUPS[prefix]
+            sql = text(
+                f"SELECT {', '.join(columns)} FROM {table} "
+                f"WHERE {key_col} IN :ids"
+            ).bindparams(bindparam("ids", expanding=True))
+            rows = conn.execute(sql, {"ids": sorted(ids)}).fetchall()
+            found[prefix] = {row[0]: tuple(row) for row in rows}
+    return found
+
+
+def _format_customer_match(row: tuple) -> str:
+    uid, first, last, cancelled, returned, sessions = row
+    return (
+        f"Customer {first} {last} (ID {uid}): "
+        f"cancelled={cancelled}, returned={returned}, sessions={sessions}"
+    )
 
-    # ── 4) For each Pinecone match, look up details via ENGINE ──────────────────
-    lines: List[str] = []
-    for m in matches:
-        mid = m.id
-        score = getattr(m, "score", m.get("score", 0.0))
 
-        # --- 4a) Customer IDs begin with 'cust_' → look up in `customers` table
-        if mid.startswith("cust_"):
-            try:
-                user_id = int(mid.split("_", 1)[1])
-            except ValueError:
-                meta = m.metadata or m.get("metadata", {})
-                lines.append(f"Unparsable customer ID='{mid}', metadata: {meta}")
-                continue
-
-            sql = text("""
-                SELECT 
-                    user_id,
-                    customer_first_name,
-                    customer_last_name,
-                    num_orders_Cancelled,
-                    num_orders_Returned,
-                    num_web_sessions
-                FROM customers
-                WHERE user_id = :uid
-            """)
-            with ENGINE.connect() as conn:
-                result = conn.execute(sql, {"uid": user_id}).fetchone()
-
-            if result:
-                uid, first, last, cancelled, returned, sessions = result
-                lines.append(
-                    f"Customer {first} {last} (ID {uid}): "
-                    f"cancelled={cancelled}, returned={returned}, sessions={sessions} "
-                    f"(score={score:.3f})"
-                )
-            else:
-                lines.append(f"Customer ID {user_id} not found (score={score:.3f})")
+def _format_product_match(row: tuple) -> str:
+    pid, name, category, sales, cogs, profit = row
+    return (
+        f"Product '{name}' (ID {pid}), category={category}, "
+        f"sales=${sales:,.2f}, COGS=${cogs:,.2f}, profit=${profit:,.2f}"
+    )
 
-        # --- 4b) Product IDs begin with 'prod_' → look up in `products` table
-        elif mid.startswith("prod_"):
-            try:
-                product_id = int(mid.split("_", 1)[1])
-            except ValueError:
-                meta = m.metadata or m.get("metadata", {})
-                lines.append(f"Unparsable product ID='{mid}', metadata: {meta}")
-                continue
-
-            sql = text("""
-                SELECT 
-                    product_id,
-                    product_name,
-                    product_category,
-                    sales_amount,
-                    cost_of_goods_sold,
-                    profit
-                FROM products
-                WHERE product_id = :pid
-            """)
-            with ENGINE.connect() as conn:
-                result = conn.execute(sql, {"pid": product_id}).fetchone()
-
-            if result:
-                pid, name, category, sales, cogs, profit = result
-                lines.append(
-                    f"Product '{name}' (ID {pid}), category={category}, "
-                    f"sales=${sales:,.2f}, COGS=${cogs:,.2f}, profit=${profit:,.2f} "
-                    f"(score={score:.3f})"
-                )
-            else:
-                lines.append(f"Product ID {product_id} not found (score={score:.3f})")
 
-        elif mid.startswith("dc_"):
-            try:
-                dc_id = int(mid.split("_", 1)[1])
-            except ValueError:
-                meta = m.metadata or m.get("metadata", {})
-                lines.append(f"Unparsable distribution center ID='{mid}', metadata: {meta}")
-                continue
-
-            sql = text("""
-                SELECT
-                    distribution_center_id,
-                    distribution_center_name,
-                    items_in_stock,
-                    total_sales,
-                    total_inventory_cost
-                FROM distribution_center_inventory
-                WHERE distribution_center_id = :dcid
-            """)
-            with ENGINE.connect() as conn:
-                result = conn.execute(sql, {"dcid": dc_id}).fetchone()
-
-            if result:
-                did, name, stock, sales, inv_cost = result
-                lines.append(
-                    f"Center '{name}' (ID {did}): stock={stock}, sales=${sales:,.2f}, cost=${inv_cost:,.2f} "
-                    f"(score={score:.3f})"
-                )
-            else:
-                lines.append(f"Distribution center ID {dc_id} not found (score={score:.3f})")
-                
-        # --- 4c) Fallback if Pinecone returns an unexpected ID format
-        else:
-            meta = m.metadata if hasattr(m, "metadata") else m.get("metadata", {})
-            lines.append(f"(Match ID={mid}, score={score:.3f}, metadata={meta})")
+def _format_center_match(row: tuple) -> str:
+    did, name, stock, sales, inv_cost = row
+    return (
+        f"Center '{name}' (ID {did}): stock={stock}, "
+        f"sales=${sales:,.2f}, cost=${inv_cost:,.2f}"
+    )
 
-    # ── 5) Join all lines into a single multi-line string ─────────────────────────
-    return "\n".join(lines)
+
+# Pinecone ID prefix → (table, key column, columns, label, line formatter)
+_MATCH_LOOKUPS = {
+    "cust_": (
+        "customers",
+        "user_id",
+        [
+            "user_id",
+            "customer_first_name",
+            "customer_last_name",
+            "num_orders_Cancelled",
+            "num_orders_Returned",
+            "num_web_sessions",
+        ],
+        "customer",
+        _format_customer_match,
+    ),
+    "prod_": (
+        "products",
+        "product_id",
+        [
+            "product_id",
+            "product_name",
+            "product_category",
+            "sales_amount",
+            "cost_of_goods_sold",
+            "profit",
+        ],
+        "product",
+        _format_product_match,
+    ),
+    "dc_": (
+        "distribution_center_inventory",
+        "distribution_center_id",
+        [
+            "distribution_center_id",
+            "distribution_center_name",
+            "items_in_stock",
+            "total_sales",
+            "total_inventory_cost",
+        ],
+        "distribution center",
+        _format_center_match,
+    ),
+}
 
 def format_zero_rows() -> str:
     return "No records found."
@@ -435,172 +498,265 @@ def format_numbered_list(rows: List[Tuple]) -> str:
     return "\n".join(lines)
 
 def format_markdown_table(
-    rows: list[tuple],
+    rows: list[tuple] | QueryResult,
     limit: int | None = None,
+    caption: str | None = None,
 ) -> str:
-    """Return a ``TABLE:`` prefixed path to a table image generated from the data."""
+    """Return a ``TABLE:`` prefixed path to a table image generated from the data.
+
+    A :class:`db.QueryResult` is rendered from its columns, with the SQL
+    column names as headers.  ``caption`` is drawn above the table.
+    """
 
     from .visualize import create_table_visual
 
     if not rows:
         return "_No data returned._"
 
-    path = create_table_visual(rows, limit)
+    path = create_table_visual(rows, limit, caption=caption)
     if not path:
         return "_No data returned._"
 
     return f"TABLE:{path}"
     
-def _save_to_history(query: str, response: str, confidence: float | None):
+def _save_to_history(
+    query: str,
+    response: str,
+    confidence: float | None,
+    session_id: str | None = None,
+):
     """
-    Appends a new chat entry into chatbot_responses.json.
+    Records a chat entry in the session's memory buffer and queues it for
+    appending to the history store (chatbot_responses.jsonl).
     Format of each entry:
       {
         "query_text": "...",
         "retrieved_response": "...",
         "timestamp": "YYYY-MM-DDTHH:MM:SS",
-        "confidence_score": float or null
+        "confidence_score": float or null,
+        "session_id": "..."
       }
     """
+    session_id = session_id or DEFAULT_SESSION
     record = {
         "query_text": query,
         "retrieved_response": response,
         "timestamp": datetime.datetime.now().isoformat(),
-        "confidence_score": confidence
+        "confidence_score": confidence,
+        "session_id": session_id,
     }
 
-    fname = "chatbot_responses.json"
-    try:
-        # 1) If the file exists and has valid JSON, load it; otherwise start with []
-        if os.path.exists(fname):
-            with open(fname, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if not isinstance(data, list):
-                    data = []
-        else:
-            data = []
-    except Exception:
-        # If JSON is malformed or any I/O error, overwrite with a fresh list
-        data = []
+    _sessions.add(session_id, record)
+    _history_writer.submit(record)
 
-    # 2) Append the new record
-    data.append(record)
 
-    # 3) Write back out to disk (pretty-print)
-    try:
-        with open(fname, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        print(f"⚠️ Couldn’t write to {fname}: {e}")
+def flush_history() -> None:
+    """Wait until every queued history record has been written to disk."""
+    _history_writer.flush()
+
+# Identical questions asked while one is already being answered share its run
+_inflight = SingleFlight()
+# Answers keyed on (normalized question, data version); see ``cache.py``
+_answers = AnswerCache()
+
 
-def handle_query(query_text: str) -> str:
+def _finish(reply: str, on_event: EventCallback | None = None) -> str:
+    """Convert text tables and report any rendered image."""
+    reply = _maybe_convert_text_table(reply)
+    if reply.startswith("TABLE:"):
+        _emit(on_event, "image", path=reply[len("TABLE:"):])
+    return reply
+
+
+def _fallback(
+    q: str, on_event: EventCallback | None = None, session_id: str | None = None
+) -> str:
+    """Answer ``q`` with a plain OpenAI completion, streaming tokens if asked."""
+    _emit(on_event, "routed", route="fallback")
+    history = load_recent_history(session_id=session_id or DEFAULT_SESSION)
+    on_token = None
+    if on_event is not None:
+        on_token = lambda piece: _emit(on_event, "token", text=piece)
+    return call_openai_fallback(q, history, on_token=on_token)
+
+
+def handle_query(
+    query_text: str,
+    on_event: EventCallback | None = None,
+    session_id: str | None = None,
+) -> str:
+    """Answer ``query_text`` and return the reply text.
+
+    ``session_id`` selects the conversation whose recent turns are used as
+    context for the OpenAI fallback and where the exchange is remembered.
+
+    ``on_event`` (optional) is called as ``on_event(name, data)`` while the
+    pipeline progresses: ``routed``, ``sql``, ``rows``, ``rejected`` (the SQL
+    guard refused the query), ``image`` and, for the OpenAI fallback, one
+    ``token`` event per streamed fragment.
+
+    Replies are served from the answer cache when the same normalized
+    question was already answered against the current data version, and
+    concurrent non-streaming calls for the same question, from any session,
+    are coalesced into a single pipeline run.  Only the OpenAI fallback,
+    which answers from the session's history, runs per session.
+    """
     q = query_text.strip()
     if not q:
         return "Please type a question."
 
-    if is_db_path_question(q):
+    question, version = normalize_question(q), get_data_version()
+    reply = _answers.get(question, version)
+    if reply is not None:
+        _emit(on_event, "routed", route="cache")
+        _finish(reply, on_event)
+    else:
+        if on_event is None:
+            reply = _inflight.do(
+                (question, version), lambda: _answer_and_cache(q, question, version)
+            )
+        else:
+            reply = _answer_and_cache(q, question, version, on_event)
+        if reply is None:
+            # The fallback answers from this session's history, so it runs
+            # outside the shared flight
+            reply = _finish(_fallback(q, on_event, session_id), on_event)
+    _save_to_history(q, reply, confidence=None, session_id=session_id)
+    return reply
+
+
+def get_pipeline_stats() -> dict:
+    """Return counters describing how much pipeline work was saved."""
+    return {
+        "coalescing": _inflight.stats(),
+        "answer_cache": _answers.stats(),
+        "sessions": {**_sessions.stats(), "pending_writes": _history_writer.pending()},
+        "dimension_cache": get_dimension_cache().stats(),
+        "embedding_cache": get_embedding_cache().stats(),
+        "lexical_index": get_lexical_index().stats(),
+        "sql_cache": get_sql_cache().stats(),
+        "schema_context": get_schema_context().stats(),
+        "sql_guard": get_sql_guard().stats(),
+        "intent_templates": get_intent_matcher().stats(),
+        "router": get_router().stats(),
+        "duckdb_pool": get_pool().stats(),
+    }
+
+
+def _answer_and_cache(
+    q: str,
+    question: str,
+    version: str,
+    on_event: EventCallback | None = None,
+) -> str | None:
+    reply, cacheable = _answer(q, on_event)
+    if cacheable:
+        _answers.put(question, version, reply)
+    return reply
+
+
+def _answer(
+    q: str, on_event: EventCallback | None = None
+) -> tuple[str | None, bool]:
+    """Run the routing → SQL / semantic search pipeline for ``q``.
+
+    Returns the reply and whether it may be cached.  The reply is ``None``
+    when the caller should fall back to OpenAI, whose replies depend on the
+    session's conversation history and are never cached.
+    """
+    decision = get_router().route(q)
+    if decision.route == "db_path":
+        _emit(on_event, "routed", route="db_path")
         reply = (
             "The sample data is already loaded in memory. "
             "Would you like to use this DuckDB data?"
         )
-        reply = _maybe_convert_text_table(reply)
-        _save_to_history(q, reply, confidence=None)
-        return reply
+        return _finish(reply, on_event), True
 
-    if is_data_question(q):
+    intent = get_intent_matcher().match(q)
+    if intent is not None or decision.is_data:
+        _emit(on_event, "routed", route="sql", nearest=decision.nearest, score=decision.score)
         try:
-            from .langchain_sql import query_via_sqlagent
-            rows = query_via_sqlagent(q)
+            rows = None
+            if intent is not None:
+                # Known question shape: fixed SQL, no LLM call
+                _emit(on_event, "sql", sql=intent.sql)
+                rows = get_intent_matcher().run(intent)
+            if rows is None:
+                from .langchain_sql import query_via_sqlagent
+                on_sql = None
+                if on_event is not None:
+                    on_sql = lambda sql: _emit(on_event, "sql", sql=sql)
+                rows = query_via_sqlagent(q, on_sql=on_sql, limit=extract_limit_from_question(q))
             n = len(rows)
+            truncated = getattr(rows, "truncated", False)
+            _emit(on_event, "rows", count=n, truncated=truncated)
+            note = None
+            if truncated:
+                note = f"Showing the first {n:,} rows; ask for a narrower slice to see the rest."
 
             if n == 0:
                 reply = format_zero_rows()
-                reply = _maybe_convert_text_table(reply)
-                _save_to_history(q, reply, confidence=None)
-                return reply
-
-            if n == 1:
+            elif n == 1:
                 reply = format_single_row(rows[0])
-                reply = _maybe_convert_text_table(reply)
-                _save_to_history(q, reply, confidence=None)
-                return reply
-
-            if 2 <= n <= 5:
-                body = format_numbered_list(rows)
-                reply = _maybe_convert_text_table(body)
-                _save_to_history(q, reply, confidence=None)
-                return reply
-
-            reply = format_markdown_table(rows, limit=None)
-            reply = _maybe_convert_text_table(reply)
-            _save_to_history(q, reply, confidence=None)
-            return reply
-
+            elif 2 <= n <= 5:
+                reply = format_numbered_list(rows)
+            else:
+                reply = format_markdown_table(rows, limit=None, caption=note)
+            if note and not reply.startswith("TABLE:"):
+                reply = f"{reply}\n\n_{note}_"
+            return _finish(reply, on_event), True
+
+        except SqlRejected as e:
+            # Too expensive or too slow: explain instead of guessing an answer
+            _emit(on_event, "rejected", reason=str(e))
+            return _finish(str(e), on_event), False
         except Exception as e:
             # Any error in SQLAgent / formatting → open AI fallback
             print("⚠️ Data‐centric error:", e)
-            history = load_recent_history()
-            reply = call_openai_fallback(q, history)
-            reply = _maybe_convert_text_table(reply)
-            _save_to_history(q, reply, confidence=None)
-            return reply
-        
+            return None, False
+
+    _emit(on_event, "routed", route="semantic")
     try:
         reply = handle_semantic_search(q, top_k=3)
-        reply = _maybe_convert_text_table(reply)
-        _save_to_history(q, reply, confidence=None)
-        return reply
+        return _finish(reply, on_event), True
     except Exception as e:
         # Any error in semantic‐search → open AI fallback
         print("⚠️ Semantic‐search error:", e)
-        history = load_recent_history()
-        reply = call_openai_fallback(q, history)
-        reply = _maybe_convert_text_table(reply)
-        _save_to_history(q, reply, confidence=None)
-        return reply
+        return None, False
 
-def clear_conversation():
-    """Reset any conversation state (currently no-op)."""
-    pass
+def clear_conversation(session_id: str | None = None) -> bool:
+    """Drop the in-memory conversation buffer for ``session_id``.
+
+    The durable history store is left untouched.  Returns ``True`` when a
+    buffer existed.
+    """
+    return _sessions.clear(session_id or DEFAULT_SESSION)
 
 
 def _aggregate_metrics() -> dict:
     """Build simple aggregate metrics using DuckDB."""
-    try:
-        import duckdb
-    except Exception:
+    if not Path(DUCKDB_PATH).exists():
         return {}
 
-    db_path = Path("data/data.db")
-    if not db_path.exists():
-        return {}
-
-    con = duckdb.connect(str(db_path))
     metrics = {}
     try:
-        metrics["customer_count"] = con.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
-        metrics["product_count"] = con.execute("SELECT COUNT(*) FROM products").fetchone()[0]
-        metrics["total_sales"] = con.execute("SELECT SUM(sales_amount) FROM products").fetchone()[0] or 0
+        with get_pool().reader() as con:
+            metrics["customer_count"] = con.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
+            metrics["product_count"] = con.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+            metrics["total_sales"] = con.execute("SELECT SUM(sales_amount) FROM products").fetchone()[0] or 0
     except Exception:
         return {}
-    finally:
-        con.close()
     return metrics
 
 
 def summarize_history() -> str:
     """Return a text summary of recent chat history and data aggregates."""
 
-    history_path = Path("chatbot_responses.json")
-    if history_path.exists():
-        try:
-            data = json.loads(history_path.read_text())
-        except Exception:
-            data = []
-    else:
-        data = []
-
-    last_entries = data[-5:]
+    try:
+        last_entries = read_tail(5)
+    except Exception:
+        last_entries = []
     lines = ["Recent conversation:"]
     for entry in last_entries:
         q = entry.get("query_text", "").strip()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+"""Single-flight de-duplication of identical in-flight work.
+
+When several callers ask for the same key at the same time only the first
+one (the *leader*) runs the function; the others block until it finishes
+and receive the same result (or the same exception).  Nothing is cached
+once the call completes - see :mod:`cache` for that.
+"""
+
+import threading
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.hits = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return ``fn()``, sharing the run with any concurrent caller of ``key``."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.hits += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced_hits": self.hits,
+                "in_flight": len(self._calls),
+            }
+
+
+__all__ = ["SingleFlight"]
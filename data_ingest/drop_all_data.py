@@ -2,7 +2,11 @@
 # drop_all.py
 
 import os
-import duckdb
+import sys
+
+# Write through the app's DuckDB pool so drops share its config and write lock
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from db import DuckDBPool  # noqa: E402
 
 # Path to your DuckDB file
 DB_PATH = os.path.join(os.path.dirname(__file__), "../data/data.db")
@@ -12,30 +16,30 @@ def drop_all_tables_and_views(db_path: str):
     Connects to the DuckDB at db_path, finds all tables and views in the 'main' schema,
     and drops each one.
     """
-    con = duckdb.connect(db_path)
-
-    # Query to list all tables and views in the 'main' schema
-    qry = """
-    SELECT table_name, table_type
-    FROM information_schema.tables
-    WHERE table_schema = 'main';
-    """
-    results = con.execute(qry).fetchall()
-
-    for table_name, table_type in results:
-        # DuckDB uses 'BASE TABLE' for actual tables, 'VIEW' for views
-        if table_type.upper() == "VIEW":
-            drop_stmt = f'DROP VIEW IF EXISTS "{table_name}";'
-        else:  # BASE TABLE
-            drop_stmt = f'DROP TABLE IF EXISTS "{table_name}";'
-
-        try:
-            con.execute(drop_stmt)
-            print(f"🔹 Dropped {table_type.lower()} '{table_name}'")
-        except Exception as e:
-            print(f"❌ Error dropping {table_type.lower()} '{table_name}': {e}")
-
-    con.close()
+    pool = DuckDBPool(db_path, read_only=False)
+    with pool.writer() as con:
+        # Query to list all tables and views in the 'main' schema
+        qry = """
+        SELECT table_name, table_type
+        FROM information_schema.tables
+        WHERE table_schema = 'main';
+        """
+        results = con.execute(qry).fetchall()
+
+        for table_name, table_type in results:
+            # DuckDB uses 'BASE TABLE' for actual tables, 'VIEW' for views
+            if table_type.upper() == "VIEW":
+                drop_stmt = f'DROP VIEW IF EXISTS "{table_name}";'
+            else:  # BASE TABLE
+                drop_stmt = f'DROP TABLE IF EXISTS "{table_name}";'
+
+            try:
+                con.execute(drop_stmt)
+                print(f"🔹 Dropped {table_type.lower()} '{table_name}'")
+            except Exception as e:
+                print(f"❌ Error dropping {table_type.lower()} '{table_name}': {e}")
+
+    pool.close()
     print("\n✅ All tables and views dropped.")
 
 if __name__ == "__main__":
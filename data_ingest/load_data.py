@@ -1,12 +1,17 @@
 # data_ingest/load_data.py
 
 import os
+import sys
 import duckdb
 import pandas as pd
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Write through the app's DuckDB pool so ingest shares its config and write lock
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from db import DuckDBPool  # noqa: E402
+
 DUCKDB_PATH = os.path.join(os.path.dirname(__file__), "../data/data.db")
 
 # Replace these with real paths to your raw CSV/JSONs
@@ -40,7 +45,7 @@ def ingest_table(con: duckdb.DuckDBPyConnection, table_name: str, file_name: str
 
 def main():
     os.makedirs(os.path.dirname(DUCKDB_PATH), exist_ok=True)
-    con = duckdb.connect(DUCKDB_PATH)
+    pool = DuckDBPool(DUCKDB_PATH, read_only=False)
 
     # Example mapping: staging_table_name → filename.csv
     table_files = {
@@ -53,23 +58,24 @@ def main():
         # …add any others you have…
     }
 
-    # Ingest each table
-    for table_name, file_name in table_files.items():
-        ingest_table(con, table_name, file_name)
+    with pool.writer() as con:
+        # Ingest each table
+        for table_name, file_name in table_files.items():
+            ingest_table(con, table_name, file_name)
 
-    print("✅ All ecommerce staging tables loaded.\n")
+        print("✅ All ecommerce staging tables loaded.\n")
 
-    # QA CHECK: Log row counts for each loaded table
-    print("🔍 QA: Verifying row counts for each table...")
-    for table_name in table_files.keys():
-        try:
-            result = con.execute(f"SELECT COUNT(*) FROM {table_name};").fetchone()
-            row_count = result[0] if result else 0
-            print(f"   • {table_name}: {row_count} rows")
-        except Exception as e:
-            print(f"   • {table_name}: ERROR checking row count ({e})")
+        # QA CHECK: Log row counts for each loaded table
+        print("🔍 QA: Verifying row counts for each table...")
+        for table_name in table_files.keys():
+            try:
+                result = con.execute(f"SELECT COUNT(*) FROM {table_name};").fetchone()
+                row_count = result[0] if result else 0
+                print(f"   • {table_name}: {row_count} rows")
+            except Exception as e:
+                print(f"   • {table_name}: ERROR checking row count ({e})")
 
-    con.close()
+    pool.close()
     print("\n✅ QA complete. Connection closed.")
 
     # ── Additional step: extract dataset metadata using OpenAI Vision ──
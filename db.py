@@ -1,22 +1,328 @@
 # db.py
 
+import hashlib
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
 import duckdb
+from duckdb_engine import ConnectionWrapper
 from sqlalchemy import create_engine
 
 DUCKDB_PATH = os.path.join(os.path.dirname(__file__), "data", "data.db")
 
+# The server only reads; ingest (load_data.py, drop_all_data.py, dbt) runs in
+# its own process, the scripts through a writable pool's :meth:`writer`.
+# Read-only also lets several server processes open the file side by side.
+DUCKDB_READ_ONLY = os.getenv("KYDXBOT_DUCKDB_READ_ONLY", "1") == "1"
+DUCKDB_THREADS = int(os.getenv("KYDXBOT_DUCKDB_THREADS", "0")) or None
+DUCKDB_MEMORY_LIMIT = os.getenv("KYDXBOT_DUCKDB_MEMORY_LIMIT") or None
+DUCKDB_TEMP_DIR = os.getenv("KYDXBOT_DUCKDB_TEMP_DIR") or None
+# Concurrent readers; each DuckDB query is itself parallel over ``threads``
+DUCKDB_READERS = int(os.getenv("KYDXBOT_DUCKDB_READERS", "8"))
+
 _engine = None
-_connection = None
+
+
+class DuckDBPool:
+    """One DuckDB database per process, handing out cursors to readers.
+
+    DuckDB connections are not safe to share between threads, but cursors of
+    one connection are independent connections to the same database, so
+    queries on different cursors run in parallel.  :meth:`reader` lends the
+    calling thread its own long-lived cursor (a fresh one when the thread
+    already holds it) and caps concurrent readers at ``readers``;
+    :meth:`writer` serialises writes and refuses them on a read-only pool.
+    ``threads``, ``memory_limit`` and ``temp_directory`` are passed to DuckDB
+    when the database is opened.
+    """
+
+    def __init__(
+        self,
+        path: str = DUCKDB_PATH,
+        read_only: bool = DUCKDB_READ_ONLY,
+        threads: int | None = DUCKDB_THREADS,
+        memory_limit: str | None = DUCKDB_MEMORY_LIMIT,
+        temp_directory: str | None = DUCKDB_TEMP_DIR,
+        readers: int = DUCKDB_READERS,
+        connect: Callable[[], duckdb.DuckDBPyConnection] | None = None,
+    ):
+        self.path = path
+        self.read_only = read_only
+        self.config = {
+            k: v
+            for k, v in (
+                ("threads", threads),
+                ("memory_limit", memory_limit),
+                ("temp_directory", temp_directory),
+            )
+            if v is not None
+        }
+        self.readers = max(1, readers)
+        self._connect = connect or self._open
+        self._connection: duckdb.DuckDBPyConnection | None = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.readers)
+        self._local = threading.local()
+        self.in_use = 0
+        self.counts = {
+            "acquired": 0, "waited": 0, "wait_ms": 0.0, "peak_in_use": 0,
+            "cursors": 0, "nested": 0, "writes": 0,
+        }
+
+    def _open(self) -> duckdb.DuckDBPyConnection:
+        # A read-only open needs an existing file; a fresh checkout has none yet
+        read_only = self.read_only and os.path.exists(self.path)
+        return duckdb.connect(self.path, read_only=read_only, config=self.config)
+
+    def connection(self) -> duckdb.DuckDBPyConnection:
+        """The shared root connection, opened on first use."""
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            return self._connection
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """A new cursor the caller owns and closes."""
+        cur = self.connection().cursor()
+        with self._lock:
+            self.counts["cursors"] += 1
+        return cur
+
+    @contextmanager
+    def reader(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Borrow this thread's cursor for the duration of the block."""
+        local = self._local
+        if getattr(local, "depth", 0):
+            # The thread's cursor is busy (e.g. a streaming fetch); use a spare
+            with self._lock:
+                self.counts["nested"] += 1
+            cur = self.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+            return
+
+        waited = not self._slots.acquire(blocking=False)
+        if waited:
+            start = time.perf_counter()
+            self._slots.acquire()
+        with self._lock:
+            self.counts["acquired"] += 1
+            if waited:
+                self.counts["waited"] += 1
+                self.counts["wait_ms"] += (time.perf_counter() - start) * 1000
+            self.in_use += 1
+            self.counts["peak_in_use"] = max(self.counts["peak_in_use"], self.in_use)
+        try:
+            if getattr(local, "cursor", None) is None:
+                local.cursor = self.cursor()
+            local.depth = 1
+            yield local.cursor
+        finally:
+            local.depth = 0
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def writer(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """The single write path: one writer at a time, on a writable pool."""
+        if self.read_only:
+            raise RuntimeError(
+                "The DuckDB pool is read-only; set KYDXBOT_DUCKDB_READ_ONLY=0 "
+                "or write from a separate process (data_ingest/, dbt)."
+            )
+        with self._write_lock:
+            cur = self.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+                with self._lock:
+                    self.counts["writes"] += 1
+
+    def close(self) -> None:
+        """Close the database; the next use opens it again."""
+        with self._lock:
+            con, self._connection = self._connection, None
+            self._local = threading.local()
+        if con is not None:
+            con.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counts,
+                "wait_ms": round(self.counts["wait_ms"], 1),
+                "in_use": self.in_use,
+                "readers": self.readers,
+                "utilization": round(self.in_use / self.readers, 3),
+                "read_only": self.read_only,
+                **self.config,
+            }
+
+
+_pool: DuckDBPool | None = None
+
+
+def get_pool() -> DuckDBPool:
+    global _pool
+    if _pool is None:
+        _pool = DuckDBPool()
+    return _pool
+
+
+@contextmanager
+def read_connection(path: str = DUCKDB_PATH) -> Iterator[duckdb.DuckDBPyConnection]:
+    """Read from ``path``: through the pool for the app database, else directly.
+
+    DuckDB refuses a second in-process connection to the same file with a
+    different configuration, so nothing should ``duckdb.connect`` the app
+    database itself.
+    """
+    pool = get_pool()
+    if os.path.abspath(path) == os.path.abspath(pool.path):
+        with pool.reader() as cur:
+            yield cur
+        return
+    con = duckdb.connect(path)
+    try:
+        yield con
+    finally:
+        con.close()
+
+
+def open_connection(path: str = DUCKDB_PATH) -> duckdb.DuckDBPyConnection:
+    """A connection to ``path`` that the caller must close.
+
+    For the app database this is a dedicated pool cursor that takes no reader
+    slot, for long-running reads (streaming rows into an embedding run) that
+    would otherwise hold :meth:`DuckDBPool.reader` for their whole duration.
+    """
+    pool = get_pool()
+    if os.path.abspath(path) == os.path.abspath(pool.path):
+        return pool.cursor()
+    return duckdb.connect(path)
+
 
 def get_engine():
     global _engine
     if _engine is None:
-        _engine = create_engine(f"duckdb:///{DUCKDB_PATH}?access_mode=read_write")
+        # The engine hands out cursors of the pool's database instead of
+        # opening the file itself (see ``read_connection``).
+        _engine = create_engine(
+            "duckdb:///:memory:",
+            creator=lambda: ConnectionWrapper(get_pool().cursor()),
+        )
     return _engine
 
 def get_duckdb_connection():
-    global _connection
-    if _connection is None:
-        _connection = duckdb.connect(DUCKDB_PATH)
-    return _connection
+    return get_pool().connection()
+
+
+def get_data_version(path: str = DUCKDB_PATH) -> str:
+    """Return a cheap fingerprint of the DuckDB file and its write-ahead log.
+
+    The value changes whenever ``load_data.py`` or a dbt run rewrites the
+    database, so it can be used to key anything derived from the data.
+    """
+    parts = []
+    for candidate in (path, path + ".wal"):
+        try:
+            st = os.stat(candidate)
+        except OSError:
+            parts.append("0")
+            continue
+        parts.append(f"{st.st_mtime_ns:x}.{st.st_size:x}")
+    return "-".join(parts)
+
+
+_schema_fingerprint: tuple[str, str] | None = None
+
+
+def get_schema_fingerprint() -> str:
+    """Return a hash of every ``main`` table's column names and types.
+
+    Unlike :func:`get_data_version` it only changes when the schema does, so
+    SQL written against the previous load stays valid across data refreshes.
+    It is recomputed at most once per data version.
+    """
+    global _schema_fingerprint
+    version = get_data_version()
+    if _schema_fingerprint is not None and _schema_fingerprint[0] == version:
+        return _schema_fingerprint[1]
+    with get_pool().reader() as cur:
+        rows = cur.execute(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns"
+            " WHERE table_schema = 'main' ORDER BY table_name, ordinal_position"
+        ).fetchall()
+    digest = hashlib.sha256(repr(rows).encode("utf-8")).hexdigest()[:16]
+    _schema_fingerprint = (version, digest)
+    return digest
+
+
+class QueryResult:
+    """Columnar result of :func:`run_query`.
+
+    ``columns`` are the result's column names and ``arrays`` one NumPy array
+    per column (masked where the value is NULL), straight from DuckDB's
+    ``fetchnumpy``.  Indexing, ``len`` and iteration behave like the old
+    ``list[tuple]`` rows; the tuples are only built on first use.
+    ``truncated`` is set by :meth:`sql_guard.SqlGuard.run` when the row cap
+    cut the result short.
+    """
+
+    def __init__(self, columns: list[str], arrays: list):
+        self.columns = columns
+        self.arrays = arrays
+        self.truncated = False
+        self._rows: list[tuple] | None = None
+
+    def __len__(self) -> int:
+        return len(self.arrays[0]) if self.arrays else 0
+
+    def rows(self) -> list[tuple]:
+        if self._rows is None:
+            self._rows = list(zip(*(a.tolist() for a in self.arrays)))
+        return self._rows
+
+    def __getitem__(self, i):
+        return self.rows()[i]
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    def __repr__(self) -> str:
+        return f"QueryResult(columns={self.columns!r}, rows={len(self)})"
+
+
+def run_query(sql: str, timeout: float | None = None) -> QueryResult:
+    """Execute ``sql`` on this thread's pooled cursor, columnar.
+
+    With ``timeout`` (seconds) the query is interrupted when it runs longer
+    and ``duckdb.InterruptException`` is raised.
+    """
+    with get_pool().reader() as cur:
+        timer = threading.Timer(timeout, cur.interrupt) if timeout else None
+        try:
+            if timer is not None:
+                timer.start()
+            cur.execute(sql)
+            description = cur.description or []
+            arrays = list(cur.fetchnumpy().values())
+        finally:
+            if timer is not None:
+                timer.cancel()
+                # The cursor is reused; never let a late interrupt hit the next query
+                timer.join()
+    for i, (_, sql_type, *_) in enumerate(description):
+        # fetchnumpy widens DATE to a timestamp; keep plain dates
+        if str(sql_type) == "DATE":
+            arrays[i] = arrays[i].astype("datetime64[D]")
+    return QueryResult([d[0] for d in description], arrays)
+
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+"""Process-wide, column-oriented cache of the small dimension marts.
+
+``customers``, ``products`` and ``distribution_center_inventory`` are small
+and read-mostly, so instead of querying DuckDB for every semantic-search match
+each table is fetched once into NumPy arrays (one per column) with a sorted
+primary-key index.  Lookups are a vectorised ``searchsorted`` over that index.
+The cache reloads itself whenever :func:`db.get_data_version` changes.
+"""
+
+import sys
+import threading
+from typing import Callable, Iterable
+
+import numpy as np
+
+from .db import get_data_version, get_pool
+
+# table → primary key column
+DIMENSION_TABLES = {
+    "customers": "user_id",
+    "products": "product_id",
+    "distribution_center_inventory": "distribution_center_id",
+}
+
+
+class _Table:
+    """Column arrays for one table plus a sorted primary-key index."""
+
+    def __init__(self, name: str, key: str, arrays: dict):
+        self.name = name
+        self.columns: dict[str, np.ndarray] = {}
+        self.masks: dict[str, np.ndarray | None] = {}
+        for col, arr in arrays.items():
+            col = col.lower()
+            if isinstance(arr, np.ma.MaskedArray):
+                mask = np.ma.getmaskarray(arr)
+                self.columns[col] = arr.data
+                self.masks[col] = mask if mask.any() else None
+            else:
+                self.columns[col] = np.asarray(arr)
+                self.masks[col] = None
+
+        keys = self.columns[key.lower()].astype(np.int64)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+        self._distinct: dict[str, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._sorted_keys)
+
+    def positions(self, ids: Iterable[int]) -> dict[int, int]:
+        """Map each known id in ``ids`` to its row position."""
+        wanted = np.fromiter(ids, dtype=np.int64)
+        if not len(wanted) or not len(self._sorted_keys):
+            return {}
+        idx = np.searchsorted(self._sorted_keys, wanted)
+        idx_clipped = np.minimum(idx, len(self._sorted_keys) - 1)
+        hit = self._sorted_keys[idx_clipped] == wanted
+        return {
+            int(k): int(row)
+            for k, row in zip(wanted[hit], self._order[idx_clipped[hit]])
+        }
+
+    def rows(self, positions: list[int], columns: list[str]) -> list[tuple]:
+        """Return the requested ``columns`` at ``positions`` as Python tuples."""
+        out_cols = []
+        for col in columns:
+            col = col.lower()
+            values = self.columns[col][positions].tolist()
+            mask = self.masks[col]
+            if mask is not None:
+                values = [None if m else v for v, m in zip(values, mask[positions])]
+            out_cols.append(values)
+        return list(zip(*out_cols))
+
+    def distinct(self, column: str) -> list:
+        col = column.lower()
+        cached = self._distinct.get(col)
+        if cached is None:
+            values = self.columns[col]
+            mask = self.masks[col]
+            if mask is not None:
+                values = values[~mask]
+            # ``v == v`` drops NaN
+            cached = sorted({v for v in values.tolist() if v is not None and v == v})
+            self._distinct[col] = cached
+        return cached
+
+    def nbytes(self) -> int:
+        total = self._order.nbytes + self._sorted_keys.nbytes
+        for col, arr in self.columns.items():
+            total += arr.nbytes
+            if arr.dtype == object:
+                total += sum(sys.getsizeof(v) for v in arr)
+            mask = self.masks[col]
+            if mask is not None:
+                total += mask.nbytes
+        return total
+
+
+class DimensionCache:
+    """Load-once, version-checked cache of the dimension tables."""
+
+    def __init__(
+        self,
+        connect: Callable | None = None,
+        version: Callable[[], str] = get_data_version,
+        tables: dict[str, str] = DIMENSION_TABLES,
+    ):
+        self._connect = connect or (lambda: get_pool().cursor())
+        self._version_fn = version
+        self.tables = dict(tables)
+        self._lock = threading.Lock()
+        self._loaded: dict[str, _Table] = {}
+        self._version: str | None = None
+        self.loads = 0
+
+    def _table(self, name: str) -> _Table:
+        version = self._version_fn()
+        with self._lock:
+            if version != self._version:
+                self._loaded.clear()
+                self._version = version
+            table = self._loaded.get(name)
+            if table is None:
+                key = self.tables[name]
+                con = self._connect()
+                try:
+                    arrays = con.execute(f"SELECT * FROM {name}").fetchnumpy()
+                finally:
+                    con.close()
+                table = _Table(name, key, arrays)
+                self._loaded[name] = table
+                self.loads += 1
+            return table
+
+    def lookup(
+        self, name: str, ids: Iterable[int], columns: list[str]
+    ) -> dict[int, tuple]:
+        """Return ``{primary key: row}`` for the ``ids`` present in ``name``.
+
+        ``columns`` selects (and orders) the values in each row tuple; names
+        are matched case-insensitively.
+        """
+        table = self._table(name)
+        positions = table.positions(ids)
+        if not positions:
+            return {}
+        keys = list(positions)
+        rows = table.rows([positions[k] for k in keys], columns)
+        return dict(zip(keys, rows))
+
+    def distinct(self, name: str, column: str) -> list:
+        """Return the sorted distinct non-null values of ``column`` in ``name``."""
+        return self._table(name).distinct(column)
+
+    def memory_usage(self) -> dict[str, dict]:
+        """Report row counts and approximate bytes held for each loaded table."""
+        with self._lock:
+            return {
+                name: {"rows": len(table), "bytes": table.nbytes()}
+                for name, table in self._loaded.items()
+            }
+
+    def stats(self) -> dict:
+        return {"loads": self.loads, "version": self._version, "tables": self.memory_usage()}
+
+
+_cache: DimensionCache | None = None
+
+
+def get_dimension_cache() -> DimensionCache:
+    global _cache
+    if _cache is None:
+        _cache = DimensionCache()
+    return _cache
+
+
+__all__ = ["DIMENSION_TABLES", "DimensionCache", "get_dimension_cache"]
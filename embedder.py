@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+"""Batched, concurrent embedding for the ingest scripts.
+
+:class:`BatchEmbedder` splits ``(id, text, metadata)`` records into chunks of
+``KYDXBOT_EMBED_BATCH`` texts, embeds up to ``KYDXBOT_EMBED_CONCURRENCY``
+chunks at once (one API request each, paced by a :class:`RateLimiter` capped
+at ``KYDXBOT_EMBED_RPM`` requests per minute) and yields finished chunks as
+ready-to-upsert vectors.  The caller upserts one chunk while the next ones are
+still being embedded, so ingest time scales with the number of batches rather
+than the number of rows.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Sequence
+
+import numpy as np
+
+EMBED_BATCH = int(os.getenv("KYDXBOT_EMBED_BATCH", "100"))
+EMBED_CONCURRENCY = int(os.getenv("KYDXBOT_EMBED_CONCURRENCY", "4"))
+EMBED_RPM = float(os.getenv("KYDXBOT_EMBED_RPM", "500"))
+
+Record = tuple[str, str, dict]
+
+
+class RateLimiter:
+    """Token bucket allowing ``per_minute`` acquisitions per minute."""
+
+    def __init__(self, per_minute: float, burst: int = 1):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.burst = max(burst, 1)
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last) / self.interval
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) * self.interval
+            time.sleep(wait_for)
+
+
+def _chunks(records: Iterable[Record], size: int) -> Iterator[list[Record]]:
+    chunk: list[Record] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BatchEmbedder:
+    """Embed records in concurrent, rate-limited batches."""
+
+    def __init__(
+        self,
+        embed_batch: Callable[[Sequence[str]], list[np.ndarray]],
+        batch_size: int = EMBED_BATCH,
+        concurrency: int = EMBED_CONCURRENCY,
+        requests_per_minute: float = EMBED_RPM,
+    ):
+        self._embed_batch = embed_batch
+        self.batch_size = max(batch_size, 1)
+        self.concurrency = max(concurrency, 1)
+        self._limiter = RateLimiter(requests_per_minute, burst=self.concurrency)
+
+    def _embed_chunk(self, chunk: list[Record]) -> list[tuple[str, list, dict]]:
+        self._limiter.acquire()
+        vectors = self._embed_batch([text for _, text, _ in chunk])
+        return [
+            (vid, vec.tolist(), meta)
+            for (vid, _, meta), vec in zip(chunk, vectors)
+        ]
+
+    def embed_records(
+        self, records: Iterable[Record]
+    ) -> Iterator[list[tuple[str, list, dict]]]:
+        """Yield ``[(id, values, metadata), ...]`` batches as they finish.
+
+        At most ``2 × concurrency`` chunks are in flight, which bounds memory
+        when the consumer (the upsert) is slower than the embedding API.
+        Batches may complete out of input order.
+        """
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="kydxbot-embed"
+        ) as pool:
+            pending: set[Future] = set()
+            for chunk in _chunks(records, self.batch_size):
+                if len(pending) >= 2 * self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        yield fut.result()
+                pending.add(pool.submit(self._embed_chunk, chunk))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+
+
+__all__ = ["BatchEmbedder", "RateLimiter", "EMBED_BATCH", "EMBED_CONCURRENCY", "EMBED_RPM"]
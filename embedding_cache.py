@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+"""Content-addressed cache of OpenAI embeddings.
+
+Vectors are keyed on ``(model, sha256(text))`` and stored as raw float32
+bytes in a SQLite file (``KYDXBOT_EMBEDDING_CACHE``, default
+``data/embeddings.sqlite``), so re-ingesting unchanged rows or asking the same
+question twice never calls the embeddings API again.  An in-memory LRU of
+``KYDXBOT_EMBEDDING_CACHE_SIZE`` vectors sits in front of the file.  Set
+``KYDXBOT_EMBEDDING_CACHE`` to an empty string to keep the memory tier only.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+if __package__:
+    from .cache_store import CacheStore
+else:  # imported by ``python pinecone_utils.py``
+    from cache_store import CacheStore
+
+EMBEDDING_CACHE_DISK = os.getenv(
+    "KYDXBOT_EMBEDDING_CACHE",
+    os.path.join(os.path.dirname(__file__), "data", "embeddings.sqlite"),
+)
+EMBEDDING_CACHE_SIZE = int(os.getenv("KYDXBOT_EMBEDDING_CACHE_SIZE", "1024"))
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def _frozen(vec: np.ndarray) -> np.ndarray:
+    # Cached arrays are shared between callers, so make them read-only
+    vec = np.ascontiguousarray(vec, dtype=np.float32)
+    vec.setflags(write=False)
+    return vec
+
+
+class EmbeddingCache:
+    """LRU of embeddings in front of a SQLite store of float32 blobs."""
+
+    def __init__(
+        self,
+        maxsize: int = EMBEDDING_CACHE_SIZE,
+        disk_path: str | os.PathLike | None = EMBEDDING_CACHE_DISK or None,
+    ):
+        self.maxsize = maxsize
+        self._store = CacheStore(
+            "embedding cache",
+            "embeddings",
+            keys={"model": "TEXT", "digest": "BLOB"},
+            values={"vector": "BLOB"},
+            disk_path=disk_path,
+            maxsize=maxsize,
+            encode=lambda vec: (vec.tobytes(),),
+            decode=lambda row: _frozen(np.frombuffer(row[0], dtype=np.float32)),
+            without_rowid=True,
+        )
+
+    @property
+    def disk_path(self) -> Path | None:
+        return self._store.disk_path
+
+    def get(self, model: str, text: str) -> np.ndarray | None:
+        """Return the cached (read-only) embedding of ``text`` or ``None``."""
+        return self._store.get((model, text_digest(text)))
+
+    def put(self, model: str, text: str, vec: np.ndarray) -> np.ndarray:
+        """Store ``vec`` for ``text`` and return the cached read-only copy."""
+        vec = _frozen(vec)
+        self._store.put((model, text_digest(text)), vec)
+        return vec
+
+    def get_many(self, model: str, texts: Sequence[str]) -> list[np.ndarray | None]:
+        """:meth:`get` for many texts, with one disk query for all of them."""
+        return self._store.get_many((model, text_digest(t)) for t in texts)
+
+    def put_many(self, model: str, vectors: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+        """:meth:`put` for ``text → vector``, written to disk in one transaction."""
+        frozen = {text: _frozen(vec) for text, vec in vectors.items()}
+        self._store.put_many(((model, text_digest(t)), v) for t, v in frozen.items())
+        return frozen
+
+    def stats(self) -> dict:
+        return self._store.stats()
+
+
+_cache: EmbeddingCache | None = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
+
+
+__all__ = ["EmbeddingCache", "get_embedding_cache", "text_digest"]
@@ -1,7 +1,6 @@
 import uuid
 import base64
 from pathlib import Path
-import duckdb
 import networkx as nx
 import matplotlib.pyplot as plt
 try:  # OpenAI is optional for ERD descriptions
@@ -10,7 +9,7 @@ except Exception:  # pragma: no cover - optional dep may be missing
     OpenAI = None
 
 from .chart_style import set_default_style
-from .db import DUCKDB_PATH
+from .db import DUCKDB_PATH, read_connection
 
 set_default_style()
 # Save ER diagrams in the same ``charts`` folder used by other modules so the
@@ -19,23 +18,21 @@ OUTPUT_DIR = Path("charts")
 
 def get_data_summary(db_path: str = DUCKDB_PATH) -> str:
     """Return a human readable summary of the tables in the DuckDB database."""
-    con = duckdb.connect(db_path)
-    tables = sorted(row[0] for row in con.execute("SHOW TABLES").fetchall())
-
-    details = []
-    for tbl in tables:
-        cols = [row[0] for row in con.execute(f"DESCRIBE {tbl}").fetchall()]
-        cols = sorted(cols)
-        try:
-            count = con.execute(f"SELECT COUNT(*) FROM {tbl}").fetchone()[0]
-        except Exception:
-            count = "?"
-        sample_cols = ", ".join(cols[:5])
-        details.append(
-            f"The '{tbl}' table contains {count} rows and columns such as {sample_cols}."
-        )
-
-    con.close()
+    with read_connection(db_path) as con:
+        tables = sorted(row[0] for row in con.execute("SHOW TABLES").fetchall())
+
+        details = []
+        for tbl in tables:
+            cols = [row[0] for row in con.execute(f"DESCRIBE {tbl}").fetchall()]
+            cols = sorted(cols)
+            try:
+                count = con.execute(f"SELECT COUNT(*) FROM {tbl}").fetchone()[0]
+            except Exception:
+                count = "?"
+            sample_cols = ", ".join(cols[:5])
+            details.append(
+                f"The '{tbl}' table contains {count} rows and columns such as {sample_cols}."
+            )
 
     if not tables:
         return "The database is empty." 
@@ -46,21 +43,20 @@ def get_data_summary(db_path: str = DUCKDB_PATH) -> str:
 
 def generate_erd(db_path: str = DUCKDB_PATH) -> str:
     """Create a basic ER diagram from table relationships."""
-    con = duckdb.connect(db_path)
-    tables = sorted(row[0] for row in con.execute("SHOW TABLES").fetchall())
-    edges = []
-    for tbl in tables:
-        cols = [row[0] for row in con.execute(f"DESCRIBE {tbl}").fetchall()]
-        cols = sorted(cols)
-        for col in cols:
-            if col.endswith("_id"):
-                ref = col[:-3]
-                # naive match to other table
-                for t in tables:
-                    if t == ref or t.rstrip('s') == ref:
-                        edges.append((tbl, t))
-                        break
-    con.close()
+    with read_connection(db_path) as con:
+        tables = sorted(row[0] for row in con.execute("SHOW TABLES").fetchall())
+        edges = []
+        for tbl in tables:
+            cols = [row[0] for row in con.execute(f"DESCRIBE {tbl}").fetchall()]
+            cols = sorted(cols)
+            for col in cols:
+                if col.endswith("_id"):
+                    ref = col[:-3]
+                    # naive match to other table
+                    for t in tables:
+                        if t == ref or t.rstrip('s') == ref:
+                            edges.append((tbl, t))
+                            break
 
     G = nx.DiGraph()
     for t in tables:
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+"""Bounded worker pool used to keep blocking work off the event loop.
+
+The chat pipeline (LangChain, DuckDB, matplotlib) is fully synchronous, so
+calling it directly from an ``async`` FastAPI endpoint stalls every other
+request on the worker.  :func:`run_bounded` hands the call to a dedicated
+thread pool instead and applies simple admission control: at most
+``KYDXBOT_MAX_WORKERS`` calls run at once, at most ``KYDXBOT_MAX_QUEUE`` more
+may wait for a slot and anything beyond that is rejected with
+:class:`PoolFullError` so the API can answer ``503`` right away.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+MAX_WORKERS = int(os.getenv("KYDXBOT_MAX_WORKERS", "4"))
+MAX_QUEUE = int(os.getenv("KYDXBOT_MAX_QUEUE", "16"))
+RETRY_AFTER_SECONDS = int(os.getenv("KYDXBOT_RETRY_AFTER", "5"))
+
+_executor: ThreadPoolExecutor | None = None
+_lock = threading.Lock()
+_in_flight = 0
+_stats: dict[str, dict[str, float]] = {}
+
+
+class PoolFullError(RuntimeError):
+    """Raised when the worker pool and its wait queue are both full."""
+
+    def __init__(self, endpoint: str, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__(f"Server busy, too many pending '{endpoint}' requests")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=MAX_WORKERS, thread_name_prefix="kydxbot-worker"
+        )
+    return _executor
+
+
+def _endpoint_stats(endpoint: str) -> dict[str, float]:
+    stats = _stats.get(endpoint)
+    if stats is None:
+        stats = {
+            "queued": 0,
+            "running": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0,
+            "max_run_ms": 0.0,
+        }
+        _stats[endpoint] = stats
+    return stats
+
+
+def _admit(endpoint: str) -> None:
+    global _in_flight
+    with _lock:
+        stats = _endpoint_stats(endpoint)
+        if _in_flight >= MAX_WORKERS + MAX_QUEUE:
+            stats["rejected"] += 1
+            raise PoolFullError(endpoint)
+        _in_flight += 1
+        stats["queued"] += 1
+
+
+def _withdraw(endpoint: str) -> None:
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+        _endpoint_stats(endpoint)["queued"] -= 1
+
+
+def _release(endpoint: str, run_ms: float, ok: bool) -> None:
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+        stats = _endpoint_stats(endpoint)
+        stats["running"] -= 1
+        stats["completed" if ok else "failed"] += 1
+        stats["total_run_ms"] += run_ms
+        stats["max_run_ms"] = max(stats["max_run_ms"], run_ms)
+
+
+def _timed_call(endpoint: str, submitted: float, fn: Callable[[], Any]) -> Any:
+    started = time.perf_counter()
+    with _lock:
+        stats = _endpoint_stats(endpoint)
+        stats["queued"] -= 1
+        stats["running"] += 1
+        stats["total_wait_ms"] += (started - submitted) * 1000
+    ok = False
+    try:
+        result = fn()
+        ok = True
+        return result
+    finally:
+        _release(endpoint, (time.perf_counter() - started) * 1000, ok)
+
+
+def submit_bounded(
+    endpoint: str, fn: Callable[..., Any], *args, **kwargs
+) -> asyncio.Future:
+    """Schedule ``fn(*args, **kwargs)`` in the worker pool and return its future.
+
+    Admission is decided synchronously, so :class:`PoolFullError` is raised
+    before the caller has committed to a response (e.g. a streaming one).
+    """
+
+    _admit(endpoint)
+    call = functools.partial(fn, *args, **kwargs)
+    submitted = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        job = get_executor().submit(_timed_call, endpoint, submitted, call)
+    except Exception:
+        # Submission itself failed, so ``_timed_call`` will never release
+        _withdraw(endpoint)
+        raise
+    # Cancelling the awaiting task cancels a job no worker has picked up yet
+    # (a job that already started cannot be cancelled and releases itself)
+    job.add_done_callback(lambda f: f.cancelled() and _withdraw(endpoint))
+    return asyncio.wrap_future(job, loop=loop)
+
+
+async def run_bounded(endpoint: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run ``fn(*args, **kwargs)`` in the worker pool and await the result.
+
+    ``endpoint`` labels the call in :func:`get_stats`.  :class:`PoolFullError`
+    is raised immediately when no worker or queue slot is available.
+    """
+
+    return await submit_bounded(endpoint, fn, *args, **kwargs)
+
+
+def get_stats() -> dict:
+    """Return pool utilisation plus per-endpoint queue depth and latency."""
+
+    with _lock:
+        endpoints = {}
+        for name, stats in _stats.items():
+            done = stats["completed"] + stats["failed"]
+            endpoints[name] = {
+                "queue_depth": int(stats["queued"]),
+                "running": int(stats["running"]),
+                "completed": int(stats["completed"]),
+                "failed": int(stats["failed"]),
+                "rejected": int(stats["rejected"]),
+                "avg_wait_ms": round(stats["total_wait_ms"] / done, 2) if done else 0.0,
+                "avg_run_ms": round(stats["total_run_ms"] / done, 2) if done else 0.0,
+                "max_run_ms": round(stats["max_run_ms"], 2),
+            }
+        return {
+            "max_workers": MAX_WORKERS,
+            "max_queue": MAX_QUEUE,
+            "in_flight": _in_flight,
+            "endpoints": endpoints,
+        }
+
+
+__all__ = ["PoolFullError", "submit_bounded", "run_bounded", "get_stats", "get_executor"]
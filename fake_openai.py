@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+"""Deterministic offline stand-in for the OpenAI embeddings and chat APIs.
+
+:class:`FakeOpenAIServer` is a small ``http.server`` speaking the subset of the
+OpenAI REST API this package uses, so the real clients (``openai``,
+``langchain_openai``) run unchanged against it:
+
+* ``POST /v1/embeddings`` returns :func:`fake_embedding` vectors: hashed bag
+  of words, unit length, so texts sharing words are close and the same text
+  always maps to the same vector.
+* ``POST /v1/chat/completions`` answers the SQLDatabaseChain prompt with a
+  recorded SQL statement for the question (``RECORDED_SQL`` plus the JSON
+  file ``KYDXBOT_FAKE_OPENAI_RECORDINGS``) and any other conversation with a
+  canned reply; ``stream=True`` is served as server-sent events.
+
+Every request sleeps ``KYDXBOT_FAKE_OPENAI_LATENCY_MS`` first and streamed
+replies ``KYDXBOT_FAKE_OPENAI_TOKEN_MS`` per chunk, so benchmarks see
+realistic wait times without the network.  Run it standalone with::
+
+    python -m kydxbot.fake_openai
+
+and export the variables it prints before starting the service.  They also
+select the local vector backend and keep its index and ingest manifest under
+``KYDXBOT_FAKE_OPENAI_DATA`` (a temp directory by default), so an offline
+ingest never writes fake vectors to Pinecone or ``data/``.  Under
+``KYDXBOT_TESTING=1`` :mod:`pinecone_utils` uses :func:`fake_embedding`
+in-process and an in-memory :class:`~vector_index.LocalIndex`.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+FAKE_LATENCY_MS = float(os.getenv("KYDXBOT_FAKE_OPENAI_LATENCY_MS", "0"))
+FAKE_TOKEN_MS = float(os.getenv("KYDXBOT_FAKE_OPENAI_TOKEN_MS", "0"))
+FAKE_RECORDINGS = os.getenv("KYDXBOT_FAKE_OPENAI_RECORDINGS", "")
+FAKE_PORT = int(os.getenv("KYDXBOT_FAKE_OPENAI_PORT", "8765"))
+# Where offline ingests keep their vector index and manifest
+FAKE_DATA_DIR = os.getenv(
+    "KYDXBOT_FAKE_OPENAI_DATA", os.path.join(tempfile.gettempdir(), "kydxbot-fake-openai")
+)
+
+FAKE_EMBEDDING_DIM = 1536
+# Buckets each word is hashed into; more buckets mean fewer collisions
+_BUCKETS_PER_TOKEN = 4
+
+# SQL the chain "generates" for questions without a recording
+DEFAULT_SQL = "SELECT COUNT(*) AS customers FROM customers"
+
+# Recorded SQLDatabaseChain completions for common questions on the marts
+RECORDED_SQL = {
+    "how many customers are there": "SELECT COUNT(*) AS customers FROM customers",
+    "top 5 customers by web sessions": (
+        "SELECT customer_first_name, customer_last_name, num_web_sessions"
+        " FROM customers ORDER BY num_web_sessions DESC LIMIT 5"
+    ),
+    "top 10 products by profit": (
+        "SELECT product_name, profit FROM products ORDER BY profit DESC LIMIT 10"
+    ),
+    "total sales by product category": (
+        "SELECT product_category, SUM(sales_amount) AS total_sales FROM products"
+        " GROUP BY product_category ORDER BY total_sales DESC"
+    ),
+    "which distribution center has the most items in stock": (
+        "SELECT distribution_center_name, items_in_stock"
+        " FROM distribution_center_inventory ORDER BY items_in_stock DESC LIMIT 1"
+    ),
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# SQLDatabaseChain's prompt ends with "Question: <q>\nSQLQuery:" (the greedy
+# prefix skips the "Question:" lines of the format instructions)
+_SQL_PROMPT_RE = re.compile(r".*Question:\s*(.*?)\s*SQLQuery:\s*$", re.S)
+
+
+def _normalize(question: str) -> str:
+    return " ".join(_TOKEN_RE.findall(question.lower()))
+
+
+def fake_embedding(text: str, dim: int = FAKE_EMBEDDING_DIM) -> np.ndarray:
+    """Deterministic unit-length float32 embedding of ``text``.
+
+    Every word adds ``±1`` to a few hashed buckets, so cosine similarity
+    tracks word overlap; text without words hashes as a whole.
+    """
+    tokens = _TOKEN_RE.findall(text.lower()) or [text]
+    idx = np.empty(len(tokens) * _BUCKETS_PER_TOKEN, dtype=np.int64)
+    signs = np.empty(len(idx), dtype=np.float32)
+    for i, token in enumerate(tokens):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=4 * _BUCKETS_PER_TOKEN).digest()
+        words = np.frombuffer(digest, dtype="<u4")
+        base = i * _BUCKETS_PER_TOKEN
+        idx[base:base + _BUCKETS_PER_TOKEN] = words % dim
+        signs[base:base + _BUCKETS_PER_TOKEN] = np.where(words & 0x80000000, -1.0, 1.0)
+    vec = np.zeros(dim, dtype=np.float32)
+    np.add.at(vec, idx, signs)
+    norm = float(np.linalg.norm(vec))
+    if norm == 0:
+        # Every bucket cancelled out; fall back to the first token's buckets
+        vec[idx[:_BUCKETS_PER_TOKEN]] = 1.0
+        norm = float(np.linalg.norm(vec))
+    return vec / norm
+
+
+def load_recordings(path: str | os.PathLike | None = FAKE_RECORDINGS or None) -> dict[str, str]:
+    """``RECORDED_SQL`` merged with the ``{question: sql}`` JSON at ``path``."""
+    recordings = {_normalize(q): sql for q, sql in RECORDED_SQL.items()}
+    if path:
+        try:
+            extra = json.loads(Path(path).read_text(encoding="utf-8"))
+            recordings.update({_normalize(q): sql for q, sql in extra.items()})
+        except Exception as e:  # noqa: BLE001
+            print(f"⚠️ Ignoring unreadable fake OpenAI recordings {path}: {e}")
+    return recordings
+
+
+class FakeOpenAIServer:
+    """Threaded local server for ``/v1/embeddings`` and ``/v1/chat/completions``."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = FAKE_LATENCY_MS,
+        token_ms: float = FAKE_TOKEN_MS,
+        recordings: dict[str, str] | None = None,
+    ):
+        self.latency_ms = latency_ms
+        self.token_ms = token_ms
+        self.recordings = load_recordings() if recordings is None else {
+            _normalize(q): sql for q, sql in recordings.items()
+        }
+        self._lock = threading.Lock()
+        self.counts = {"embeddings": 0, "embedded_texts": 0, "chat": 0, "sql": 0, "streamed": 0}
+        self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def environ(self) -> dict[str, str]:
+        """Environment variables pointing the OpenAI clients at this server.
+
+        The disk tiers of the embedding and SQL caches are disabled, and the
+        local vector index and its ingest manifest live in ``FAKE_DATA_DIR``,
+        so fake vectors and recorded SQL never end up next to real ones.
+        """
+        return {
+            "OPENAI_API_KEY": "sk-fake-offline",
+            "OPENAI_BASE_URL": self.base_url,
+            "OPENAI_API_BASE": self.base_url,
+            "KYDXBOT_EMBEDDING_CACHE": "",
+            "KYDXBOT_SQL_CACHE": "",
+            "KYDXBOT_VECTOR_BACKEND": "local",
+            "KYDXBOT_VECTOR_PATH": os.path.join(FAKE_DATA_DIR, "vector_index"),
+            "KYDXBOT_INGEST_MANIFEST": os.path.join(FAKE_DATA_DIR, "ingest_manifest.json"),
+        }
+
+    def start(self) -> "FakeOpenAIServer":
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._httpd.serve_forever, name="kydxbot-fake-openai", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def record(self, question: str, sql: str) -> None:
+        """Answer the SQL prompt for ``question`` with ``sql`` from now on."""
+        with self._lock:
+            self.recordings[_normalize(question)] = sql
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for name, n in deltas.items():
+                self.counts[name] += n
+
+    # ── responses ────────────────────────────────────────────────────────────
+    def embeddings(self, body: dict) -> dict:
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        dim = int(body.get("dimensions") or FAKE_EMBEDDING_DIM)
+        as_base64 = body.get("encoding_format") == "base64"
+        data = []
+        for i, text in enumerate(texts):
+            vec = fake_embedding(str(text), dim)
+            values = (
+                base64.b64encode(vec.astype("<f4").tobytes()).decode("ascii")
+                if as_base64 else vec.tolist()
+            )
+            data.append({"object": "embedding", "index": i, "embedding": values})
+        self._count(embeddings=1, embedded_texts=len(texts))
+        tokens = sum(len(_TOKEN_RE.findall(str(t).lower())) for t in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def reply(self, messages: list[dict]) -> str:
+        """The assistant text for a chat request."""
+        last = ""
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                last = message.get("content") or ""
+                if isinstance(last, list):  # content parts
+                    last = " ".join(p.get("text", "") for p in last if isinstance(p, dict))
+                break
+        match = _SQL_PROMPT_RE.search(last)
+        if match:
+            self._count(chat=1, sql=1)
+            with self._lock:
+                return self.recordings.get(_normalize(match.group(1)), DEFAULT_SQL)
+        self._count(chat=1)
+        return f"(offline reply) {last.strip()[:200]}"
+
+
+def _handler(server: FakeOpenAIServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # noqa: A002 - quiet by default
+            pass
+
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self, model: str, text: str) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            pieces = re.findall(r"\S+\s*", text) or [text]
+            for i, piece in enumerate(pieces):
+                if i and server.token_ms:
+                    time.sleep(server.token_ms / 1000)
+                delta = {"content": piece}
+                if i == 0:
+                    delta["role"] = "assistant"
+                self._event(chunk_id, model, delta, None)
+            self._event(chunk_id, model, {}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _event(self, chunk_id: str, model: str, delta: dict, finish: str | None) -> None:
+            chunk = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def do_POST(self):  # noqa: N802 - http.server naming
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "invalid JSON body"}})
+                return
+            if server.latency_ms:
+                time.sleep(server.latency_ms / 1000)
+
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path.endswith("/embeddings"):
+                self._send_json(200, server.embeddings(body))
+                return
+            if not path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"unknown endpoint {self.path}"}})
+                return
+
+            model = body.get("model", "gpt-4.1")
+            text = server.reply(body.get("messages", []))
+            if body.get("stream"):
+                server._count(streamed=1)
+                self._stream(model, text)
+                return
+            words = len(_TOKEN_RE.findall(text.lower()))
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": words, "total_tokens": words},
+            })
+
+    return Handler
+
+
+def start_fake_openai(**kwargs) -> FakeOpenAIServer:
+    """Start a :class:`FakeOpenAIServer` and point this process's clients at it."""
+    server = FakeOpenAIServer(**kwargs).start()
+    os.environ.update(server.environ())
+    return server
+
+
+__all__ = [
+    "FakeOpenAIServer",
+    "fake_embedding",
+    "load_recordings",
+    "start_fake_openai",
+    "DEFAULT_SQL",
+    "FAKE_DATA_DIR",
+    "FAKE_EMBEDDING_DIM",
+    "RECORDED_SQL",
+]
+
+
+if __name__ == "__main__":
+    fake = FakeOpenAIServer(port=FAKE_PORT)
+    for name, value in fake.environ().items():
+        print(f"export {name}={value}")
+    print(f"# serving fake OpenAI on {fake.base_url} (Ctrl-C to stop)")
+    try:
+        fake._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake._httpd.server_close()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+"""Append-only conversation history stored as JSON Lines.
+
+Every chat exchange is appended to ``chatbot_responses.jsonl`` as a single
+line under an exclusive file lock, so concurrent requests (threads or uvicorn
+workers) never clobber each other and each write costs O(1) instead of
+rewriting the whole history.  :func:`read_tail` seeks from the end of the file
+and only parses the lines it returns.
+
+The first access migrates a legacy ``chatbot_responses.json`` list into the
+new file and renames the old one to ``chatbot_responses.json.migrated``.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:  # POSIX advisory locks; other platforms fall back to a process lock
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+HISTORY_FILE = "chatbot_responses.jsonl"
+_BLOCK_SIZE = 8192
+_thread_lock = threading.Lock()
+
+
+def _legacy_path(path: Path) -> Path:
+    return path.with_suffix(".json")
+
+
+@contextmanager
+def _locked(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on ``path`` across threads and processes."""
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        lock_path = path.with_name(path.name + ".lock")
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _encode(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def migrate_legacy(path: str | os.PathLike = HISTORY_FILE) -> int:
+    """Move records from the legacy JSON list file into the JSONL store.
+
+    Returns the number of migrated records (``0`` when there was nothing to
+    do).  Existing JSONL entries are kept after the migrated ones.
+    """
+    path = Path(path)
+    legacy = _legacy_path(path)
+    if not legacy.exists():
+        return 0
+
+    with _locked(path):
+        if not legacy.exists():  # another worker got here first
+            return 0
+        try:
+            data = json.loads(legacy.read_text(encoding="utf-8"))
+        except Exception as e:  # noqa: BLE001
+            print(f"⚠️ Couldn’t read {legacy} for migration: {e}")
+            data = []
+        if not isinstance(data, list):
+            data = []
+
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as out:
+            for record in data:
+                if isinstance(record, dict):
+                    out.write(_encode(record))
+            if path.exists():
+                with open(path, "r", encoding="utf-8") as current:
+                    for line in current:
+                        out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, path)
+        legacy.rename(legacy.with_name(legacy.name + ".migrated"))
+    return len(data)
+
+
+def append_record(record: dict, path: str | os.PathLike = HISTORY_FILE) -> None:
+    """Atomically append ``record`` as one JSON line."""
+    path = Path(path)
+    migrate_legacy(path)
+    line = _encode(record).encode("utf-8")
+    with _locked(path):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def read_tail(limit: int, path: str | os.PathLike = HISTORY_FILE) -> list[dict]:
+    """Return the last ``limit`` records, oldest first, reading only the tail."""
+    path = Path(path)
+    migrate_legacy(path)
+    if limit <= 0 or not path.exists():
+        return []
+
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b""
+        # One extra newline guarantees the first kept line is complete
+        while pos > 0 and buf.count(b"\n") <= limit:
+            step = min(_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+
+    lines = buf.splitlines()
+    if pos > 0 and lines:
+        lines = lines[1:]
+
+    records: list[dict] = []
+    for raw in reversed(lines):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+            if len(records) == limit:
+                break
+    records.reverse()
+    return records
+
+
+__all__ = ["HISTORY_FILE", "append_record", "read_tail", "migrate_legacy"]
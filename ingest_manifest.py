@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+"""Per-ID content hashes of what the ingest last wrote to the vector index.
+
+Each ingest run hashes every record's embedded text and metadata as the
+records stream past, diffs them against the previous run
+(:meth:`IngestManifest.plan`) and only embeds/upserts new or changed rows and
+deletes vanished ones.  The manifest
+is a JSON file (``KYDXBOT_INGEST_MANIFEST``, default
+``data/ingest_manifest.json``) keyed by index then source, so switching
+between the Pinecone and local backends never skips rows the other index has.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+MANIFEST_PATH = os.getenv(
+    "KYDXBOT_INGEST_MANIFEST",
+    os.path.join(os.path.dirname(__file__), "data", "ingest_manifest.json"),
+)
+
+Record = tuple[str, str, dict]
+
+
+def content_hash(text: str, metadata: dict) -> str:
+    payload = json.dumps([text, metadata], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class IngestPlan:
+    """What an ingest run has to do to bring one source up to date.
+
+    :meth:`changed` filters the record stream down to new/changed rows while
+    collecting every id's hash; :attr:`deletes` is known once it is exhausted.
+    """
+
+    index_key: str
+    source: str
+    previous: dict[str, str] = field(default_factory=dict)
+    full: bool = False
+    deletes: list[str] = field(default_factory=list)
+    hashes: dict[str, str] = field(default_factory=dict)
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    def changed(self, records: Iterable[Record]) -> Iterator[Record]:
+        for record in records:
+            vid, text, meta = record
+            digest = content_hash(text, meta)
+            self.hashes[vid] = digest
+            old = self.previous.get(vid)
+            if old is None:
+                self.inserted += 1
+            elif old != digest or self.full:
+                self.updated += 1
+            else:
+                self.skipped += 1
+                continue
+            yield record
+        self.deletes = [vid for vid in self.previous if vid not in self.hashes]
+
+    @property
+    def deleted(self) -> int:
+        return len(self.deletes)
+
+    def summary(self) -> dict[str, int]:
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "deleted": self.deleted,
+            "skipped": self.skipped,
+        }
+
+
+class IngestManifest:
+    """JSON-backed ``{index: {source: {id: hash}}}`` map."""
+
+    def __init__(self, path: str | os.PathLike = MANIFEST_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except Exception as e:  # noqa: BLE001
+            print(f"⚠️ Ignoring unreadable ingest manifest {self.path}: {e}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def plan(self, index_key: str, source: str, full: bool = False) -> IngestPlan:
+        """Start a diff of ``source`` against its last committed run.
+
+        With ``full=True`` every record is treated as changed (vanished ids
+        are still deleted).
+        """
+        with self._lock:
+            previous = self._read().get(index_key, {}).get(source, {})
+        return IngestPlan(index_key, source, previous=previous, full=full)
+
+    def commit(self, plan: IngestPlan) -> None:
+        """Record ``plan`` as applied; call only after the index was updated."""
+        with self._lock:
+            data = self._read()
+            data.setdefault(plan.index_key, {})[plan.source] = plan.hashes
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+__all__ = ["IngestManifest", "IngestPlan", "content_hash", "MANIFEST_PATH"]
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+"""Deterministic SQL for the most common question shapes.
+
+"Top 10 customers by revenue", "Which 5 products have the highest profit",
+"How many customers are there" and "What is the average profit per product"
+need no LLM: :meth:`IntentMatcher.match` recognises them with a few anchored
+patterns, resolves the entity to a mart and the metric to one of its numeric
+columns (using the :mod:`schema_context` snapshot, so only real columns are
+ever named), and fills in a fixed SQL template.  Anything the patterns or the
+column lookup cannot pin down exactly returns ``None`` and goes to the LLM.
+
+Set ``KYDXBOT_INTENT_TEMPLATES=0`` to send every question to the LLM.
+"""
+
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from .db import QueryResult
+from .schema_context import TableSchema, get_schema_context
+from .sql_guard import GuardedSql, SqlRejected, get_sql_guard
+
+INTENT_TEMPLATES = os.getenv("KYDXBOT_INTENT_TEMPLATES", "1") == "1"
+# Rows for "top customers by X" when the question names no N
+INTENT_DEFAULT_LIMIT = int(os.getenv("KYDXBOT_INTENT_DEFAULT_LIMIT", "10"))
+
+
+@dataclass(frozen=True)
+class Entity:
+    table: str
+    names: tuple[str, ...]  # singular and plural phrases naming the mart
+    labels: tuple[str, ...]  # columns identifying a row in top-N answers
+
+
+ENTITIES = (
+    Entity(
+        "customers",
+        ("customer", "customers", "client", "clients", "user", "users", "shopper", "shoppers"),
+        ("customer_first_name", "customer_last_name"),
+    ),
+    Entity("products", ("product", "products", "item", "items"), ("product_name",)),
+    Entity(
+        "distribution_center_inventory",
+        (
+            "distribution center", "distribution centers", "distribution centre",
+            "distribution centres", "center", "centers", "warehouse", "warehouses",
+        ),
+        ("distribution_center_name",),
+    ),
+)
+
+# Question word → column words it may stand for (all singular)
+_METRIC_SYNONYMS = {
+    "revenue": ("sale", "spent"),
+    "spend": ("spent",),
+    "spending": ("spent",),
+    "visit": ("session",),
+    "return": ("returned",),
+    "cancellation": ("cancelled",),
+    "purchase": ("purchased",),
+    "earning": ("profit",),
+    "margin": ("profit",),
+    "cog": ("cost",),
+}
+_FILLER = frozenset("the a an of total amount number num".split())
+_DESC = frozenset("top highest most largest biggest greatest best".split())
+_NUMERIC = {"int", "float", "decimal"}
+
+_PREFIX_RE = re.compile(
+    r"^(?:please\s+)?(?:(?:show|list|give|get|find|tell)\s+(?:me\s+)?|what\s+are\s+|who\s+are\s+)?"
+)
+_TOP = r"(?:the\s+)?(?P<dir>top|bottom)\s+(?P<n>\d+)?\s*(?P<entity>{e})"
+_TOP_BY_RE = (
+    _TOP + r"\s+(?:by|ranked\s+by|sorted\s+by|in\s+terms\s+of)\s+(?:their\s+)?(?P<metric>[a-z ]+)"
+)
+_WHICH_RE = (
+    r"(?:which|what)\s+(?P<n>\d+\s+)?(?P<entity>{e})\s+(?:have|has|had|made|make)\s+the\s+"
+    r"(?P<dir>highest|most|largest|biggest|greatest|lowest|least|smallest|fewest)\s+"
+    r"(?:number\s+of\s+|amount\s+of\s+)?(?P<metric>[a-z ]+)"
+)
+_COUNT_RE = (
+    r"(?:how\s+many\s+(?P<entity>{e})(?:\s+(?:are\s+there|do\s+we\s+have|exist|are\s+in\s+the\s+(?:database|data)))?"
+    r"|(?:what\s+is\s+|what's\s+)?(?:the\s+)?(?:total\s+)?(?:number|count)\s+of\s+(?P<entity2>{e}))"
+)
+_AVERAGE_RE = (
+    r"(?:what\s+is\s+|what's\s+)?(?:the\s+)?(?:average|avg|mean)\s+(?P<metric>[a-z ]+?)"
+    r"(?:\s+(?:per|of|for|across|by)\s+(?:all\s+|each\s+|a\s+)?(?P<entity>{e}))?"
+)
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str  # "top", "count" or "average"
+    table: str
+    sql: str
+    limit: int | None = None
+    metric: str | None = None
+
+
+def _normalize(question: str) -> str:
+    q = re.sub(r"\s+", " ", question.lower()).strip().rstrip("?.! ")
+    return _PREFIX_RE.sub("", q, count=1)
+
+
+def _singular(word: str) -> str:
+    return word[:-1] if word.endswith("s") and len(word) > 3 else word
+
+
+def _metric_words(text: str) -> set[str]:
+    return {_singular(w) for w in re.findall(r"[a-z0-9]+", text)} - _FILLER
+
+
+def resolve_metric(phrase: str, schema: TableSchema) -> str | None:
+    """The one numeric column of ``schema`` that ``phrase`` names, if any."""
+    words = _metric_words(phrase)
+    if not words:
+        return None
+    best: list[tuple[int, str]] = []
+    for name, typ, _ in schema.columns:
+        if typ not in _NUMERIC or name.endswith("_id"):
+            continue
+        col = {_singular(w) for w in name.split("_")}
+        if all(w in col or col & set(_METRIC_SYNONYMS.get(w, ())) for w in words):
+            best.append((len(col - words), name))
+    best.sort()
+    if not best or (len(best) > 1 and best[0][0] == best[1][0]):
+        return None  # unknown or ambiguous: let the LLM decide
+    return best[0][1]
+
+
+class IntentMatcher:
+    """Maps recognised question shapes over the marts to fixed SQL."""
+
+    def __init__(
+        self,
+        snapshot: Callable[[], dict[str, TableSchema]] = lambda: get_schema_context().snapshot(),
+        entities: tuple[Entity, ...] = ENTITIES,
+        default_limit: int = INTENT_DEFAULT_LIMIT,
+        enabled: bool = INTENT_TEMPLATES,
+    ):
+        self._snapshot = snapshot
+        self.default_limit = default_limit
+        self.enabled = enabled
+        self._entities = {}
+        for entity in entities:
+            for name in entity.names:
+                self._entities[name] = entity
+        alternation = "|".join(
+            re.escape(n) for n in sorted(self._entities, key=len, reverse=True)
+        )
+        self._patterns = [
+            ("top", re.compile(_TOP_BY_RE.format(e=alternation))),
+            ("top", re.compile(_WHICH_RE.format(e=alternation))),
+            ("count", re.compile(_COUNT_RE.format(e=alternation))),
+            ("average", re.compile(_AVERAGE_RE.format(e=alternation))),
+        ]
+        self._lock = threading.Lock()
+        self.counts = {"matched": 0, "missed": 0, "run": 0, "errors": 0, "run_ms": 0.0}
+
+    def _count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counts[name] += value
+
+    def match(self, question: str) -> Intent | None:
+        """The templated query answering ``question``, or ``None``."""
+        if not self.enabled:
+            return None
+        q = _normalize(question)
+        for kind, pattern in self._patterns:
+            m = pattern.fullmatch(q)
+            if m is None:
+                continue
+            try:
+                intent = getattr(self, f"_template_{kind}")(m, self._snapshot())
+            except Exception as e:  # noqa: BLE001
+                print("intent template error:", e)
+                intent = None
+            if intent is not None:
+                self._count("matched")
+                return intent
+        self._count("missed")
+        return None
+
+    def _entity(self, m: re.Match, snapshot: dict) -> tuple[Entity, TableSchema] | None:
+        name = m.groupdict().get("entity") or m.groupdict().get("entity2")
+        entity = self._entities.get(name) if name else None
+        if entity is None or entity.table not in snapshot or not snapshot[entity.table].columns:
+            return None
+        return entity, snapshot[entity.table]
+
+    def _template_top(self, m: re.Match, snapshot: dict) -> Intent | None:
+        found = self._entity(m, snapshot)
+        if found is None:
+            return None
+        entity, schema = found
+        metric = resolve_metric(m.group("metric"), schema)
+        if metric is None:
+            return None
+        if m.group("n"):
+            n = int(m.group("n"))
+        else:
+            # "which customer has the most ..." asks for one row
+            n = 1 if _singular(m.group("entity")) == m.group("entity") else self.default_limit
+        n = min(n, get_sql_guard().row_cap)
+        columns = {c for c, _, _ in schema.columns}
+        labels = [c for c in entity.labels if c in columns] or [schema.columns[0][0]]
+        order = "DESC" if m.group("dir") in _DESC else "ASC"
+        sql = (
+            f"SELECT {', '.join(labels)}, {metric} FROM {entity.table}"
+            f" WHERE {metric} IS NOT NULL ORDER BY {metric} {order} LIMIT {n}"
+        )
+        return Intent("top", entity.table, sql, n, metric)
+
+    def _template_count(self, m: re.Match, snapshot: dict) -> Intent | None:
+        found = self._entity(m, snapshot)
+        if found is None:
+            return None
+        table = found[0].table
+        return Intent("count", table, f"SELECT COUNT(*) AS {table} FROM {table}")
+
+    def _template_average(self, m: re.Match, snapshot: dict) -> Intent | None:
+        phrase = m.group("metric")
+        if m.group("entity"):
+            found = self._entity(m, snapshot)
+            if found is None:
+                return None
+            candidates = [found[1]]
+        else:
+            candidates = [s for s in snapshot.values() if s.columns]
+        resolved = [(s.name, resolve_metric(phrase, s)) for s in candidates]
+        resolved = [(t, c) for t, c in resolved if c is not None]
+        if len(resolved) != 1:
+            return None
+        table, metric = resolved[0]
+        sql = f"SELECT AVG({metric}) AS average_{metric} FROM {table}"
+        return Intent("average", table, sql, None, metric)
+
+    def run(self, intent: Intent) -> QueryResult | None:
+        """Execute ``intent`` under the SQL guard's timeout.
+
+        Returns ``None`` when it fails so the caller can ask the LLM instead;
+        :class:`sql_guard.SqlRejected` (a timeout) propagates.
+        """
+        start = time.perf_counter()
+        try:
+            guarded = GuardedSql(intent.sql, intent.sql, 0, intent.limit or 0)
+            rows = get_sql_guard().run(guarded)
+        except SqlRejected:
+            raise
+        except Exception as e:  # noqa: BLE001
+            print("intent template failed, asking the LLM instead:", e)
+            self._count("errors")
+            return None
+        self._count("run")
+        self._count("run_ms", (time.perf_counter() - start) * 1000)
+        return rows
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        run = counts.pop("run_ms")
+        counts["avg_run_ms"] = round(run / counts["run"], 2) if counts["run"] else 0.0
+        return {**counts, "enabled": self.enabled}
+
+
+_matcher: IntentMatcher | None = None
+
+
+def get_intent_matcher() -> IntentMatcher:
+    global _matcher
+    if _matcher is None:
+        _matcher = IntentMatcher()
+    return _matcher
+
+
+__all__ = [
+    "ENTITIES",
+    "Entity",
+    "Intent",
+    "IntentMatcher",
+    "get_intent_matcher",
+    "resolve_metric",
+    "INTENT_DEFAULT_LIMIT",
+    "INTENT_TEMPLATES",
+]
@@ -1,7 +1,8 @@
 # langchain_sql.py
 
-import os, ast
+import os
 from pathlib import Path
+from typing import Callable
 try:
     from dotenv import load_dotenv
     package_dir = Path(__file__).parent
@@ -16,22 +17,38 @@ except Exception:
 from langchain_openai import ChatOpenAI
 from langchain_community.utilities import SQLDatabase
 from langchain_experimental.sql import SQLDatabaseChain
-from sqlalchemy import text
 
-from .db import get_engine
+from .db import QueryResult, get_engine
+from .schema_context import SchemaContext, get_schema_context
+from .sql_cache import get_sql_cache
+from .sql_guard import SqlRejected, get_sql_guard
 
 # 2) Load environment variables (for OPENAI_API_KEY, if you haven't set it elsewhere)
 
 ENGINE = get_engine()
-db = SQLDatabase(
-    ENGINE,
-    schema="main",
-    include_tables=[
-        "customers",
-        "products",
-        "distribution_center_inventory",
-    ],
-)
+
+
+class CompactSQLDatabase(SQLDatabase):
+    """``SQLDatabase`` whose table info comes from :mod:`schema_context`.
+
+    Nothing is reflected through SQLAlchemy; the chain only needs the dialect
+    and the prompt's table info since we execute the SQL ourselves.
+    """
+
+    def __init__(self, engine, context: SchemaContext):
+        self._engine = engine
+        self._schema = "main"
+        self._context = context
+        self._include_tables = set(context.tables)
+
+    def get_usable_table_names(self) -> list[str]:
+        return list(self._context.tables)
+
+    def get_table_info(self, table_names: list[str] | None = None, get_col_comments: bool = False) -> str:
+        return self._context.render(table_names)
+
+
+db = CompactSQLDatabase(ENGINE, get_schema_context())
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
@@ -44,41 +61,74 @@ llm = ChatOpenAI(
     temperature=0.0
 )
 
-# 5) Build a SQLDatabaseChain: it will prompt OpenAI to generate SQL, run it in DuckDB, and return results.
+# 5) Build a SQLDatabaseChain that only writes the SQL; we run it in DuckDB
+#    ourselves so results stay columnar instead of a repr() string.
 sql_chain = SQLDatabaseChain.from_llm(
     llm=ChatOpenAI(temperature=0),  # whatever params you want
     db=db,
     top_k=20,
     verbose=True,
-    return_direct=True
+    return_sql=True,
 )
 
 
-def _parse_rows(result_str: str) -> list[tuple]:
-    """Parse the SQL agent output string into ``list[tuple]`` rows."""
-    try:
-        return ast.literal_eval(result_str)
-    except Exception:
-        pass
+def _clean_sql(sql: str) -> str:
+    """Strip the prompt markers the chain also strips before executing."""
+    if "SQLQuery:" in sql:
+        sql = sql.split("SQLQuery:")[1]
+    if "SQLResult:" in sql:
+        sql = sql.split("SQLResult:")[0]
+    return sql.strip()
 
-    try:
-        start = result_str.index("[")
-        end = result_str.rindex("]") + 1
-        snippet = result_str[start:end]
-        return ast.literal_eval(snippet)
-    except Exception as exc:
-        raise ValueError(f"Unable to parse SQL result: {result_str}") from exc
-
-def query_via_sqlagent(user_question: str) -> list[tuple]:
+
+def query_via_sqlagent(
+    user_question: str,
+    on_sql: Callable[[str], None] | None = None,
+    limit: int | None = None,
+) -> QueryResult:
     """
-    1) Call ``sql_chain.run()`` to generate SQL and execute it.
-    2) Parse the returned string into ``list[tuple]`` rows.
+    1) Run the SQL cached for this (or a near-identical) question directly,
+       skipping the LLM; a cached statement that fails is forgotten.
+    2) Otherwise call ``sql_chain.invoke()`` to generate the SQL from a
+       compact schema of just the tables the question refers to.
+    3) Pass it through :mod:`sql_guard` (single SELECT, ``LIMIT`` of
+       ``limit`` or the row cap, EXPLAIN cardinality budget) and report the
+       statement to be run to ``on_sql`` (if given).
+    4) Execute it with a timeout (columnar NumPy results) and remember the
+       SQL that produced them.
+
+    Raises :class:`sql_guard.SqlRejected` when the guard refuses or stops
+    the query.
     """
+    guard = get_sql_guard()
+    cache = get_sql_cache()
+    cached = cache.lookup(user_question)
+    if cached is not None:
+        try:
+            guarded = guard.check(cached.sql, limit)
+            if on_sql is not None:
+                on_sql(guarded.sql)
+            return guard.run(guarded)
+        except SqlRejected:
+            raise
+        except Exception as e:  # noqa: BLE001
+            print("cached SQL failed, asking the LLM again:", e)
+            cache.invalidate(cached.question)
+
     try:
-        result_str = sql_chain.run(user_question)
-        rows = _parse_rows(result_str)
+        # Only the tables the question mentions go into the prompt
+        tables = get_schema_context().select_tables(user_question)
+        output = sql_chain.invoke({"query": user_question, "table_names_to_use": tables})
+        sql = _clean_sql(output["result"])
+        guarded = guard.check(sql, limit)
+        if on_sql is not None:
+            on_sql(guarded.sql)
+        rows = guard.run(guarded)
+        cache.put(user_question, sql)
         return rows
 
+    except SqlRejected:
+        raise
     except Exception as e:
         # If anything goes wrong, bubble up an exception
-        raise RuntimeError(f"SQLAgent error: {e}")
\ No newline at end of file
+        raise RuntimeError(f"SQLAgent error: {e}")
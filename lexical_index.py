@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+"""Local TF-IDF index over the texts the Pinecone ingest embeds.
+
+Product and customer names are exact-match heavy, so a sparse lexical score
+complements the embedding similarity.  :class:`LexicalIndex` fits a TF-IDF
+model (the same scikit-learn machinery :mod:`preloaded_questions` uses) over
+every ``cust_``/``prod_``/``dc_`` record and is rebuilt whenever
+:func:`db.get_data_version` changes.  Only the very first build runs on the
+request that needs it; later rebuilds run in a background thread while
+searches keep using the previous index, which is swapped out once the new
+one is ready.
+
+``handle_semantic_search`` asks it first: when the best lexical hit is both
+strong (``KYDXBOT_LEXICAL_CONFIDENCE``) and clearly ahead of the runner-up
+(``KYDXBOT_LEXICAL_MARGIN``) the answer comes from this index alone and the
+embedding call is skipped.  Otherwise vector and lexical scores are fused as
+``alpha * vector + (1 - alpha) * lexical`` (``KYDXBOT_HYBRID_ALPHA``).
+"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .db import DUCKDB_PATH, get_data_version
+from .metadata_filter import filter_mask, metadata_columns
+
+LEXICAL_CONFIDENCE = float(os.getenv("KYDXBOT_LEXICAL_CONFIDENCE", "0.5"))
+LEXICAL_MARGIN = float(os.getenv("KYDXBOT_LEXICAL_MARGIN", "0.15"))
+HYBRID_ALPHA = float(os.getenv("KYDXBOT_HYBRID_ALPHA", "0.5"))
+# Vector/lexical candidates pulled per requested result before fusing
+HYBRID_CANDIDATES = 3
+
+Record = tuple[str, str, dict]
+Hit = tuple[str, float, dict]
+
+
+class LexicalResult:
+    """Lexical scores of one query against every indexed document."""
+
+    def __init__(self, ids: list[str], positions: dict[str, int], scores: np.ndarray):
+        self._ids = ids
+        self._positions = positions
+        self.scores = scores
+
+    @property
+    def best(self) -> float:
+        return float(self.scores.max()) if len(self.scores) else 0.0
+
+    def top(self, k: int) -> list[tuple[str, float]]:
+        """Return up to ``k`` ``(id, score)`` pairs with a non-zero score."""
+        if not len(self.scores) or k <= 0:
+            return []
+        k = min(k, len(self.scores))
+        idx = np.argpartition(-self.scores, k - 1)[:k]
+        idx = idx[np.argsort(-self.scores[idx], kind="stable")]
+        return [(self._ids[i], float(self.scores[i])) for i in idx if self.scores[i] > 0]
+
+    def score(self, doc_id: str) -> float:
+        pos = self._positions.get(doc_id)
+        return float(self.scores[pos]) if pos is not None else 0.0
+
+    def confident(
+        self, confidence: float = LEXICAL_CONFIDENCE, margin: float = LEXICAL_MARGIN
+    ) -> bool:
+        top = self.top(2)
+        if not top or top[0][1] < confidence:
+            return False
+        runner_up = top[1][1] if len(top) > 1 else 0.0
+        return top[0][1] - runner_up >= margin
+
+
+def _ingest_records() -> Iterable[Record]:
+    from .pinecone_utils import (
+        iter_customer_records,
+        iter_distribution_center_records,
+        iter_product_records,
+    )
+
+    for records in (iter_customer_records, iter_product_records, iter_distribution_center_records):
+        yield from records(DUCKDB_PATH)
+
+
+@dataclass(frozen=True)
+class _Built:
+    """One fitted index, replaced as a whole when the data changes."""
+
+    vectorizer: TfidfVectorizer | None = None  # None: nothing to index
+    matrix: object = None
+    ids: list[str] = field(default_factory=list)
+    positions: dict[str, int] = field(default_factory=dict)
+    columns: dict[str, np.ndarray] = field(default_factory=dict)
+
+
+class LexicalIndex:
+    """Version-checked TF-IDF index with hybrid fusion helpers."""
+
+    def __init__(
+        self,
+        records: Callable[[], Iterable[Record]] = _ingest_records,
+        version: Callable[[], str] = get_data_version,
+    ):
+        self._records = records
+        self._version_fn = version
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # one build at a time
+        self._index: _Built | None = None
+        self._version: str | None = None  # version last built (or attempted)
+        self._pending: str | None = None  # version building in the background
+        self.counts = {
+            "builds": 0, "background_builds": 0, "searches": 0,
+            "fast_path": 0, "fused": 0, "vector_only": 0,
+        }
+
+    def _ensure(self) -> None:
+        version = self._version_fn()
+        with self._lock:
+            if version in (self._version, self._pending):
+                return
+            if self._index is not None:
+                # Keep serving the current index until the new one is ready
+                self._pending = version
+                threading.Thread(
+                    target=self._build, args=(version,),
+                    name="kydxbot-lexical-build", daemon=True,
+                ).start()
+                return
+        self._build(version)  # nothing to serve yet
+
+    def _build(self, version: str) -> None:
+        with self._build_lock:
+            with self._lock:
+                if version == self._version:
+                    return  # a concurrent first build just finished it
+                background = version == self._pending
+            built = None
+            try:
+                ids, texts, metas = [], [], []
+                for doc_id, text, meta in self._records():
+                    if text:
+                        ids.append(doc_id)
+                        texts.append(text)
+                        metas.append(meta)
+                built = _Built()
+                if texts:
+                    vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True)
+                    built = _Built(
+                        vectorizer,
+                        vectorizer.fit_transform(texts).tocsr(),
+                        ids,
+                        {doc_id: i for i, doc_id in enumerate(ids)},
+                        metadata_columns(metas),
+                    )
+            except Exception as e:  # noqa: BLE001
+                print("lexical index build error", e)
+            with self._lock:
+                # Remember the version even if the build fails so a broken
+                # database isn't re-read on every query; a failed rebuild
+                # keeps serving the previous index
+                self._version = version
+                if self._pending == version:
+                    self._pending = None
+                if built is not None:
+                    self._index = built
+                    self.counts["builds"] += 1
+                    self.counts["background_builds"] += background
+
+    def search(self, query: str, filter: dict | None = None) -> LexicalResult:
+        """Score ``query`` against every document (cosine of TF-IDF vectors).
+
+        Documents excluded by ``filter`` are not scored and keep a score of 0.
+        """
+        self._ensure()
+        with self._lock:
+            built = self._index or _Built()
+            self.counts["searches"] += 1
+        vectorizer, matrix = built.vectorizer, built.matrix
+        ids, positions, columns = built.ids, built.positions, built.columns
+        if vectorizer is None:
+            return LexicalResult([], {}, np.zeros(0, dtype=np.float32))
+        q = vectorizer.transform([query]).T
+        if not filter:
+            scores = (matrix @ q).toarray().ravel().astype(np.float32)
+            return LexicalResult(ids, positions, scores)
+        rows = np.flatnonzero(filter_mask(columns, filter, len(ids)))
+        scores = np.zeros(len(ids), dtype=np.float32)
+        if len(rows):
+            scores[rows] = (matrix[rows] @ q).toarray().ravel()
+        return LexicalResult(ids, positions, scores)
+
+    def fast_path(self, result: LexicalResult, top_k: int) -> list[Hit] | None:
+        """Return lexical-only hits when ``result`` is confident, else ``None``."""
+        if not result.confident():
+            return None
+        with self._lock:
+            self.counts["fast_path"] += 1
+        return [(doc_id, score, {}) for doc_id, score in result.top(top_k)]
+
+    def fuse(
+        self, vector: list[Hit], result: LexicalResult, top_k: int, alpha: float = HYBRID_ALPHA
+    ) -> list[Hit]:
+        """Blend vector hits with lexical scores and return the best ``top_k``.
+
+        When the query matched nothing lexically the vector hits are returned
+        unchanged (scores included).
+        """
+        if result.best <= 0:
+            with self._lock:
+                self.counts["vector_only"] += 1
+            return vector[:top_k]
+        candidates: dict[str, tuple[float, dict]] = {}
+        for doc_id, score, meta in vector:
+            candidates.setdefault(doc_id, (score, meta))
+        for doc_id, _ in result.top(top_k * HYBRID_CANDIDATES):
+            candidates.setdefault(doc_id, (0.0, {}))
+        fused = [
+            (doc_id, alpha * score + (1 - alpha) * result.score(doc_id), meta)
+            for doc_id, (score, meta) in candidates.items()
+        ]
+        fused.sort(key=lambda hit: hit[1], reverse=True)
+        with self._lock:
+            self.counts["fused"] += 1
+        return fused[:top_k]
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents = len(self._index.ids) if self._index else 0
+            return {
+                **self.counts,
+                "documents": documents,
+                "version": self._version,
+                "rebuilding": self._pending is not None,
+            }
+
+
+_index: LexicalIndex | None = None
+
+
+def get_lexical_index() -> LexicalIndex:
+    global _index
+    if _index is None:
+        _index = LexicalIndex()
+    return _index
+
+
+__all__ = [
+    "LexicalIndex",
+    "LexicalResult",
+    "get_lexical_index",
+    "HYBRID_ALPHA",
+    "HYBRID_CANDIDATES",
+]
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+"""Pinecone-style metadata filters for semantic search.
+
+The ingest writes ``source`` (``customer``/``product``/
+``distribution_center_inventory``), ``country`` and ``product_category`` into
+every vector's metadata.  :func:`infer_filter` derives a filter on those
+fields from the wording of a question; :func:`filter_mask` evaluates one over
+column arrays so the local vector and lexical indexes skip non-matching rows
+before scoring.  Pinecone receives the same dict as its native ``filter``.
+
+Supported syntax is the subset we generate: ``{field: value}``,
+``{field: {"$eq": value}}``, ``{field: {"$in": [...]}}`` and
+``{"$and": [filter, ...]}``; multiple keys are ANDed.
+"""
+
+import re
+from typing import Iterable, Mapping
+
+import numpy as np
+
+FILTER_FIELDS = ("source", "country", "product_category")
+
+_SOURCE_PATTERNS = {
+    "customer": re.compile(r"\b(customers?|shoppers?|buyers?|clients?)\b"),
+    "product": re.compile(r"\b(products?|items?|skus?)\b"),
+    "distribution_center_inventory": re.compile(
+        r"\b(distribution cent(?:er|re)s?|warehouses?|dcs?)\b"
+    ),
+}
+
+
+def filter_mask(columns: Mapping[str, np.ndarray], flt: Mapping, n: int) -> np.ndarray:
+    """Boolean mask of the ``n`` rows whose ``columns`` satisfy ``flt``."""
+    mask = np.ones(n, dtype=bool)
+    for field, cond in flt.items():
+        if field == "$and":
+            for sub in cond:
+                mask &= filter_mask(columns, sub, n)
+            continue
+        values = columns.get(field)
+        if values is None:
+            return np.zeros(n, dtype=bool)
+        if isinstance(cond, Mapping):
+            if "$in" in cond:
+                mask &= np.isin(values, list(cond["$in"]))
+            elif "$eq" in cond:
+                mask &= values == cond["$eq"]
+            else:
+                raise ValueError(f"unsupported filter operator in {cond!r}")
+        else:
+            mask &= values == cond
+    return mask
+
+
+def metadata_columns(metadata: Iterable[Mapping], fields: Iterable[str] = FILTER_FIELDS) -> dict:
+    """Column arrays of the filterable ``fields`` (missing values are ``""``)."""
+    metadata = list(metadata)
+    return {
+        field: np.array([m.get(field, "") for m in metadata], dtype=object)
+        for field in fields
+    }
+
+
+def _mentioned(question: str, values: Iterable[str]) -> list[str]:
+    found = []
+    for value in values:
+        if value and re.search(rf"\b{re.escape(value.lower())}\b", question):
+            found.append(value)
+    return found
+
+
+def infer_filter(
+    question: str,
+    categories: Iterable[str] = (),
+    countries: Iterable[str] = (),
+) -> dict | None:
+    """Guess a metadata filter from ``question``; ``None`` when nothing fits.
+
+    A product category or customer country named in the question narrows to
+    that source and value; otherwise words like "customers" or "warehouse"
+    narrow by ``source`` alone.
+    """
+    q = question.lower()
+    sources = [src for src, pattern in _SOURCE_PATTERNS.items() if pattern.search(q)]
+    category_hits = _mentioned(q, categories)
+    country_hits = _mentioned(q, countries)
+
+    if category_hits and not country_hits and sources in ([], ["product"]):
+        return {"source": "product", "product_category": {"$in": category_hits}}
+    if country_hits and not category_hits and sources in ([], ["customer"]):
+        return {"source": "customer", "country": {"$in": country_hits}}
+    if len(sources) == 1:
+        return {"source": sources[0]}
+    if sources:
+        return {"source": {"$in": sources}}
+    return None
+
+
+__all__ = ["FILTER_FIELDS", "filter_mask", "infer_filter", "metadata_columns"]
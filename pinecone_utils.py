@@ -1,14 +1,31 @@
 # pinecone_utils.py
 
 import os
+import sys
 import numpy as np
-import duckdb
 import pandas as pd
 import openai
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
 from pathlib import Path
 
+from typing import Iterable, Iterator, Sequence
+
+if __package__:
+    from .db import open_connection, read_connection
+    from .embedder import BatchEmbedder
+    from .embedding_cache import get_embedding_cache
+    from .fake_openai import fake_embedding
+    from .ingest_manifest import IngestManifest
+    from .vector_index import LocalIndex
+else:  # run directly as ``python pinecone_utils.py``
+    from db import open_connection, read_connection
+    from embedder import BatchEmbedder
+    from embedding_cache import get_embedding_cache
+    from fake_openai import fake_embedding
+    from ingest_manifest import IngestManifest
+    from vector_index import LocalIndex
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 1) Load environment variables
 # ─────────────────────────────────────────────────────────────────────────────
@@ -29,13 +46,25 @@ PINECONE_INDEX_NAME  = os.getenv("PINECONE_INDEX_NAME")
 
 TESTING = os.getenv("KYDXBOT_TESTING") == "1"
 
-if not TESTING and (not OPENAI_API_KEY or not PINECONE_API_KEY or not PINECONE_ENVIRONMENT):
+EMBEDDING_DIM = 1536
+DEBUG_EMBEDDINGS = os.getenv("KYDXBOT_DEBUG_EMBEDDINGS") == "1"
+
+# "pinecone" (remote, default) or "local" (see vector_index.py)
+VECTOR_BACKEND = os.getenv("KYDXBOT_VECTOR_BACKEND", "pinecone").lower()
+if VECTOR_BACKEND not in ("pinecone", "local"):
+    raise ValueError(f"Unknown KYDXBOT_VECTOR_BACKEND {VECTOR_BACKEND!r}")
+
+if not TESTING and not OPENAI_API_KEY:
+    raise ValueError("Make sure OPENAI_API_KEY is set in .env")
+if not TESTING and VECTOR_BACKEND == "pinecone" and (not PINECONE_API_KEY or not PINECONE_ENVIRONMENT):
     raise ValueError("Make sure OPENAI_API_KEY, PINECONE_API_KEY, and PINECONE_ENVIRONMENT are set in .env")
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 2) Create a Pinecone client instance (skip when testing)
+# 2) Create the vector index: local, Pinecone, or in-memory when testing
 # ─────────────────────────────────────────────────────────────────────────────
-if not TESTING:
+if VECTOR_BACKEND == "local":
+    index = LocalIndex(dim=EMBEDDING_DIM)
+elif not TESTING:
     pc = Pinecone(api_key=PINECONE_API_KEY, environment=PINECONE_ENVIRONMENT)
 
     # 1) Pull just the “name” fields out of list_indexes()
@@ -54,7 +83,7 @@ if not TESTING:
         )
         pc.create_index(
             name=PINECONE_INDEX_NAME,
-            dimension=1536,
+            dimension=EMBEDDING_DIM,
             metric="cosine",
             spec=spec,
         )
@@ -64,285 +93,385 @@ if not TESTING:
     # 2) Now grab the index handle
     index = pc.Index(PINECONE_INDEX_NAME)
 else:
-    class _DummyIndex:
-        def __getattr__(self, name):
-            def _dummy(*a, **k):
-                return None
+    # Functional but never persisted, so tests can ingest and query offline
+    index = LocalIndex(path=None, dim=EMBEDDING_DIM)
 
-            return _dummy
-
-    index = _DummyIndex()
+def _flush_index() -> None:
+    """Persist pending upserts for backends that buffer them (the local index)."""
+    save = getattr(index, "save", None)
+    if callable(save):
+        save()
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 3) Helper to get an OpenAI embedding for a given text (updated for openai>=1.0.0)
+#
+#    Embeddings are float32 vectors of EMBEDDING_DIM values, validated once
+#    here (shape + finiteness, vectorized) so callers can hand them straight
+#    to the index without re-checking element by element.  Under
+#    KYDXBOT_TESTING they are deterministic hash embeddings (fake_openai.py)
+#    computed in-process.
 # ─────────────────────────────────────────────────────────────────────────────
+def as_embedding(values) -> np.ndarray:
+    """Return ``values`` as a validated float32 embedding.
+
+    Raises ``ValueError`` when the vector has the wrong dimension or contains
+    NaN/Inf, which the index would otherwise reject with an opaque error.
+    """
+    vec = np.asarray(values, dtype=np.float32)
+    if vec.shape != (EMBEDDING_DIM,):
+        raise ValueError(
+            f"embedding has shape {vec.shape}, expected ({EMBEDDING_DIM},)"
+        )
+    if not np.isfinite(vec).all():
+        raise ValueError("embedding contains NaN or Inf values")
+    return vec
+
+
+def describe_embedding(vec: np.ndarray) -> str:
+    """One-line summary of ``vec`` for ``KYDXBOT_DEBUG_EMBEDDINGS`` logging."""
+    head = ", ".join(f"{x:.5f}" for x in vec[:5])
+    return (
+        f"dim={vec.shape[0]} dtype={vec.dtype} "
+        f"norm={float(np.linalg.norm(vec)):.4f} head=[{head}]"
+    )
+
+
 def get_embedding(text: str, model: str = "text-embedding-ada-002") -> np.ndarray:
+    """Return the embedding of ``text``, served from the embedding cache when
+    the same text was embedded before (the returned array is read-only)."""
     if TESTING:
-        return np.zeros(1536)
+        return fake_embedding(text, EMBEDDING_DIM)
+    cache = get_embedding_cache()
+    cached = cache.get(model, text)
+    if cached is not None:
+        return cached
     openai.api_key = OPENAI_API_KEY
     resp = openai.embeddings.create(model=model, input=[text])
-    return np.array(resp.data[0].embedding)
+    return cache.put(model, text, as_embedding(resp.data[0].embedding))
+
+
+def get_embeddings(texts: Sequence[str], model: str = "text-embedding-ada-002") -> list[np.ndarray]:
+    """Embed many texts with one API request for all the cache misses."""
+    if TESTING:
+        return [fake_embedding(t, EMBEDDING_DIM) for t in texts]
+    cache = get_embedding_cache()
+    out = cache.get_many(model, texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, out) if v is None))
+    if missing:
+        openai.api_key = OPENAI_API_KEY
+        resp = openai.embeddings.create(model=model, input=missing)
+        fresh = cache.put_many(
+            model, {missing[d.index]: as_embedding(d.embedding) for d in resp.data}
+        )
+        out = [v if v is not None else fresh[t] for t, v in zip(texts, out)]
+    return out
+
+
+def _embed_and_upsert(records: Iterable[tuple[str, str, dict]]) -> None:
+    """Embed ``(id, text, metadata)`` records in concurrent batches and upsert
+    each batch as soon as it is ready."""
+    for batch in BatchEmbedder(get_embeddings).embed_records(records):
+        index.upsert(vectors=batch)
+    _flush_index()
+
+
+_DELETE_BATCH = 1000  # Pinecone's per-request id limit
+_manifest: IngestManifest | None = None
+
+
+def get_ingest_manifest() -> IngestManifest:
+    global _manifest
+    if _manifest is None:
+        _manifest = IngestManifest()
+    return _manifest
+
+
+def _index_key() -> str:
+    path = getattr(index, "path", None)
+    if path is not None:
+        return f"local:{path}"
+    return f"pinecone:{PINECONE_INDEX_NAME}"
+
+
+def _sync_records(source: str, records: Iterable[tuple[str, str, dict]], full: bool = False) -> dict:
+    """Upsert only the new/changed records of ``source`` and delete the ids
+    that disappeared since the last run; return the per-action counts."""
+    manifest = get_ingest_manifest()
+    plan = manifest.plan(_index_key(), source, full=full)
+    _embed_and_upsert(plan.changed(records))
+    for start in range(0, len(plan.deletes), _DELETE_BATCH):
+        index.delete(ids=plan.deletes[start:start + _DELETE_BATCH])
+    _flush_index()
+    manifest.commit(plan)
+    return plan.summary()
+
+
+def _describe_sync(counts: dict) -> str:
+    return ", ".join(f"{n} {action}" for action, n in counts.items())
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 4) Ingest customer records as embeddings:
+# 4) Build ingest records in DuckDB
+#
+#    The embedding text and metadata of every row are assembled column-wise in
+#    SQL (NULL handling, number formatting, concatenation) and streamed back in
+#    INGEST_FETCH_ROWS chunks, so Python only wraps ready-made values and
+#    memory stays flat however large the table is.  The SQL reproduces the
+#    strings the old per-row pandas code produced byte for byte, so content
+#    hashes and cached embeddings stay valid.
+# ─────────────────────────────────────────────────────────────────────────────
+INGEST_FETCH_ROWS = int(os.getenv("KYDXBOT_INGEST_FETCH_ROWS", "10000"))
+
+
+def _column_types(con, table: str) -> dict[str, str]:
+    rows = con.execute(
+        "SELECT lower(column_name), data_type FROM information_schema.columns WHERE table_name = ?",
+        [table],
+    ).fetchall()
+    return dict(rows)
+
+
+def _str_sql(col: str, sql_type: str) -> str:
+    """SQL rendering of ``col`` that matches ``str()`` of the pandas value."""
+    sql_type = sql_type.upper()
+    if sql_type == "DATE" or sql_type.startswith("TIMESTAMP"):
+        ts = f"CAST({col} AS TIMESTAMP)"
+        micros = f"epoch_us({ts}) % 1000000"
+        text = (
+            f"strftime({ts}, '%Y-%m-%d %H:%M:%S')"
+            f" || CASE WHEN {micros} <> 0 THEN printf('.%06d', {micros}) ELSE '' END"
+        )
+        if "TIME ZONE" in sql_type:
+            offset = f"strftime({col}, '%z')"
+            text += f" || CASE WHEN length({offset}) = 3 THEN {offset} || ':00' ELSE {offset} END"
+        return text
+    return f"CAST({col} AS VARCHAR)"
+
+
+def _int_sql(col: str) -> str:
+    return f"CAST(trunc({col}) AS BIGINT)"
+
+
+def _money_sql(col: str) -> str:
+    return f"printf('%.2f', {col})"
+
+
+def _iter_records(
+    duckdb_path: str, sql: str, id_prefix: str, source: str, counter: list[int] | None = None
+) -> Iterator[tuple[str, str, dict]]:
+    """Stream ``(id, text, metadata)`` records from ``sql``.
+
+    ``sql`` must return the row id, the embedding text, then one column per
+    metadata field (named as the field).  ``counter[0]`` is advanced by the
+    number of rows read.  The rows come from a cursor of their own, closed
+    when the generator finishes or is closed, so a long embedding run holds
+    no pool reader slot.
+    """
+    con = open_connection(duckdb_path)
+    try:
+        cur = con.execute(sql)
+        fields = [d[0] for d in cur.description[2:]]
+        while True:
+            rows = cur.fetchmany(INGEST_FETCH_ROWS)
+            if not rows:
+                break
+            if counter is not None:
+                counter[0] += len(rows)
+            for row in rows:
+                meta = {"source": source, **dict(zip(fields, row[2:]))}
+                yield f"{id_prefix}{row[0]}", row[1], meta
+    finally:
+        con.close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 5) Ingest customer records as embeddings:
 #
 #    - For each customer, build a text string that includes:
 #        “<first_name> <last_name> orders_cancelled=<num_orders_Cancelled>
 #         orders_returned=<num_orders_Returned> web_sessions=<num_web_sessions>”
 #    - Store as Pinecone vectors with IDs like "cust_<user_id>"
 # ─────────────────────────────────────────────────────────────────────────────
-def ingest_customer_texts(duckdb_path: str):
+_CUSTOMER_INTS = {
+    "total_items_purchased": ("total_items_purchased", "items_purchased"),
+    "num_orders_total": ("num_orders", "orders_total"),
+    "num_orders_Shipped": ("num_orders_shipped", "shipped"),
+    "num_orders_Complete": ("num_orders_complete", "complete"),
+    "num_orders_Processing": ("num_orders_processing", "processing"),
+    "num_orders_Cancelled": ("num_orders_cancelled", "cancelled"),
+    "num_orders_Returned": ("num_orders_returned", "returned"),
+    "num_web_sessions": ("num_web_sessions", "web_sessions"),
+}
+
+
+def _customer_sql(types: dict[str, str]) -> str:
+    first_order = _str_sql("first_order_completed_at", types.get("first_order_completed_at", "VARCHAR"))
+    last_order = _str_sql("last_order_completed_at", types.get("last_order_completed_at", "VARCHAR"))
+    ints = {field: _int_sql(col) for field, (col, _) in _CUSTOMER_INTS.items()}
+    typed = ",\n              ".join(f'{expr} AS "{field}"' for field, expr in ints.items())
+    int_parts = "".join(
+        f",\n                '{label}=' || \"{field}\""
+        for field, (_, label) in _CUSTOMER_INTS.items()
+        if field != "total_items_purchased"
+    )
+    int_meta = "".join(f',\n          COALESCE("{field}", 0) AS "{field}"' for field in _CUSTOMER_INTS)
+    return f"""
+        WITH c AS (
+            SELECT
+              user_id,
+              NULLIF(customer_first_name, '') AS first_name,
+              NULLIF(customer_last_name, '') AS last_name,
+              NULLIF(customer_country, '') AS country,
+              NULLIF(customer_acquisition_channel, '') AS acquisition_channel,
+              CAST(total_amount_spent AS DOUBLE) AS total_amount_spent,
+              NULLIF({first_order}, '') AS first_order_completed_at,
+              NULLIF({last_order}, '') AS last_order_completed_at,
+              {typed}
+            FROM customers
+        )
+        SELECT
+          user_id,
+          concat_ws(' ',
+                first_name || ' ' || last_name,
+                country,
+                'acquired_via=' || acquisition_channel,
+                'spent_total=$' || {_money_sql("total_amount_spent")},
+                'items_purchased=' || "total_items_purchased",
+                'first_order=' || first_order_completed_at,
+                'last_order=' || last_order_completed_at{int_parts}
+          ) AS text,
+          CAST(user_id AS BIGINT) AS user_id,
+          COALESCE(first_name, '') AS first_name,
+          COALESCE(last_name, '') AS last_name,
+          COALESCE(country, '') AS country,
+          COALESCE(acquisition_channel, '') AS acquisition_channel,
+          COALESCE(total_amount_spent, 0.0) AS total_amount_spent,
+          COALESCE(first_order_completed_at, '') AS first_order_completed_at,
+          COALESCE(last_order_completed_at, '') AS last_order_completed_at{int_meta}
+        FROM c
+    """
+
+
+def iter_customer_records(duckdb_path: str, counter: list[int] | None = None) -> Iterator[tuple[str, str, dict]]:
+    with read_connection(duckdb_path) as con:
+        types = _column_types(con, "customers")
+    return _iter_records(duckdb_path, _customer_sql(types), "cust_", "customer", counter)
+
+
+def ingest_customer_texts(duckdb_path: str, full: bool = False) -> dict:
     """
     Reads detailed columns from the `customers` table in DuckDB, replaces any NA
     with None, then converts None → "" in metadata so Pinecone accepts it.
     Computes embeddings on all customer attributes and upserts into Pinecone under IDs like "cust_<user_id>".
+    Only rows that changed since the last run are re-embedded (``full=True`` redoes all);
+    returns the inserted/updated/deleted/skipped counts.
     """
-    import pandas as pd
+    rows = [0]
+    counts = _sync_records("customer", iter_customer_records(duckdb_path, rows), full=full)
 
-    con = duckdb.connect(duckdb_path)
-    df_cust = con.execute("""
-        SELECT
-          user_id,
-          customer_first_name,
-          customer_last_name,
-          customer_country,
-          customer_acquisition_channel,
-          total_amount_spent,
-          total_items_purchased,
-          first_order_completed_at,
-          last_order_completed_at,
-          num_orders AS num_orders_total,
-          num_orders_Shipped,
-          num_orders_Complete,
-          num_orders_Processing,
-          num_orders_Cancelled,
-          num_orders_Returned,
-          num_web_sessions
-        FROM customers
-    """).fetch_df()
-    con.close()
-
-    batch_size = 100
-    to_upsert = []
-
-    for _, row in df_cust.iterrows():
-        uid = int(row["user_id"])
-        # Safely extract each field, converting NA/NaN to None
-        first_name = row["customer_first_name"] if pd.notna(row["customer_first_name"]) else None
-        last_name = row["customer_last_name"] if pd.notna(row["customer_last_name"]) else None
-        country = row["customer_country"] if pd.notna(row["customer_country"]) else None
-        channel = row["customer_acquisition_channel"] if pd.notna(row["customer_acquisition_channel"]) else None
-        total_spent = float(row["total_amount_spent"]) if pd.notna(row["total_amount_spent"]) else None
-        total_items = int(row["total_items_purchased"]) if pd.notna(row["total_items_purchased"]) else None
-        first_order = str(row["first_order_completed_at"]) if pd.notna(row["first_order_completed_at"]) else None
-        last_order = str(row["last_order_completed_at"]) if pd.notna(row["last_order_completed_at"]) else None
-        num_total = int(row["num_orders_total"]) if pd.notna(row["num_orders_total"]) else None
-        num_shipped = int(row["num_orders_Shipped"]) if pd.notna(row["num_orders_Shipped"]) else None
-        num_complete = int(row["num_orders_Complete"]) if pd.notna(row["num_orders_Complete"]) else None
-        num_processing = int(row["num_orders_Processing"]) if pd.notna(row["num_orders_Processing"]) else None
-        num_cancelled = int(row["num_orders_Cancelled"]) if pd.notna(row["num_orders_Cancelled"]) else None
-        num_returned = int(row["num_orders_Returned"]) if pd.notna(row["num_orders_Returned"]) else None
-        web_sessions = int(row["num_web_sessions"]) if pd.notna(row["num_web_sessions"]) else None
-
-        # Build a single text string for embedding that includes all fields (skipping None)
-        parts = []
-        if first_name and last_name:
-            parts.append(f"{first_name} {last_name}")
-        if country:
-            parts.append(f"{country}")
-        if channel:
-            parts.append(f"acquired_via={channel}")
-        if total_spent is not None:
-            parts.append(f"spent_total=${total_spent:.2f}")
-        if total_items is not None:
-            parts.append(f"items_purchased={total_items}")
-        if first_order:
-            parts.append(f"first_order={first_order}")
-        if last_order:
-            parts.append(f"last_order={last_order}")
-        if num_total is not None:
-            parts.append(f"orders_total={num_total}")
-        if num_shipped is not None:
-            parts.append(f"shipped={num_shipped}")
-        if num_complete is not None:
-            parts.append(f"complete={num_complete}")
-        if num_processing is not None:
-            parts.append(f"processing={num_processing}")
-        if num_cancelled is not None:
-            parts.append(f"cancelled={num_cancelled}")
-        if num_returned is not None:
-            parts.append(f"returned={num_returned}")
-        if web_sessions is not None:
-            parts.append(f"web_sessions={web_sessions}")
-
-        text = " ".join(parts)
-        vec = get_embedding(text)
-
-        # Build metadata dict, converting None → "" so Pinecone accepts it
-        meta = {
-            "source": "customer",
-            "user_id": uid,
-            "first_name": first_name or "",
-            "last_name": last_name or "",
-            "country": country or "",
-            "acquisition_channel": channel or "",
-            "total_amount_spent": total_spent if total_spent is not None else 0.0,
-            "total_items_purchased": total_items if total_items is not None else 0,
-            "first_order_completed_at": first_order or "",
-            "last_order_completed_at": last_order or "",
-            "num_orders_total": num_total if num_total is not None else 0,
-            "num_orders_Shipped": num_shipped if num_shipped is not None else 0,
-            "num_orders_Complete": num_complete if num_complete is not None else 0,
-            "num_orders_Processing": num_processing if num_processing is not None else 0,
-            "num_orders_Cancelled": num_cancelled if num_cancelled is not None else 0,
-            "num_orders_Returned": num_returned if num_returned is not None else 0,
-            "num_web_sessions": web_sessions if web_sessions is not None else 0,
-        }
-
-        to_upsert.append((f"cust_{uid}", vec.tolist(), meta))
-        if len(to_upsert) >= batch_size:
-            index.upsert(vectors=to_upsert)
-            to_upsert = []
-
-    if to_upsert:
-        index.upsert(vectors=to_upsert)
-
-    print(f"✅ Embedded {len(df_cust)} customers into Pinecone index `{PINECONE_INDEX_NAME}`")
+    print(f"✅ Synced {rows[0]} customers into the vector index ({_describe_sync(counts)})")
+    return counts
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 5) Ingest product records as embeddings:
+# 6) Ingest product records as embeddings:
 #
 #    - For each product, build a text string: “<product_name> category=<product_category>”
 #    - Store as Pinecone vectors with IDs like "prod_<product_id>"
 # ─────────────────────────────────────────────────────────────────────────────
-def ingest_product_texts(duckdb_path: str):
+_PRODUCT_SQL = f"""
+    WITH p AS (
+        SELECT
+          product_id,
+          COALESCE(product_name, '') AS product_name,
+          COALESCE(product_category, '') AS product_category,
+          COALESCE(CAST(sales_amount AS DOUBLE), 0.0) AS sales_amount,
+          COALESCE(CAST(cost_of_goods_sold AS DOUBLE), 0.0) AS cost_of_goods_sold,
+          CAST(sales_amount - cost_of_goods_sold AS DOUBLE) AS profit
+        FROM products
+    )
+    SELECT
+      product_id,
+      product_name || ' category=' || product_category
+        || ' sales=$' || {_money_sql("sales_amount")}
+        || ' cogs=$' || {_money_sql("cost_of_goods_sold")}
+        || ' profit=$' || {_money_sql("COALESCE(profit, sales_amount - cost_of_goods_sold)")} AS text,
+      CAST(product_id AS BIGINT) AS product_id,
+      product_name,
+      product_category,
+      sales_amount,
+      cost_of_goods_sold,
+      COALESCE(profit, sales_amount - cost_of_goods_sold) AS profit
+    FROM p
+"""
+
+
+def iter_product_records(duckdb_path: str, counter: list[int] | None = None) -> Iterator[tuple[str, str, dict]]:
+    return _iter_records(duckdb_path, _PRODUCT_SQL, "prod_", "product", counter)
+
+
+def ingest_product_texts(duckdb_path: str, full: bool = False) -> dict:
     """
     Reads detailed columns from the `products` table in DuckDB, replaces any NULL/NaN
     with safe defaults, computes embeddings based on a concatenation of all product attributes,
     and upserts into Pinecone under IDs like "prod_<product_id>".
+    Only rows that changed since the last run are re-embedded (``full=True`` redoes all).
     """
-    import pandas as pd
-
-    con = duckdb.connect(duckdb_path)
-    df_prod = con.execute("""
-        SELECT
-          product_id,
-          product_name,
-          product_category,
-          sales_amount,
-          cost_of_goods_sold,
-          (sales_amount - cost_of_goods_sold) AS profit
-        FROM products
-    """).fetch_df()
-    con.close()
-
-    batch_size = 100
-    to_upsert = []
-
-    for _, row in df_prod.iterrows():
-        pid = int(row["product_id"])
-        # Safely extract each field, converting NA/NaN to a default
-        name = row["product_name"] if pd.notna(row["product_name"]) else ""
-        category = row["product_category"] if pd.notna(row["product_category"]) else ""
-        sales = float(row["sales_amount"]) if pd.notna(row["sales_amount"]) else 0.0
-        cogs = float(row["cost_of_goods_sold"]) if pd.notna(row["cost_of_goods_sold"]) else 0.0
-        profit = float(row["profit"]) if pd.notna(row["profit"]) else (sales - cogs)
-
-        # Build a single text string for embedding that includes all fields
-        text = (
-            f"{name} "
-            f"category={category} "
-            f"sales=${sales:.2f} "
-            f"cogs=${cogs:.2f} "
-            f"profit=${profit:.2f}"
-        )
-        vec = get_embedding(text)
-
-        # Build metadata dict, replacing any None with safe defaults
-        meta = {
-            "source": "product",
-            "product_id": pid,
-            "product_name": name,
-            "product_category": category,
-            "sales_amount": sales,
-            "cost_of_goods_sold": cogs,
-            "profit": profit,
-        }
-
-        to_upsert.append((f"prod_{pid}", vec.tolist(), meta))
-        if len(to_upsert) >= batch_size:
-            index.upsert(vectors=to_upsert)
-            to_upsert = []
-
-    if to_upsert:
-        index.upsert(vectors=to_upsert)
+    rows = [0]
+    counts = _sync_records("product", iter_product_records(duckdb_path, rows), full=full)
 
-    print(f"✅ Embedded {len(df_prod)} products into Pinecone index `{PINECONE_INDEX_NAME}`")
+    print(f"✅ Synced {rows[0]} products into the vector index ({_describe_sync(counts)})")
+    return counts
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 5b) Ingest distribution center inventory records as embeddings
+# 6b) Ingest distribution center inventory records as embeddings
 # ─────────────────────────────────────────────────────────────────────────────
-def ingest_distribution_center_inventory(duckdb_path: str):
-    """Embed rows from the distribution_center_inventory table."""
-    import pandas as pd
-
-    con = duckdb.connect(duckdb_path)
-    df_dci = con.execute(
-        """
-            SELECT
-              distribution_center_id,
-              distribution_center_name,
-              total_items,
-              items_sold,
-              items_in_stock,
-              total_sales,
-              total_inventory_cost
-            FROM distribution_center_inventory
-        """
-    ).fetch_df()
-    con.close()
-
-    batch_size = 100
-    to_upsert = []
-
-    for _, row in df_dci.iterrows():
-        dc_id = int(row["distribution_center_id"])
-        name = row["distribution_center_name"] if pd.notna(row["distribution_center_name"]) else ""
-        total_items = int(row["total_items"]) if pd.notna(row["total_items"]) else 0
-        items_sold = int(row["items_sold"]) if pd.notna(row["items_sold"]) else 0
-        items_in_stock = int(row["items_in_stock"]) if pd.notna(row["items_in_stock"]) else 0
-        total_sales = float(row["total_sales"]) if pd.notna(row["total_sales"]) else 0.0
-        inv_cost = float(row["total_inventory_cost"]) if pd.notna(row["total_inventory_cost"]) else 0.0
-
-        text = (
-            f"{name} items_in_stock={items_in_stock} "
-            f"total_sales=${total_sales:.2f} inventory_cost=${inv_cost:.2f}"
-        )
-        vec = get_embedding(text)
-
-        meta = {
-            "source": "distribution_center_inventory",
-            "distribution_center_id": dc_id,
-            "distribution_center_name": name,
-            "total_items": total_items,
-            "items_sold": items_sold,
-            "items_in_stock": items_in_stock,
-            "total_sales": total_sales,
-            "total_inventory_cost": inv_cost,
-        }
+_DISTRIBUTION_CENTER_SQL = f"""
+    WITH d AS (
+        SELECT
+          distribution_center_id,
+          COALESCE(distribution_center_name, '') AS distribution_center_name,
+          COALESCE({_int_sql("total_items")}, 0) AS total_items,
+          COALESCE({_int_sql("items_sold")}, 0) AS items_sold,
+          COALESCE({_int_sql("items_in_stock")}, 0) AS items_in_stock,
+          COALESCE(CAST(total_sales AS DOUBLE), 0.0) AS total_sales,
+          COALESCE(CAST(total_inventory_cost AS DOUBLE), 0.0) AS total_inventory_cost
+        FROM distribution_center_inventory
+    )
+    SELECT
+      distribution_center_id,
+      distribution_center_name || ' items_in_stock=' || items_in_stock
+        || ' total_sales=$' || {_money_sql("total_sales")}
+        || ' inventory_cost=$' || {_money_sql("total_inventory_cost")} AS text,
+      CAST(distribution_center_id AS BIGINT) AS distribution_center_id,
+      distribution_center_name,
+      total_items,
+      items_sold,
+      items_in_stock,
+      total_sales,
+      total_inventory_cost
+    FROM d
+"""
+
+
+def iter_distribution_center_records(
+    duckdb_path: str, counter: list[int] | None = None
+) -> Iterator[tuple[str, str, dict]]:
+    return _iter_records(
+        duckdb_path, _DISTRIBUTION_CENTER_SQL, "dc_", "distribution_center_inventory", counter
+    )
 
-        to_upsert.append((f"dc_{dc_id}", vec.tolist(), meta))
-        if len(to_upsert) >= batch_size:
-            index.upsert(vectors=to_upsert)
-            to_upsert = []
 
-    if to_upsert:
-        index.upsert(vectors=to_upsert)
+def ingest_distribution_center_inventory(duckdb_path: str, full: bool = False) -> dict:
+    """Embed changed rows from the distribution_center_inventory table."""
+    rows = [0]
+    counts = _sync_records(
+        "distribution_center_inventory", iter_distribution_center_records(duckdb_path, rows), full=full
+    )
 
-    print(f"✅ Embedded {len(df_dci)} distribution centers into Pinecone index `{PINECONE_INDEX_NAME}`")
+    print(f"✅ Synced {rows[0]} distribution centers into the vector index ({_describe_sync(counts)})")
+    return counts
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 6) A simple semantic‐search example
+# 7) A simple semantic‐search example
 # ─────────────────────────────────────────────────────────────────────────────
 def semantic_search(query: str, top_k: int = 3):
     """
@@ -358,20 +487,22 @@ def semantic_search(query: str, top_k: int = 3):
     return results["matches"]
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 7) If you run this script directly, only ingest customers & products
+# 8) If you run this script directly, only ingest customers & products
 # ─────────────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     # Adjust this path if your DuckDB file lives elsewhere
     duckdb_path = os.path.join(os.path.dirname(__file__), "data/data.db")
+    # Pass --full to re-embed every row instead of only the changed ones
+    full = "--full" in sys.argv
 
     # 1) Embed all customers
-    ingest_customer_texts(duckdb_path)
+    ingest_customer_texts(duckdb_path, full=full)
 
     # 2) Embed all products
-    ingest_product_texts(duckdb_path)
+    ingest_product_texts(duckdb_path, full=full)
 
     # 3) Embed distribution center inventory
-    ingest_distribution_center_inventory(duckdb_path)
+    ingest_distribution_center_inventory(duckdb_path, full=full)
 
     # 4) Quick test of semantic search
     print("\nExample search for “top customers” →")
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+"""One place that decides where a question goes.
+
+:meth:`Router.route` returns a :class:`RouteDecision`:
+
+* ``db_path`` — the question asks where the database file lives;
+* ``data`` — it contains a data keyword, or its nearest preloaded analysis
+  question (``data/preloaded/analysis_quest.txt``) scores at least
+  ``KYDXBOT_ROUTER_THRESHOLD``;
+* ``other`` — everything else (semantic search).
+
+Each keyword list is one compiled, word-bounded alternation, so a question
+is scanned once per list instead of once per keyword.  The preloaded
+questions' TF-IDF model is fitted once and persisted under
+``KYDXBOT_ROUTER_PATH`` (``<path>.json`` holds the vocabulary and question
+texts, ``<path>.<part>.npy`` the IDF weights and the CSR matrix, opened with
+``mmap_mode="r"``); it is refitted only when the questions file or
+scikit-learn changes.  The decision always carries the nearest preloaded
+question and its cosine score, and :meth:`Router.stats` reports per-route
+counts, routing latency and the most recent decisions (without the
+questions themselves, since ``/metrics`` is unauthenticated).
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import sklearn
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .preloaded_questions import QUESTIONS_FILE
+
+ROUTER_PATH = os.getenv(
+    "KYDXBOT_ROUTER_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "router_tfidf"),
+)
+ROUTER_THRESHOLD = float(os.getenv("KYDXBOT_ROUTER_THRESHOLD", "0.5"))
+_RECENT = 20
+
+DB_PATH_PHRASES = (
+    "db path", "database path", "path to database", "where is the database",
+    "database location", "path to db", "where is your db", "file path", "database file",
+)
+DATA_KEYWORDS = (
+    "average", "sum(", "count(", "how many", "what is", "list",
+    "top", "highest", "lowest", "per", "between", "profit",
+    "sales", "customers", "products", "revenue", "orders",
+    "invoices", "inventory", "expenses", "transactions", "employees",
+    "payroll", "income", "metrics",
+    # References to generic data or database terms
+    "database", "duckdb", "dataset", "datasets", "db", "my db", "my database", "my data",
+    "loaded data", "uploaded data", "imported data", "shared data", "the data",
+    "my datasets", "my dataset", "this data", "the tables", "my tables",
+)
+
+
+class KeywordMatcher:
+    """All ``phrases`` as one compiled pattern, matched on word boundaries.
+
+    Every phrase must start a word, so "per" does not match "paper".  Single
+    words of at least ``stem_length`` letters are stems and may end in any
+    inflection ("profit" matches "profits" and "profitability"); shorter words
+    and multi-word phrases must match whole ("top" does not match "topic").
+    """
+
+    def __init__(self, phrases: Iterable[str], stem_length: int = 5):
+        parts = []
+        for phrase in sorted(set(phrases), key=len, reverse=True):
+            part = re.escape(phrase)
+            if phrase[0].isalnum():
+                part = r"\b" + part
+            if phrase.isalpha() and len(phrase) >= stem_length:
+                part += r"\w*"
+            elif phrase[-1].isalnum():
+                part += r"\b"
+            parts.append(part)
+        self.pattern = re.compile("|".join(parts) or r"(?!)")
+
+    def search(self, text: str) -> str | None:
+        """The first phrase found in ``text`` (lower-cased), or ``None``."""
+        m = self.pattern.search(text.lower())
+        return m.group(0) if m else None
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str  # "db_path", "data" or "other"
+    reason: str  # "keyword", "preloaded" or "none"
+    keyword: str | None
+    nearest: str | None  # closest preloaded question (not the user's text)
+    score: float  # its cosine similarity
+    elapsed_ms: float
+
+    @property
+    def is_data(self) -> bool:
+        return self.route == "data"
+
+
+def _read_questions(path: Path) -> tuple[list[str], str]:
+    try:
+        raw = path.read_bytes()
+    except OSError:
+        return [], ""
+    questions = [q.strip() for q in raw.decode("utf-8").splitlines() if q.strip()]
+    digest = hashlib.sha256(raw + sklearn.__version__.encode()).hexdigest()[:16]
+    return questions, digest
+
+
+class QuestionModel:
+    """TF-IDF nearest-neighbour lookup over the preloaded questions."""
+
+    _PARTS = ("idf", "data", "indices", "indptr")
+
+    def __init__(self, questions_file: str | os.PathLike = QUESTIONS_FILE, path: str | None = ROUTER_PATH):
+        self.questions_file = Path(questions_file)
+        self.path = Path(path) if path else None
+        self.questions: list[str] = []
+        self.vectorizer: TfidfVectorizer | None = None
+        self.matrix: csr_matrix | None = None
+        self.source = "empty"  # "disk", "fitted" or "empty"
+        questions, digest = _read_questions(self.questions_file)
+        if not questions:
+            return
+        if not self._load(digest):
+            self._fit(questions)
+            self._save(digest)
+
+    def _file(self, part: str) -> Path:
+        return self.path.with_name(f"{self.path.name}.{part}")
+
+    def _load(self, digest: str) -> bool:
+        if self.path is None:
+            return False
+        try:
+            meta = json.loads(self._file("json").read_text(encoding="utf-8"))
+            if meta.get("digest") != digest:
+                return False
+            arrays = {p: np.load(self._file(f"{p}.npy"), mmap_mode="r") for p in self._PARTS}
+        except (OSError, ValueError):
+            return False
+        vectorizer = TfidfVectorizer(vocabulary={t: i for i, t in enumerate(meta["terms"])})
+        vectorizer.idf_ = np.asarray(arrays["idf"])
+        self.vectorizer = vectorizer
+        self.matrix = csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=(len(meta["questions"]), len(meta["terms"])),
+            copy=False,
+        )
+        self.questions = meta["questions"]
+        self.source = "disk"
+        return True
+
+    def _fit(self, questions: list[str]) -> None:
+        self.vectorizer = TfidfVectorizer()
+        self.matrix = self.vectorizer.fit_transform(questions).tocsr()
+        self.questions = questions
+        self.source = "fitted"
+
+    @staticmethod
+    def _write_npy(target: Path, arr: np.ndarray) -> None:
+        tmp = target.with_name(target.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(arr))
+        os.replace(tmp, target)
+
+    def _save(self, digest: str) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            arrays = {
+                "idf": self.vectorizer.idf_,
+                "data": self.matrix.data,
+                "indices": self.matrix.indices,
+                "indptr": self.matrix.indptr,
+            }
+            for part, arr in arrays.items():
+                self._write_npy(self._file(f"{part}.npy"), arr)
+            terms = self.vectorizer.get_feature_names_out().tolist()
+            # The metadata goes last: it is what marks the arrays as current
+            meta = self._file("json")
+            tmp = meta.with_name(meta.name + ".tmp")
+            tmp.write_text(
+                json.dumps({"digest": digest, "terms": terms, "questions": self.questions}),
+                encoding="utf-8",
+            )
+            os.replace(tmp, meta)
+        except OSError as e:
+            print("router model not persisted:", e)
+
+    def nearest(self, question: str) -> tuple[str | None, float]:
+        """The closest preloaded question and its cosine similarity."""
+        if self.vectorizer is None or not self.questions:
+            return None, 0.0
+        # Rows and the query are L2-normalised, so the dot product is the cosine
+        scores = self.matrix @ self.vectorizer.transform([question]).T
+        scores = scores.toarray().ravel()
+        best = int(scores.argmax())
+        return self.questions[best], float(scores[best])
+
+
+class Router:
+    """Keyword and preloaded-question routing with decision statistics."""
+
+    def __init__(
+        self,
+        model: QuestionModel | None = None,
+        threshold: float = ROUTER_THRESHOLD,
+        db_path_phrases: Iterable[str] = DB_PATH_PHRASES,
+        data_keywords: Iterable[str] = DATA_KEYWORDS,
+    ):
+        self._model = model
+        self.threshold = threshold
+        self.db_path = KeywordMatcher(db_path_phrases)
+        self.data = KeywordMatcher(data_keywords)
+        self._lock = threading.Lock()
+        self._recent: deque = deque(maxlen=_RECENT)
+        self.counts: Counter = Counter()
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    @property
+    def model(self) -> QuestionModel:
+        with self._lock:
+            if self._model is None:
+                self._model = QuestionModel()
+            return self._model
+
+    def nearest(self, question: str) -> tuple[str | None, float]:
+        try:
+            return self.model.nearest(question)
+        except Exception as e:  # noqa: BLE001
+            print("router similarity error:", e)
+            return None, 0.0
+
+    def route(self, question: str) -> RouteDecision:
+        start = time.perf_counter()
+        nearest, score = self.nearest(question)
+        keyword = self.db_path.search(question)
+        if keyword is not None:
+            route, reason = "db_path", "keyword"
+        elif (keyword := self.data.search(question)) is not None:
+            route, reason = "data", "keyword"
+        elif score >= self.threshold:
+            route, reason = "data", "preloaded"
+        else:
+            route, reason = "other", "none"
+        elapsed = (time.perf_counter() - start) * 1000
+        decision = RouteDecision(route, reason, keyword, nearest, round(score, 4), round(elapsed, 3))
+        with self._lock:
+            self.counts[route] += 1
+            self.counts[f"{route}:{reason}"] += 1
+            self.total_ms += elapsed
+            self.max_ms = max(self.max_ms, elapsed)
+            # No question text: /metrics is public and spans every session
+            self._recent.append(asdict(decision))
+        return decision
+
+    def is_data_question(self, question: str) -> bool:
+        return self.route(question).is_data
+
+    def is_db_path_question(self, question: str) -> bool:
+        return self.db_path.search(question) is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            routed = sum(self.counts[r] for r in ("db_path", "data", "other"))
+            return {
+                "routed": routed,
+                **dict(self.counts),
+                "avg_ms": round(self.total_ms / routed, 3) if routed else 0.0,
+                "max_ms": round(self.max_ms, 3),
+                "model": self._model.source if self._model is not None else "not loaded",
+                "recent": list(self._recent),
+            }
+
+
+_router: Router | None = None
+
+
+def get_router() -> Router:
+    global _router
+    if _router is None:
+        _router = Router()
+    return _router
+
+
+__all__ = [
+    "DATA_KEYWORDS",
+    "DB_PATH_PHRASES",
+    "KeywordMatcher",
+    "QuestionModel",
+    "RouteDecision",
+    "Router",
+    "get_router",
+    "ROUTER_PATH",
+    "ROUTER_THRESHOLD",
+]
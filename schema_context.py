@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+"""Compact schema description for the SQL generation prompt.
+
+LangChain's ``SQLDatabase`` reflects every table through SQLAlchemy and
+renders ``CREATE TABLE`` statements plus sample rows, and the whole block is
+sent with every data question.  :class:`SchemaContext` instead snapshots the
+column names, short type names and a few representative values of each table
+with a handful of DuckDB queries, once per :func:`db.get_data_version`, and
+renders one line per table::
+
+    products: product_id int, product_category text ('Jeans'|'Tops'|…), profit float [0.02..118.5]
+
+:meth:`SchemaContext.select_tables` picks the tables whose names, columns or
+sampled values the question mentions (``KYDXBOT_SCHEMA_SELECT=0`` always
+sends every table), so most questions carry one table instead of three.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from .db import get_data_version, get_pool
+
+SCHEMA_SELECT = os.getenv("KYDXBOT_SCHEMA_SELECT", "1") == "1"
+# Text columns with at most this many distinct values list their top values
+SCHEMA_ENUM_MAX = int(os.getenv("KYDXBOT_SCHEMA_ENUM_MAX", "25"))
+SCHEMA_SAMPLE_VALUES = 3
+
+_TYPE_NAMES = {
+    "TINYINT": "int", "SMALLINT": "int", "INTEGER": "int", "BIGINT": "int", "HUGEINT": "int",
+    "UTINYINT": "int", "USMALLINT": "int", "UINTEGER": "int", "UBIGINT": "int",
+    "FLOAT": "float", "DOUBLE": "float", "REAL": "float",
+    "VARCHAR": "text", "BOOLEAN": "bool", "DATE": "date",
+}
+_NUMERIC = {"int", "float", "decimal"}
+_ORDERED = _NUMERIC | {"date", "timestamp"}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Question words that never identify a table
+_STOPWORDS = frozenset(
+    "a an and are by for from how i in is it many me much of on or our show the"
+    " to top what which who with list give most least highest lowest".split()
+)
+
+
+def _short_type(sql_type: str) -> str:
+    if sql_type.startswith("DECIMAL"):
+        return "decimal"
+    if sql_type.startswith("TIMESTAMP"):
+        return "timestamp"
+    return _TYPE_NAMES.get(sql_type, sql_type.lower())
+
+
+def _words(text: str) -> set[str]:
+    words = set()
+    for word in _WORD_RE.findall(text.lower()):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        words.add(word)
+        if word.endswith("s") and len(word) > 3:
+            words.add(word[:-1])
+    return words
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(value) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+@dataclass
+class TableSchema:
+    name: str
+    columns: list[tuple[str, str, str]] = field(default_factory=list)  # name, type, hint
+    vocabulary: set[str] = field(default_factory=set)
+
+    def render(self) -> str:
+        cols = ", ".join(
+            f"{name} {typ}" + (f" {hint}" if hint else "") for name, typ, hint in self.columns
+        )
+        return f"{self.name}: {cols}"
+
+
+def _snapshot_table(con, table: str) -> TableSchema:
+    columns = con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns"
+        " WHERE table_schema = 'main' AND table_name = ? ORDER BY ordinal_position",
+        [table],
+    ).fetchall()
+    schema = TableSchema(table, vocabulary=_words(table.replace("_", " ")))
+    if not columns:
+        return schema
+
+    # One scan for the distinct counts and ranges of every column
+    exprs = []
+    for name, sql_type in columns:
+        col = _quote(name)
+        exprs.append(f"approx_count_distinct({col})")
+        if _short_type(sql_type) in _ORDERED:
+            exprs.append(f"min({col})")
+            exprs.append(f"max({col})")
+    stats = list(con.execute(f"SELECT {', '.join(exprs)} FROM {_quote(table)}").fetchone())
+
+    for name, sql_type in columns:
+        typ = _short_type(sql_type)
+        distinct = stats.pop(0)
+        hint = ""
+        if typ in _ORDERED:
+            low, high = stats.pop(0), stats.pop(0)
+            if low is not None:
+                hint = f"[{low}..{high}]" if typ != "timestamp" else f"[{low:%Y-%m-%d}..{high:%Y-%m-%d}]"
+        elif typ == "text" and distinct:
+            top = con.execute(
+                f"SELECT {_quote(name)} FROM {_quote(table)} WHERE {_quote(name)} IS NOT NULL"
+                f" GROUP BY 1 ORDER BY count(*) DESC, 1 LIMIT ?",
+                [SCHEMA_SAMPLE_VALUES if distinct <= SCHEMA_ENUM_MAX else 1],
+            ).fetchall()
+            values = "|".join(_literal(v) for (v,) in top)
+            if distinct <= SCHEMA_ENUM_MAX:
+                more = "|…" if distinct > len(top) else ""
+                hint = f"({values}{more})"
+                schema.vocabulary |= _words(" ".join(str(v) for (v,) in top))
+            else:
+                hint = f"(e.g. {values})"
+        schema.columns.append((name, typ, hint))
+        schema.vocabulary |= _words(name.replace("_", " "))
+    return schema
+
+
+class SchemaContext:
+    """Per-data-version snapshot of the prompt schema for ``tables``."""
+
+    def __init__(
+        self,
+        tables: Iterable[str],
+        connect: Callable = lambda: get_pool().cursor(),
+        version: Callable[[], str] = get_data_version,
+        select: bool = SCHEMA_SELECT,
+    ):
+        self.tables = list(tables)
+        self.select = select
+        self._connect = connect
+        self._version_fn = version
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._schemas: dict[str, TableSchema] = {}
+        self.counts = {"builds": 0, "renders": 0, "tables_sent": 0, "prompt_chars": 0}
+
+    def _ensure(self) -> dict[str, TableSchema]:
+        version = self._version_fn()
+        with self._lock:
+            if version == self._version:
+                return self._schemas
+            con = self._connect()
+            try:
+                schemas = {table: _snapshot_table(con, table) for table in self.tables}
+            finally:
+                con.close()
+            self._version, self._schemas = version, schemas
+            self.counts["builds"] += 1
+            return schemas
+
+    def snapshot(self) -> dict[str, TableSchema]:
+        """Table name → :class:`TableSchema` for the current data version."""
+        return self._ensure()
+
+    def select_tables(self, question: str) -> list[str]:
+        """Tables the question refers to; every table when it names none."""
+        schemas = self._ensure()
+        if not self.select:
+            return list(self.tables)
+        words = _words(question)
+        picked = [t for t in self.tables if words & schemas[t].vocabulary]
+        return picked or list(self.tables)
+
+    def render(self, tables: Iterable[str] | None = None) -> str:
+        """One line per table (all tables when ``tables`` is ``None``)."""
+        schemas = self._ensure()
+        names = self.tables if tables is None else [t for t in tables if t in schemas]
+        text = "\n".join(schemas[t].render() for t in names)
+        with self._lock:
+            self.counts["renders"] += 1
+            self.counts["tables_sent"] += len(names)
+            self.counts["prompt_chars"] += len(text)
+        return text
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counts, "tables": len(self.tables), "version": self._version}
+
+
+SQL_TABLES = ("customers", "products", "distribution_center_inventory")
+
+_context: SchemaContext | None = None
+
+
+def get_schema_context() -> SchemaContext:
+    global _context
+    if _context is None:
+        _context = SchemaContext(SQL_TABLES)
+    return _context
+
+
+__all__ = ["SchemaContext", "TableSchema", "get_schema_context", "SQL_TABLES"]
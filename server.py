@@ -1,7 +1,10 @@
 import os
+import json
+import asyncio
 import uvicorn
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from pathlib import Path
@@ -17,10 +20,12 @@ from .chatbot import (
     clear_conversation,
     summarize_conversation,
     get_intro_message,
+    get_pipeline_stats,
 )
 from .visualize import generate_context_questions, create_matplotlib_visual
 from .infograph import generate_infograph_questions, create_infographic
 from .erd import generate_erd, get_data_summary, describe_erd
+from .executor import PoolFullError, submit_bounded, run_bounded, get_stats
 
 app = FastAPI(title="KYDxBot API")
 
@@ -48,6 +53,7 @@ app.add_middleware(
 # (Then your existing endpoint definitions come below)
 class ChatRequest(BaseModel):
     query: str
+    session_id: str | None = None
 
 class ChatResponse(BaseModel):
     response: str
@@ -106,6 +112,15 @@ class IntroResponse(BaseModel):
     message: str
 
 
+def _busy(exc: PoolFullError) -> HTTPException:
+    """Translate a rejected pool submission into a ``503`` response."""
+    return HTTPException(
+        status_code=503,
+        detail=str(exc),
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.get("/intro", response_model=IntroResponse)
 async def intro():
     msg = get_intro_message()
@@ -114,7 +129,7 @@ async def intro():
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     """
-    Receives JSON: { "query": "How do I reset my password?" }
+    Receives JSON: { "query": "How do I reset my password?", "session_id": "..." }
     Returns JSON: { "response": "..."}
     """
 
@@ -122,10 +137,73 @@ async def chat_endpoint(request: ChatRequest):
     if not user_query:
         raise HTTPException(status_code=400, detail="Query cannot be empty")
 
-    response_text = handle_query(user_query)
+    try:
+        response_text = await run_bounded(
+            "chat", handle_query, user_query, session_id=request.session_id
+        )
+    except PoolFullError as e:
+        raise _busy(e)
     return ChatResponse(response=response_text)
 
 
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same input as ``/chat`` but answers with a ``text/event-stream``.
+
+    Events: ``accepted``, ``routed``, ``sql``, ``rows``, ``rejected``,
+    ``image`` and ``token`` while the pipeline runs, then ``done`` with the final
+    ``{"response": "..."}`` (or ``error`` with a ``detail``).
+    """
+
+    user_query = request.query.strip()
+    if not user_query:
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_event(name: str, data: dict) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, (name, data))
+
+    try:
+        future = submit_bounded(
+            "chat",
+            handle_query,
+            user_query,
+            on_event=on_event,
+            session_id=request.session_id,
+        )
+    except PoolFullError as e:
+        raise _busy(e)
+    # Stage events are queued before the future resolves, so the sentinel
+    # always arrives after the last of them.
+    future.add_done_callback(lambda _: events.put_nowait(None))
+
+    async def event_stream():
+        yield _sse("accepted", {"query": user_query})
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            yield _sse(*item)
+        try:
+            yield _sse("done", {"response": future.result()})
+        except Exception as e:  # noqa: BLE001
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/visualize/questions", response_model=VizQuestionsResponse)
 async def viz_questions(req: VizQuestionsRequest):
     try:
@@ -138,8 +216,10 @@ async def viz_questions(req: VizQuestionsRequest):
 @app.post("/visualize/complete", response_model=VizCompleteResponse)
 async def viz_complete(req: VizCompleteRequest):
     try:
-        url = create_matplotlib_visual(req.answers)
+        url = await run_bounded("visualize", create_matplotlib_visual, req.answers)
         return VizCompleteResponse(chart_url=url)
+    except PoolFullError as e:
+        raise _busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -156,8 +236,10 @@ async def infograph_questions(req: InfographQuestionsRequest):
 @app.post("/infograph/complete", response_model=InfographCompleteResponse)
 async def infograph_complete(req: InfographCompleteRequest):
     try:
-        url = create_infographic(req.answers)
+        url = await run_bounded("infograph", create_infographic, req.answers)
         return InfographCompleteResponse(image_url=url)
+    except PoolFullError as e:
+        raise _busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -171,27 +253,44 @@ async def summarize(req: SummarizeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _build_my_data() -> MyDataResponse:
+    summary = get_data_summary()
+    url = generate_erd()
+    desc = describe_erd(url)
+    return MyDataResponse(summary=summary, erd_url=url, erd_desc=desc)
+
+
 @app.get("/my_data", response_model=MyDataResponse)
 async def my_data():
     """Return a brief summary of the DuckDB data and an ER diagram image."""
     try:
-        summary = get_data_summary()
-        url = generate_erd()
-        desc = describe_erd(url)
-        return MyDataResponse(summary=summary, erd_url=url, erd_desc=desc)
+        return await run_bounded("my_data", _build_my_data)
+    except PoolFullError as e:
+        raise _busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class ClearHistoryRequest(BaseModel):
+    session_id: str | None = None
+
+
 @app.post("/clear_history")
-async def clear_history():
+async def clear_history(req: ClearHistoryRequest | None = None):
     """
     Optional: allows React frontend to reset conversation memory if needed.
+    Drops the in-memory buffer of ``session_id`` (or the default session).
     """
-    clear_conversation()
+    clear_conversation(req.session_id if req else None)
     return {"status": "cleared"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Expose worker pool utilisation, latency and pipeline savings counters."""
+    return {"pool": get_stats(), **get_pipeline_stats()}
+
+
 class SummaryResponse(BaseModel):
     summary: str
 
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+"""Per-session, bounded conversation memory.
+
+Each chat session (identified by the ``session_id`` sent to ``/chat``) keeps
+its last ``KYDXBOT_SESSION_TURNS`` exchanges in a ring buffer, so the OpenAI
+fallback can read its context in O(1) instead of re-parsing the global
+history file.  Sessions idle for longer than ``KYDXBOT_SESSION_IDLE`` seconds
+are evicted, and at most ``KYDXBOT_MAX_SESSIONS`` are kept (least recently
+used first out), which caps memory at sessions × turns records.
+
+Records are also handed to a background thread that appends them to the
+durable history store, so the request path never waits on disk I/O.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable
+
+from .history_store import append_record
+
+SESSION_TURNS = int(os.getenv("KYDXBOT_SESSION_TURNS", "20"))
+SESSION_IDLE_SECONDS = float(os.getenv("KYDXBOT_SESSION_IDLE", "1800"))
+MAX_SESSIONS = int(os.getenv("KYDXBOT_MAX_SESSIONS", "1000"))
+DEFAULT_SESSION = "default"
+
+
+class _Session:
+    __slots__ = ("turns", "last_seen")
+
+    def __init__(self, max_turns: int):
+        self.turns: deque[dict] = deque(maxlen=max_turns)
+        self.last_seen = time.monotonic()
+
+
+class SessionMemory:
+    """Ring buffers of recent exchanges keyed by session id."""
+
+    def __init__(
+        self,
+        max_turns: int = SESSION_TURNS,
+        idle_seconds: float = SESSION_IDLE_SECONDS,
+        max_sessions: int = MAX_SESSIONS,
+    ):
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        # Ordered by last access so idle and LRU eviction pop from the front
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self.evicted = 0
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            idle = now - session.last_seen > self.idle_seconds
+            if not idle and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[sid]
+            self.evicted += 1
+
+    def add(self, session_id: str, record: dict) -> None:
+        """Append ``record`` to the session's buffer, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = _Session(self.max_turns)
+                self._sessions[session_id] = session
+            session.turns.append(record)
+            session.last_seen = now
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+
+    def recent(self, session_id: str, limit: int) -> list[dict]:
+        """Return up to ``limit`` latest records for ``session_id``, oldest first."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None or limit <= 0:
+                return []
+            session.last_seen = now
+            self._sessions.move_to_end(session_id)
+            turns = session.turns
+            start = max(len(turns) - limit, 0)
+            return [turns[i] for i in range(start, len(turns))]
+
+    def clear(self, session_id: str) -> bool:
+        """Drop the buffer for ``session_id``; return whether it existed."""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "records": sum(len(s.turns) for s in self._sessions.values()),
+                "evicted": self.evicted,
+                "max_sessions": self.max_sessions,
+                "max_turns": self.max_turns,
+            }
+
+
+class HistoryWriter:
+    """Background thread that appends records to the history store."""
+
+    def __init__(self, sink: Callable[[dict], None] = append_record):
+        self._sink = sink
+        self._queue: queue.Queue[dict] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            try:
+                self._sink(record)
+            except Exception as e:  # noqa: BLE001
+                print(f"⚠️ Couldn’t append to chat history: {e}")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, record: dict) -> None:
+        """Queue ``record`` for persistence and return immediately."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="kydxbot-history", daemon=True
+                )
+                self._thread.start()
+                # Don't lose queued records on a clean shutdown
+                atexit.register(self.flush)
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        """Block until every queued record has been written."""
+        self._queue.join()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+
+__all__ = ["SessionMemory", "HistoryWriter", "DEFAULT_SESSION"]
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+"""Question → validated SQL store for the SQL agent.
+
+Every SQL statement the LLM chain writes that executes successfully is kept
+under its normalized question (:func:`preloaded_questions.normalize_question`).
+:meth:`SqlCache.lookup` returns it for the same question, or for the nearest
+cached question by TF-IDF cosine similarity above ``KYDXBOT_SQL_CACHE_THRESHOLD``,
+so :func:`langchain_sql.query_via_sqlagent` can run it directly and skip the LLM.
+
+Similarity is scored in the fixed vocabulary of the router's preloaded-question
+model, never one fitted on the cache itself (which would silently drop a new
+question's unseen words).  A neighbour is only reused when neither question has
+a content word outside that vocabulary and both agree on their numbers ("top 5"
+never reuses "top 10"), entities, sort direction, negation and time grain;
+everything else needs an exact normalized match.
+
+Entries remember the :func:`db.get_schema_fingerprint` they were validated
+against.  When the schema changes each entry is re-checked with DuckDB
+``EXPLAIN`` on first use and dropped if it no longer binds.  Entries persist
+in SQLite (``KYDXBOT_SQL_CACHE``, default ``data/sql_cache.sqlite``; empty
+disables the file); other workers pick up new entries when they restart.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+
+from .cache_store import CacheStore
+from .db import get_pool, get_schema_fingerprint
+from .intent_templates import ENTITIES
+from .preloaded_questions import normalize_question
+from .router import get_router
+
+SQL_CACHE_DISK = os.getenv(
+    "KYDXBOT_SQL_CACHE",
+    os.path.join(os.path.dirname(__file__), "data", "sql_cache.sqlite"),
+)
+SQL_CACHE_THRESHOLD = float(os.getenv("KYDXBOT_SQL_CACHE_THRESHOLD", "0.85"))
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_NEGATION_RE = re.compile(r"\b(?:not|no|never|without|excluding|except|non)\b|n't\b")
+_DIRECTIONS = {
+    **dict.fromkeys(
+        "top highest most largest biggest greatest best max maximum".split(), "desc"
+    ),
+    **dict.fromkeys(
+        "bottom lowest least smallest fewest worst min minimum".split(), "asc"
+    ),
+}
+_GRAINS = {
+    "hour": "hour", "hourly": "hour", "day": "day", "days": "day", "daily": "day",
+    "week": "week", "weeks": "week", "weekly": "week",
+    "month": "month", "months": "month", "monthly": "month",
+    "quarter": "quarter", "quarters": "quarter", "quarterly": "quarter",
+    "year": "year", "years": "year", "yearly": "year", "annual": "year", "annually": "year",
+}
+
+
+@dataclass(frozen=True)
+class CachedSql:
+    question: str
+    sql: str
+    score: float
+    exact: bool
+
+
+def _signature(question: str) -> tuple:
+    """What two questions must share before one may reuse the other's SQL."""
+    words = set(_WORD_RE.findall(question))
+    entities = frozenset(
+        entity.table
+        for entity in ENTITIES
+        if any(set(name.split()) <= words for name in entity.names)
+    )
+    return (
+        tuple(sorted(_NUMBER_RE.findall(question))),
+        bool(_NEGATION_RE.search(question)),
+        frozenset(_DIRECTIONS[w] for w in words if w in _DIRECTIONS),
+        entities,
+        frozenset(_GRAINS[w] for w in words if w in _GRAINS),
+    )
+
+
+def _router_vocabulary() -> TfidfVectorizer | None:
+    return get_router().model.vectorizer
+
+
+def explain_ok(sql: str) -> bool:
+    """Return whether DuckDB can still bind and plan ``sql``."""
+    try:
+        with get_pool().reader() as cur:
+            cur.execute(f"EXPLAIN {sql}")
+    except Exception as e:  # noqa: BLE001
+        print("cached SQL no longer valid:", e)
+        return False
+    return True
+
+
+class SqlCache:
+    """Normalized-question → SQL map with TF-IDF nearest-neighbour lookup."""
+
+    def __init__(
+        self,
+        disk_path: str | os.PathLike | None = SQL_CACHE_DISK or None,
+        threshold: float = SQL_CACHE_THRESHOLD,
+        fingerprint: Callable[[], str] = get_schema_fingerprint,
+        validate: Callable[[str], bool] = explain_ok,
+        vocabulary: Callable[[], TfidfVectorizer | None] = _router_vocabulary,
+    ):
+        # Disk tier only: every entry is kept in ``_entries`` below
+        self._store = CacheStore(
+            "SQL cache",
+            "sql_cache",
+            keys={"question": "TEXT"},
+            values={"sql": "TEXT", "fingerprint": "TEXT"},
+            disk_path=disk_path,
+            maxsize=0,
+            created=True,
+            encode=tuple,
+            decode=tuple,
+        )
+        self.threshold = threshold
+        self._fingerprint = fingerprint
+        self._validate = validate
+        self._vocabulary = vocabulary
+        self._lock = threading.Lock()
+        # question -> (sql, schema fingerprint it was validated against)
+        self._entries: dict[str, tuple[str, str]] = {}
+        self._loaded = False
+        self._vectorizer: TfidfVectorizer | None = None
+        self._matrix = None
+        self._questions: list[str] = []
+        self._signatures: list[tuple] = []
+        self._stale = True
+        self._counts = {
+            "exact_hits": 0, "neighbour_hits": 0, "misses": 0,
+            "stores": 0, "revalidated": 0, "invalidated": 0,
+        }
+
+    @property
+    def disk_path(self) -> Path | None:
+        return self._store.disk_path
+
+    def _disk_write(self, question: str, sql: str | None, fingerprint: str = "") -> None:
+        if sql is None:
+            self._store.delete((question,))
+        else:
+            self._store.put((question,), (sql, fingerprint))
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+        rows = self._store.items()
+        with self._lock:
+            for (question,), entry in rows:
+                self._entries.setdefault(question, entry)
+            self._stale = True
+
+    # ── nearest neighbour ────────────────────────────────────────────────────
+    def _in_vocabulary(self, vectorizer: TfidfVectorizer, question: str) -> bool:
+        vocab = vectorizer.vocabulary_
+        return all(
+            t in vocab or t in ENGLISH_STOP_WORDS or t.isdigit()
+            for t in vectorizer.build_analyzer()(question)
+        )
+
+    def _nearest(self, question: str) -> tuple[str, float] | None:
+        try:
+            vectorizer = self._vocabulary()
+        except Exception as e:  # noqa: BLE001
+            print("SQL cache vocabulary unavailable:", e)
+            vectorizer = None
+        if vectorizer is None or not self._in_vocabulary(vectorizer, question):
+            return None  # unseen words would be dropped from the score
+        with self._lock:
+            if self._stale or vectorizer is not self._vectorizer:
+                # Only fully in-vocabulary questions are neighbour candidates
+                questions = [q for q in self._entries if self._in_vocabulary(vectorizer, q)]
+                self._questions = questions
+                self._signatures = [_signature(q) for q in questions]
+                self._matrix = vectorizer.transform(questions) if questions else None
+                self._vectorizer = vectorizer
+                self._stale = False
+            matrix, questions, signatures = self._matrix, self._questions, self._signatures
+        if matrix is None:
+            return None
+        # Rows are L2-normalized, so the dot product is the cosine similarity
+        sims = (matrix @ vectorizer.transform([question]).T).toarray().ravel()
+        wanted = _signature(question)
+        for i in np.argsort(-sims, kind="stable"):
+            if sims[i] < self.threshold:
+                break
+            if signatures[i] == wanted:
+                return questions[i], float(sims[i])
+        return None
+
+    # ── public API ───────────────────────────────────────────────────────────
+    def lookup(self, question: str) -> CachedSql | None:
+        """Return validated SQL for ``question`` (or a near-identical one)."""
+        self._ensure_loaded()
+        q = normalize_question(question)
+        with self._lock:
+            exact = q in self._entries
+        match = (q, 1.0) if exact else self._nearest(q)
+        if match is None:
+            with self._lock:
+                self._counts["misses"] += 1
+            return None
+
+        key, score = match
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:  # invalidated concurrently
+            with self._lock:
+                self._counts["misses"] += 1
+            return None
+        sql, checked = entry
+        current = self._fingerprint()
+        if checked != current:
+            if not self._validate(sql):
+                self.invalidate(key)
+                with self._lock:
+                    self._counts["misses"] += 1
+                return None
+            with self._lock:
+                self._entries[key] = (sql, current)
+                self._counts["revalidated"] += 1
+            self._disk_write(key, sql, current)
+        with self._lock:
+            self._counts["exact_hits" if exact else "neighbour_hits"] += 1
+        return CachedSql(key, sql, score, exact)
+
+    def put(self, question: str, sql: str) -> None:
+        """Remember ``sql`` (which just executed successfully) for ``question``."""
+        self._ensure_loaded()
+        q = normalize_question(question)
+        fingerprint = self._fingerprint()
+        with self._lock:
+            if q not in self._entries:
+                self._stale = True
+            self._entries[q] = (sql, fingerprint)
+            self._counts["stores"] += 1
+        self._disk_write(q, sql, fingerprint)
+
+    def invalidate(self, question: str) -> None:
+        """Forget the SQL stored for ``question`` (e.g. after it failed)."""
+        q = normalize_question(question)
+        with self._lock:
+            if self._entries.pop(q, None) is None:
+                return
+            self._stale = True
+            self._counts["invalidated"] += 1
+        self._disk_write(q, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counts,
+                "entries": len(self._entries),
+                "disk": str(self.disk_path) if self.disk_path else None,
+            }
+
+
+_cache: SqlCache | None = None
+
+
+def get_sql_cache() -> SqlCache:
+    global _cache
+    if _cache is None:
+        _cache = SqlCache()
+    return _cache
+
+
+__all__ = ["CachedSql", "SqlCache", "explain_ok", "get_sql_cache", "SQL_CACHE_THRESHOLD"]
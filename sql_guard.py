@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+"""Cost guardrails for LLM-generated SQL.
+
+Before generated (or cached) SQL runs, :meth:`SqlGuard.check`
+
+1. rejects anything but a single ``SELECT`` statement,
+2. caps the result with a ``LIMIT`` — the N the question asked for (see
+   ``chatbot.extract_limit_from_question``) or ``KYDXBOT_SQL_ROW_CAP`` — by
+   appending one or lowering the statement's own trailing ``LIMIT``, and
+3. runs DuckDB ``EXPLAIN`` and rejects plans in which any operator is
+   estimated to produce more than ``KYDXBOT_SQL_MAX_CARDINALITY`` rows (a
+   missing join key shows up here as a huge hash join).
+
+:meth:`SqlGuard.run` then executes it with a ``KYDXBOT_SQL_TIMEOUT`` second
+budget, interrupting DuckDB when it is exceeded, and marks the result
+``truncated`` when the row cap (not the question's N) limited it and the
+result filled it.  Every refusal raises :class:`SqlRejected`, whose message is
+meant for the user.
+"""
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+import duckdb
+
+from .db import QueryResult, get_pool, run_query
+
+SQL_MAX_CARDINALITY = int(os.getenv("KYDXBOT_SQL_MAX_CARDINALITY", "50000000"))
+SQL_ROW_CAP = int(os.getenv("KYDXBOT_SQL_ROW_CAP", "1000"))
+SQL_TIMEOUT = float(os.getenv("KYDXBOT_SQL_TIMEOUT", "15"))
+
+_TRAILING_LIMIT_RE = re.compile(
+    r"\bLIMIT\s+(\d+)(\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE
+)
+# Text EXPLAIN output, for DuckDB builds without FORMAT JSON
+_TEXT_CARDINALITY_RE = re.compile(r"(?:~\s*([\d,]+)\s+rows?|EC:\s*(\d+))", re.IGNORECASE)
+
+
+class SqlRejected(Exception):
+    """Generated SQL was refused or stopped; ``str(e)`` explains why to the user."""
+
+
+@dataclass(frozen=True)
+class GuardedSql:
+    sql: str
+    original: str
+    estimated_rows: int
+    limit: int
+    capped: bool = False  # the row cap, not the question, set ``limit``
+
+
+def _code_end(sql: str) -> int:
+    """Index just past the last character of ``sql`` that is not in a comment."""
+    end, i, n = 0, 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if c in "'\"":
+            j = sql.find(c, i + 1)
+            while j != -1 and sql.startswith(c, j + 1):  # doubled quote escape
+                j = sql.find(c, j + 2)
+            i = end = n if j == -1 else j + 1
+        elif sql.startswith("--", i):
+            j = sql.find("\n", i)
+            i = n if j == -1 else j + 1
+        elif sql.startswith("/*", i):
+            j = sql.find("*/", i + 2)
+            i = n if j == -1 else j + 2
+        else:
+            if not c.isspace():
+                end = i + 1
+            i += 1
+    return end
+
+
+def statement_body(sql: str) -> str:
+    """``sql`` without trailing semicolons, whitespace and comments."""
+    while True:
+        body = sql[:_code_end(sql)].rstrip(";").rstrip()
+        if body == sql:
+            return body
+        sql = body
+
+
+def apply_limit(sql: str, limit: int) -> str:
+    """Return ``sql`` returning at most ``limit`` rows."""
+    sql = statement_body(sql)
+    m = _TRAILING_LIMIT_RE.search(sql)
+    if m is None:
+        # On its own line, after any comment left inside the statement
+        return f"{sql}\nLIMIT {limit}"
+    if int(m.group(1)) <= limit:
+        return sql
+    return f"{sql[:m.start(1)]}{limit}{sql[m.end(1):]}"
+
+
+def _max_cardinality(node) -> int:
+    if isinstance(node, list):
+        return max((_max_cardinality(n) for n in node), default=0)
+    if not isinstance(node, dict):
+        return 0
+    own = node.get("extra_info", {}).get("Estimated Cardinality", 0)
+    try:
+        own = int(own)
+    except (TypeError, ValueError):
+        own = 0
+    return max(own, _max_cardinality(node.get("children", [])))
+
+
+def estimate_rows(con, sql: str) -> int:
+    """Largest estimated operator cardinality in DuckDB's plan for ``sql``."""
+    try:
+        rows = con.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall()
+        return max((_max_cardinality(json.loads(plan)) for _, plan in rows), default=0)
+    except (duckdb.Error, json.JSONDecodeError):
+        pass  # the text plan below raises if the SQL itself is bad
+    text = "\n".join(plan for _, plan in con.execute(f"EXPLAIN {sql}").fetchall())
+    return max(
+        (int((a or b).replace(",", "")) for a, b in _TEXT_CARDINALITY_RE.findall(text)),
+        default=0,
+    )
+
+
+class SqlGuard:
+    """Checks and runs generated SQL within row, plan-size and time budgets."""
+
+    def __init__(
+        self,
+        max_cardinality: int = SQL_MAX_CARDINALITY,
+        row_cap: int = SQL_ROW_CAP,
+        timeout: float = SQL_TIMEOUT,
+        connect: Callable = lambda: get_pool().cursor(),
+        execute: Callable[..., QueryResult] = run_query,
+    ):
+        self.max_cardinality = max_cardinality
+        self.row_cap = row_cap
+        self.timeout = timeout
+        self._connect = connect
+        self._execute = execute
+        self._lock = threading.Lock()
+        self.counts = {
+            "checked": 0, "limited": 0, "truncated": 0, "rejected_statement": 0,
+            "rejected_plan": 0, "timeouts": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    def check(self, sql: str, limit: int | None = None) -> GuardedSql:
+        """Validate ``sql`` and return the capped statement to execute."""
+        self._count("checked")
+        con = self._connect()
+        try:
+            # Unparsable SQL raises duckdb.ParserException like any bad query
+            statements = con.extract_statements(sql)
+            if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+                self._count("rejected_statement")
+                raise SqlRejected("Only a single read-only SELECT query can be run.")
+
+            cap = min(limit, self.row_cap) if limit else self.row_cap
+            capped = apply_limit(statements[0].query, cap)
+            limited = capped != statement_body(statements[0].query)
+            if limited:
+                self._count("limited")
+
+            estimated = estimate_rows(con, capped)
+        finally:
+            con.close()
+        if estimated > self.max_cardinality:
+            self._count("rejected_plan")
+            raise SqlRejected(
+                f"That question would make the database process about {estimated:,} rows, "
+                f"more than the {self.max_cardinality:,} allowed. Try narrowing it down, "
+                "for example with a filter, a date range or a top N."
+            )
+        by_cap = limited and (not limit or limit > self.row_cap)
+        return GuardedSql(capped, sql, estimated, cap, by_cap)
+
+    def run(self, guarded: GuardedSql) -> QueryResult:
+        """Execute a checked statement, stopping it after ``timeout`` seconds."""
+        try:
+            result = self._execute(guarded.sql, timeout=self.timeout)
+        except duckdb.InterruptException as e:
+            self._count("timeouts")
+            raise SqlRejected(
+                f"The query took longer than {self.timeout:g} seconds and was stopped. "
+                "Try asking about a smaller slice of the data."
+            ) from e
+        if guarded.capped and len(result) >= guarded.limit:
+            # There may be more rows than were returned
+            result.truncated = True
+            self._count("truncated")
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counts,
+                "max_cardinality": self.max_cardinality,
+                "row_cap": self.row_cap,
+                "timeout": self.timeout,
+            }
+
+
+_guard: SqlGuard | None = None
+
+
+def get_sql_guard() -> SqlGuard:
+    global _guard
+    if _guard is None:
+        _guard = SqlGuard()
+    return _guard
+
+
+__all__ = [
+    "GuardedSql",
+    "SqlGuard",
+    "SqlRejected",
+    "apply_limit",
+    "estimate_rows",
+    "get_sql_guard",
+    "statement_body",
+    "SQL_MAX_CARDINALITY",
+    "SQL_ROW_CAP",
+    "SQL_TIMEOUT",
+]
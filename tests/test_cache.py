@@ -0,0 +1,43 @@
+from kydxbot.cache import AnswerCache
+
+
+def test_lru_eviction():
+    cache = AnswerCache(maxsize=2, ttl=60, disk_path=None)
+    cache.put("a", "v1", "A")
+    cache.put("b", "v1", "B")
+    assert cache.get("a", "v1") == "A"
+    cache.put("c", "v1", "C")
+    assert cache.get("b", "v1") is None
+    assert cache.get("a", "v1") == "A"
+
+
+def test_ttl_expiry():
+    cache = AnswerCache(maxsize=8, ttl=0, disk_path=None)
+    cache.put("a", "v1", "A")
+    assert cache.get("a", "v1") is None
+
+
+def test_new_data_version_invalidates(tmp_path):
+    cache = AnswerCache(maxsize=8, ttl=60, disk_path=tmp_path / "answers.db")
+    cache.put("a", "v1", "A")
+    assert cache.get("a", "v2") is None
+    assert cache.get("a", "v1") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_disk_tier_shared_between_instances(tmp_path):
+    path = tmp_path / "answers.db"
+    AnswerCache(maxsize=8, ttl=60, disk_path=path).put("a", "v1", "A")
+    other = AnswerCache(maxsize=8, ttl=60, disk_path=path)
+    assert other.get("a", "v1") == "A"
+    assert other.stats()["disk_hits"] == 1
+
+
+def test_missing_table_image_is_a_miss(tmp_path):
+    cache = AnswerCache(maxsize=8, ttl=60, disk_path=None)
+    img = tmp_path / "table.png"
+    img.write_bytes(b"png")
+    cache.put("a", "v1", f"TABLE:{img}")
+    assert cache.get("a", "v1") == f"TABLE:{img}"
+    img.unlink()
+    assert cache.get("a", "v1") is None
@@ -0,0 +1,50 @@
+import os
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import sqlite3
+
+from kydxbot.cache_store import CacheStore
+
+
+def _store(path, **kwargs):
+    return CacheStore(
+        "test cache", "pairs", keys={"a": "TEXT", "b": "INTEGER"}, values={"v": "TEXT"},
+        disk_path=path, **kwargs,
+    )
+
+
+def test_memory_then_disk_then_miss(tmp_path):
+    path = tmp_path / "store.sqlite"
+    store = _store(path, maxsize=1)
+    store.put(("x", 1), "one")
+    store.put(("x", 2), "two")  # evicts ("x", 1) from memory
+    assert store.get(("x", 2)) == "two"
+    assert store.get(("x", 1)) == "one"
+    assert store.get(("y", 1)) is None
+    assert store.stats() | {"disk": None} == {
+        "memory_hits": 1, "disk_hits": 1, "misses": 1, "stores": 2, "entries": 1, "disk": None,
+    }
+
+    other = _store(path, maxsize=0)
+    assert sorted(other.items()) == [(("x", 1), "one"), (("x", 2), "two")]
+    other.delete(("x", 1))
+    assert [k for k, _ in other.items()] == [("x", 2)]
+
+
+def test_wal_is_set_once_on_the_file(tmp_path):
+    path = tmp_path / "store.sqlite"
+    _store(path)
+    con = sqlite3.connect(path)
+    assert con.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    con.close()
+
+
+def test_ttl_and_validity_hide_entries(tmp_path):
+    store = _store(tmp_path / "store.sqlite", ttl=0)
+    store.put(("x", 1), "old")
+    assert store.get(("x", 1)) is None and store.items() == []
+
+    store = _store(None, valid=lambda v: v != "bad")
+    store.put(("x", 1), "bad")
+    assert store.get(("x", 1)) is None
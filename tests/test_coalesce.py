@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import pytest
+
+from kydxbot import chatbot
+from kydxbot.cache import AnswerCache
+from kydxbot.coalesce import SingleFlight
+from kydxbot.preloaded_questions import normalize_question
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "reply"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == ["reply"] * 5
+    assert len(calls) == 1
+    assert flight.stats()["coalesced_hits"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_errors_propagate_and_key_is_released():
+    flight = SingleFlight()
+
+    def boom():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        flight.do("k", boom)
+    assert flight.do("k", lambda: 1) == 1
+
+
+def test_normalize_question():
+    assert normalize_question("  Top 3   Customers? ") == "top 3 customers"
+
+
+def test_handle_query_coalesces_across_sessions(monkeypatch):
+    calls, fallbacks = [], []
+
+    def answer(q, on_event=None):
+        calls.append(q)
+        time.sleep(0.2)
+        return ("shared reply", True) if q.startswith("top") else (None, False)
+
+    def fallback(q, on_event=None, session_id=None):
+        fallbacks.append(session_id)
+        return f"reply for {session_id}"
+
+    monkeypatch.setattr(chatbot, "_answer", answer)
+    monkeypatch.setattr(chatbot, "_fallback", fallback)
+    monkeypatch.setattr(chatbot, "_answers", AnswerCache(disk_path=None))
+    monkeypatch.setattr(chatbot, "_inflight", SingleFlight())
+    monkeypatch.setattr(chatbot, "_save_to_history", lambda *a, **kw: None)
+
+    def ask_all(question, sessions):
+        results = {}
+
+        def ask(session):
+            results[session] = chatbot.handle_query(question, session_id=session)
+
+        threads = [threading.Thread(target=ask, args=(s,)) for s in sessions]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    # Data answers do not depend on the session: one run for everyone
+    assert ask_all("top 3 customers", ["alice", "bob", "carol"]) == dict.fromkeys(
+        ["alice", "bob", "carol"], "shared reply"
+    )
+    assert calls == ["top 3 customers"]
+
+    # The OpenAI fallback reads each session's history, so it runs per session
+    assert ask_all("tell me a story", ["alice", "bob"]) == {
+        "alice": "reply for alice", "bob": "reply for bob",
+    }
+    assert calls[1:] == ["tell me a story"] and sorted(fallbacks) == ["alice", "bob"]
@@ -0,0 +1,143 @@
+import datetime
+import importlib.util
+import os
+import threading
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import duckdb
+import pytest
+
+from kydxbot import db
+
+
+@pytest.fixture
+def memory_db(monkeypatch):
+    con = duckdb.connect()
+    con.execute("CREATE TABLE t (id INTEGER, name VARCHAR, day DATE, amount DECIMAL(10, 2))")
+    con.execute("INSERT INTO t VALUES (1, 'a', DATE '2024-01-02', 1.50), (2, NULL, NULL, 2.25)")
+    monkeypatch.setattr(db, "_pool", db.DuckDBPool(connect=lambda: con))
+    return con
+
+
+def test_run_query_returns_columns_with_native_values(memory_db):
+    result = db.run_query("SELECT id, name, day, amount FROM t ORDER BY id")
+    assert result.columns == ["id", "name", "day", "amount"]
+    assert len(result) == 2
+    assert result[0] == (1, "a", datetime.date(2024, 1, 2), 1.5)
+    assert list(result)[1] == (2, None, None, 2.25)
+    assert result.arrays[0].tolist() == [1, 2]
+    assert len(db.run_query("SELECT * FROM t WHERE id > 5")) == 0
+
+
+def test_schema_fingerprint_tracks_columns_not_rows(memory_db, monkeypatch):
+    version = ["v1"]
+    monkeypatch.setattr(db, "get_data_version", lambda: version[0])
+    monkeypatch.setattr(db, "_schema_fingerprint", None)
+    first = db.get_schema_fingerprint()
+
+    memory_db.execute("INSERT INTO t VALUES (3, 'c', NULL, 0)")
+    version[0] = "v2"
+    assert db.get_schema_fingerprint() == first
+
+    memory_db.execute("ALTER TABLE t ADD COLUMN extra INTEGER")
+    version[0] = "v3"
+    assert db.get_schema_fingerprint() != first
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    path = str(tmp_path / "pool.db")
+    con = duckdb.connect(path)
+    con.execute("CREATE TABLE t AS SELECT range AS id FROM range(10)")
+    con.close()
+    return path
+
+
+def test_pool_opens_read_only_with_config(file_db, tmp_path):
+    pool = db.DuckDBPool(
+        file_db, read_only=True, threads=2, memory_limit="256MB",
+        temp_directory=str(tmp_path / "spill"),
+    )
+    with pool.reader() as cur:
+        assert cur.execute("SELECT count(*) FROM t").fetchone() == (10,)
+        assert cur.execute("SELECT current_setting('threads')").fetchone() == (2,)
+        with pytest.raises(duckdb.Error):
+            cur.execute("INSERT INTO t VALUES (10)")
+    with pytest.raises(RuntimeError):
+        with pool.writer():
+            pass
+    pool.close()
+
+    writable = db.DuckDBPool(file_db, read_only=False)
+    with writable.writer() as cur:
+        cur.execute("INSERT INTO t VALUES (10)")
+    with writable.reader() as cur:
+        assert cur.execute("SELECT count(*) FROM t").fetchone() == (11,)
+    assert writable.stats()["writes"] == 1
+    writable.close()
+
+
+def test_drop_script_writes_through_the_pool(file_db):
+    con = duckdb.connect(file_db)
+    con.execute("CREATE VIEW v AS SELECT * FROM t")
+    con.close()
+    script = os.path.join(os.path.dirname(db.__file__), "data_ingest", "drop_all_data.py")
+    spec = importlib.util.spec_from_file_location("drop_all_data", script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    module.drop_all_tables_and_views(file_db)
+    con = duckdb.connect(file_db, read_only=True)
+    assert con.execute("SELECT count(*) FROM information_schema.tables").fetchone() == (0,)
+    con.close()
+
+
+def test_pool_gives_each_thread_its_own_cursor(file_db):
+    pool = db.DuckDBPool(file_db, readers=2)
+    with pool.reader() as first:
+        with pool.reader() as nested:
+            assert nested is not first
+    with pool.reader() as again:
+        assert again is first
+
+    barrier = threading.Barrier(2)
+    seen = []
+
+    def read():
+        with pool.reader() as cur:
+            barrier.wait(timeout=5)  # both threads hold a cursor at once
+            seen.append(cur)
+            cur.execute("SELECT sum(id) FROM t").fetchone()
+
+    threads = [threading.Thread(target=read) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(c) for c in seen}) == 2
+    stats = pool.stats()
+    assert stats["peak_in_use"] == 2 and stats["in_use"] == 0
+    assert stats["nested"] == 1 and stats["waited"] == 0
+    pool.close()
+
+
+def test_pool_caps_concurrent_readers(file_db):
+    pool = db.DuckDBPool(file_db, readers=1)
+    holding, release = threading.Event(), threading.Event()
+
+    def hold():
+        with pool.reader():
+            holding.set()
+            release.wait(timeout=5)
+
+    t = threading.Thread(target=hold)
+    t.start()
+    holding.wait(timeout=5)
+    assert pool.stats()["utilization"] == 1.0
+    threading.Timer(0.05, release.set).start()
+    with pool.reader() as cur:
+        cur.execute("SELECT 1")
+    t.join()
+    assert pool.stats()["waited"] == 1
+    pool.close()
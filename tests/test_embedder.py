@@ -0,0 +1,176 @@
+import os
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import threading
+import time
+
+import duckdb
+import numpy as np
+
+from kydxbot import pinecone_utils
+from kydxbot.embedder import BatchEmbedder, RateLimiter
+from kydxbot.embedding_cache import EmbeddingCache
+from kydxbot.ingest_manifest import IngestManifest
+from kydxbot.vector_index import LocalIndex
+
+
+def test_batches_run_concurrently_and_cover_every_record():
+    active, peak, sizes = [0], [0], []
+    lock = threading.Lock()
+
+    def embed_batch(texts):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            sizes.append(len(texts))
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return [np.full(2, float(t)) for t in texts]
+
+    records = [(f"id_{i}", str(i), {"n": i}) for i in range(25)]
+    embedder = BatchEmbedder(embed_batch, batch_size=4, concurrency=3, requests_per_minute=0)
+    out = [row for batch in embedder.embed_records(records) for row in batch]
+
+    assert sorted(sizes) == [1] + [4] * 6
+    assert peak[0] > 1
+    assert sorted(out) == sorted((vid, [float(t)] * 2, meta) for vid, t, meta in records)
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(per_minute=60 * 50)  # one every 20 ms
+    start = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.055
+
+
+def test_get_embeddings_sends_only_distinct_misses(monkeypatch):
+    calls = []
+
+    def fake_create(model, input):
+        calls.append(list(input))
+        data = [type("D", (), {"index": i, "embedding": [float(len(t))] * pinecone_utils.EMBEDDING_DIM})
+                for i, t in enumerate(input)]
+        return type("R", (), {"data": data})
+
+    cache = EmbeddingCache(disk_path=None)
+    cache.put("text-embedding-ada-002", "cached", np.ones(pinecone_utils.EMBEDDING_DIM))
+    monkeypatch.setattr(pinecone_utils, "TESTING", False)
+    monkeypatch.setattr(pinecone_utils.openai.embeddings, "create", fake_create)
+    monkeypatch.setattr(pinecone_utils, "get_embedding_cache", lambda: cache)
+
+    vecs = pinecone_utils.get_embeddings(["ab", "cached", "abc", "ab"])
+    assert calls == [["ab", "abc"]]
+    assert [v[0] for v in vecs] == [2.0, 1.0, 3.0, 2.0]
+
+
+def test_ingest_products_upserts_every_row(tmp_path, monkeypatch):
+    path = str(tmp_path / "marts.db")
+    con = duckdb.connect(path)
+    con.execute(
+        "CREATE TABLE products AS SELECT i AS product_id, 'P' || i AS product_name,"
+        " 'Cat' AS product_category, 10.0 * i AS sales_amount, 4.0 * i AS cost_of_goods_sold"
+        " FROM range(1, 251) t(i)"
+    )
+    con.close()
+
+    idx = LocalIndex(path=None, dim=pinecone_utils.EMBEDDING_DIM)
+    monkeypatch.setattr(pinecone_utils, "index", idx)
+    monkeypatch.setattr(pinecone_utils, "_manifest", IngestManifest(tmp_path / "manifest.json"))
+    pinecone_utils.ingest_product_texts(path)
+
+    assert idx.describe_index_stats()["total_vector_count"] == 250
+    meta = idx.query(vector=np.ones(pinecone_utils.EMBEDDING_DIM), top_k=250, include_metadata=True)
+    by_id = {m.id: m.metadata for m in meta.matches}
+    assert by_id["prod_7"]["profit"] == 42.0
+
+
+def test_reingest_touches_only_changed_rows(tmp_path, monkeypatch):
+    path = str(tmp_path / "marts.db")
+    con = duckdb.connect(path)
+    con.execute(
+        "CREATE TABLE distribution_center_inventory AS SELECT i AS distribution_center_id,"
+        " 'DC ' || i AS distribution_center_name, 10 AS total_items, 4 AS items_sold,"
+        " 6 AS items_in_stock, 100.0 AS total_sales, 50.0 AS total_inventory_cost"
+        " FROM range(1, 6) t(i)"
+    )
+    con.close()
+    idx = LocalIndex(path=None, dim=pinecone_utils.EMBEDDING_DIM)
+    monkeypatch.setattr(pinecone_utils, "index", idx)
+    monkeypatch.setattr(pinecone_utils, "_manifest", IngestManifest(tmp_path / "manifest.json"))
+    ingest = pinecone_utils.ingest_distribution_center_inventory
+
+    assert ingest(path) == {"inserted": 5, "updated": 0, "deleted": 0, "skipped": 0}
+
+    upserted = []
+    real_upsert = idx.upsert
+    monkeypatch.setattr(idx, "upsert", lambda vectors: upserted.extend(v[0] for v in vectors) or real_upsert(vectors))
+    con = duckdb.connect(path)
+    con.execute("UPDATE distribution_center_inventory SET items_in_stock = 0 WHERE distribution_center_id = 2")
+    con.execute("DELETE FROM distribution_center_inventory WHERE distribution_center_id = 5")
+    con.execute("INSERT INTO distribution_center_inventory VALUES (9, 'DC 9', 1, 1, 0, 1.0, 1.0)")
+    con.close()
+
+    assert ingest(path) == {"inserted": 1, "updated": 1, "deleted": 1, "skipped": 3}
+    assert sorted(upserted) == ["dc_2", "dc_9"]
+    assert idx.describe_index_stats()["total_vector_count"] == 5
+    assert ingest(path)["skipped"] == 5
+    assert ingest(path, full=True)["updated"] == 5
+
+
+def test_customer_records_are_built_in_sql(tmp_path):
+    path = str(tmp_path / "marts.db")
+    con = duckdb.connect(path)
+    con.execute(
+        "CREATE TABLE customers AS SELECT * FROM (VALUES"
+        " (1, 'Ada', 'Lovelace', 'UK', 'Search', 123.456::DECIMAL(10, 3), 3,"
+        "  TIMESTAMP '2023-01-05 10:00:00', TIMESTAMP '2023-02-05 10:00:00.12', 4, 1, 2, 0, 1, 0, 7),"
+        " (2, NULL, 'Turing', '', NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL)"
+        ") t(user_id, customer_first_name, customer_last_name, customer_country,"
+        " customer_acquisition_channel, total_amount_spent, total_items_purchased,"
+        " first_order_completed_at, last_order_completed_at, num_orders, num_orders_Shipped,"
+        " num_orders_Complete, num_orders_Processing, num_orders_Cancelled, num_orders_Returned,"
+        " num_web_sessions)"
+    )
+    con.close()
+
+    rows = [0]
+    (vid1, text1, meta1), (vid2, text2, meta2) = pinecone_utils.iter_customer_records(path, rows)
+    assert rows == [2]
+    assert (vid1, vid2) == ("cust_1", "cust_2")
+    assert text1 == (
+        "Ada Lovelace UK acquired_via=Search spent_total=$123.46 items_purchased=3"
+        " first_order=2023-01-05 10:00:00 last_order=2023-02-05 10:00:00.120000"
+        " orders_total=4 shipped=1 complete=2 processing=0 cancelled=1 returned=0 web_sessions=7"
+    )
+    assert meta1["total_amount_spent"] == 123.456 and meta1["num_orders_Shipped"] == 1
+    assert text2 == ""
+    assert meta2 == {
+        "source": "customer", "user_id": 2, "first_name": "", "last_name": "Turing",
+        "country": "", "acquisition_channel": "", "total_amount_spent": 0.0,
+        "first_order_completed_at": "", "last_order_completed_at": "",
+        "total_items_purchased": 0, "num_orders_total": 0, "num_orders_Shipped": 0,
+        "num_orders_Complete": 0, "num_orders_Processing": 0, "num_orders_Cancelled": 0,
+        "num_orders_Returned": 0, "num_web_sessions": 0,
+    }
+
+
+def test_record_stream_holds_no_reader_slot(tmp_path, monkeypatch):
+    from kydxbot import db
+
+    path = str(tmp_path / "data.db")
+    con = duckdb.connect(path)
+    con.execute("CREATE TABLE p AS SELECT range AS id, 'item ' || range AS text FROM range(5)")
+    con.close()
+    pool = db.DuckDBPool(path, readers=1)
+    monkeypatch.setattr(db, "_pool", pool)
+
+    records = pinecone_utils._iter_records(path, "SELECT id, text FROM p", "p_", "product")
+    assert next(records)[0] == "p_0"
+    assert pool.stats()["in_use"] == 0
+    with pool.reader() as cur:  # the only slot is still free mid-stream
+        assert cur.execute("SELECT count(*) FROM p").fetchone() == (5,)
+    records.close()
+    pool.close()
@@ -0,0 +1,72 @@
+import os
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import numpy as np
+import pytest
+
+from kydxbot import pinecone_utils
+from kydxbot.embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-ada-002"
+
+
+def test_memory_then_disk_hits(tmp_path):
+    path = tmp_path / "emb.sqlite"
+    cache = EmbeddingCache(maxsize=1, disk_path=path)
+    assert cache.get(MODEL, "hello") is None
+    stored = cache.put(MODEL, "hello", np.arange(4, dtype=np.float64))
+    assert stored.dtype == np.float32 and not stored.flags.writeable
+    assert cache.get(MODEL, "hello") is stored
+
+    cache.put(MODEL, "other", np.ones(4))  # evicts "hello" from the LRU
+    assert cache.get(MODEL, "hello").tolist() == [0, 1, 2, 3]
+    assert cache.get("another-model", "hello") is None
+
+    fresh = EmbeddingCache(disk_path=path)
+    assert fresh.get(MODEL, "other").tolist() == [1, 1, 1, 1]
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 2)
+    assert stats["stores"] == 2 and stats["disk"] == str(path)
+
+
+def test_batches_use_one_disk_round_trip(tmp_path, monkeypatch):
+    path = tmp_path / "emb.sqlite"
+    texts = [f"text {i}" for i in range(1200)]  # more keys than one statement binds
+    vectors = {t: np.full(4, i, dtype=np.float32) for i, t in enumerate(texts)}
+    EmbeddingCache(disk_path=path).put_many(MODEL, vectors)
+
+    fresh = EmbeddingCache(disk_path=path)
+    connects = []
+    connect = fresh._store.connect
+    monkeypatch.setattr(fresh._store, "connect", lambda: connects.append(1) or connect())
+    got = fresh.get_many(MODEL, texts + ["unknown"])
+    assert len(connects) == 1
+    assert [v[0] for v in got[:-1]] == list(range(1200)) and got[-1] is None
+    assert not got[0].flags.writeable
+    stats = fresh.stats()
+    assert (stats["disk_hits"], stats["misses"]) == (1200, 1)
+
+
+def test_get_embedding_calls_api_once_per_text(monkeypatch):
+    calls = []
+
+    class _Resp:
+        def __init__(self, n):
+            self.data = [type("D", (), {"embedding": [float(n)] * pinecone_utils.EMBEDDING_DIM})]
+
+    def fake_create(model, input):
+        calls.append(input)
+        return _Resp(len(calls))
+
+    monkeypatch.setattr(pinecone_utils, "TESTING", False)
+    monkeypatch.setattr(pinecone_utils.openai.embeddings, "create", fake_create)
+    monkeypatch.setattr(pinecone_utils, "get_embedding_cache", lambda c=EmbeddingCache(disk_path=None): c)
+
+    first = pinecone_utils.get_embedding("top products")
+    again = pinecone_utils.get_embedding("top products")
+    pinecone_utils.get_embedding("top customers")
+    assert calls == [["top products"], ["top customers"]]
+    assert again is first
+    with pytest.raises(ValueError):
+        first[0] = 2.0
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from kydxbot import executor
+
+
+def test_run_bounded_returns_result():
+    result = asyncio.run(executor.run_bounded("test", lambda a, b: a + b, 2, 3))
+    assert result == 5
+    stats = executor.get_stats()["endpoints"]["test"]
+    assert stats["completed"] >= 1
+    assert stats["queue_depth"] == 0
+
+
+def test_run_bounded_rejects_when_full(monkeypatch):
+    monkeypatch.setattr(executor, "MAX_WORKERS", 1)
+    monkeypatch.setattr(executor, "MAX_QUEUE", 0)
+    gate = threading.Event()
+
+    async def scenario():
+        first = asyncio.ensure_future(executor.run_bounded("busy", gate.wait, 5))
+        await asyncio.sleep(0)
+        with pytest.raises(executor.PoolFullError) as info:
+            await executor.run_bounded("busy", lambda: None)
+        gate.set()
+        await first
+        return info.value
+
+    err = asyncio.run(scenario())
+    assert err.retry_after > 0
+    assert executor.get_stats()["endpoints"]["busy"]["rejected"] == 1
+
+
+def test_cancelled_queued_call_releases_its_slot(monkeypatch):
+    monkeypatch.setattr(executor, "_executor", ThreadPoolExecutor(max_workers=1))
+    gate = threading.Event()
+    ran = []
+
+    async def scenario():
+        first = executor.submit_bounded("cancel", gate.wait, 5)
+        queued = executor.submit_bounded("cancel", ran.append, 1)
+        queued.cancel()  # e.g. the client disconnected while it waited
+        await asyncio.sleep(0)
+        gate.set()
+        await first
+
+    before = executor.get_stats()["in_flight"]
+    asyncio.run(scenario())
+    executor._executor.shutdown(wait=True)
+    stats = executor.get_stats()
+    assert ran == []
+    assert stats["in_flight"] == before
+    assert stats["endpoints"]["cancel"]["queue_depth"] == 0
+    assert stats["endpoints"]["cancel"]["completed"] == 1
@@ -0,0 +1,76 @@
+import os
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import duckdb
+import pytest
+
+from kydxbot import db
+from kydxbot.intent_templates import IntentMatcher, resolve_metric
+from kydxbot.schema_context import SchemaContext
+
+
+@pytest.fixture
+def marts(monkeypatch):
+    con = duckdb.connect()
+    con.execute(
+        "CREATE TABLE customers (user_id INTEGER, customer_first_name VARCHAR,"
+        " customer_last_name VARCHAR, total_amount_spent DOUBLE, num_web_sessions INTEGER,"
+        " num_orders_cancelled INTEGER, num_orders_returned INTEGER)"
+    )
+    con.execute(
+        "INSERT INTO customers VALUES (1, 'Ada', 'Lovelace', 120.5, 7, 0, 1),"
+        " (2, 'Alan', 'Turing', 80, 3, 2, 0), (3, 'Grace', 'Hopper', NULL, 9, 1, 1)"
+    )
+    con.execute(
+        "CREATE TABLE products (product_id INTEGER, product_name VARCHAR,"
+        " sales_amount DOUBLE, cost_of_goods_sold DOUBLE, profit DOUBLE)"
+    )
+    con.execute(
+        "INSERT INTO products VALUES (10, 'Jacket', 1000, 400, 600), (11, 'Socks', 50, 30, 20)"
+    )
+    monkeypatch.setattr(db, "_pool", db.DuckDBPool(connect=lambda: con))
+    context = SchemaContext(["customers", "products"], version=lambda: "v1")
+    return IntentMatcher(snapshot=context.snapshot, enabled=True)
+
+
+def test_top_n_questions_map_to_ordered_limited_sql(marts):
+    intent = marts.match("Top 2 customers by revenue?")
+    assert intent.sql == (
+        "SELECT customer_first_name, customer_last_name, total_amount_spent FROM customers"
+        " WHERE total_amount_spent IS NOT NULL ORDER BY total_amount_spent DESC LIMIT 2"
+    )
+    assert marts.run(intent).rows() == [("Ada", "Lovelace", 120.5), ("Alan", "Turing", 80.0)]
+
+    intent = marts.match("Which product has the lowest profit")
+    assert (intent.limit, intent.metric) == (1, "profit")
+    assert marts.run(intent).rows() == [("Socks", 20.0)]
+
+    assert marts.match("show me the top customers by web sessions").limit == 10
+
+
+def test_count_and_average(marts):
+    assert marts.run(marts.match("How many customers are there?")).rows() == [(3,)]
+    intent = marts.match("What is the average profit per product")
+    assert intent.sql == "SELECT AVG(profit) AS average_profit FROM products"
+    assert marts.run(intent).rows() == [(310.0,)]
+
+
+def test_unclear_questions_are_left_to_the_llm(marts):
+    for question in (
+        "Top 5 products by profit in 2023",  # extra filter
+        "Top customers by orders",  # cancelled or returned?
+        "Average revenue",  # customers or products?
+        "Top 5 products by colour",  # no such column
+        "Total sales by product category",
+    ):
+        assert marts.match(question) is None, question
+    stats = marts.stats()
+    assert stats["missed"] == 5 and stats["matched"] == 0
+
+
+def test_resolve_metric_prefers_the_closest_column(marts):
+    schema = marts._snapshot()["customers"]
+    assert resolve_metric("returns", schema) == "num_orders_returned"
+    assert resolve_metric("amount spent", schema) == "total_amount_spent"
+    assert resolve_metric("orders", schema) is None
@@ -1,5 +1,6 @@
 import os
 import json
+import time
 
 os.environ["KYDXBOT_TESTING"] = "1"
 
@@ -20,3 +21,68 @@ def test_load_history_reads_last_entries(tmp_path, monkeypatch):
         json.dump(data, f)
     hist = load_recent_history(3)
     assert [d["query_text"] for d in hist] == ["q2", "q3", "q4"]
+
+
+def test_history_appends_jsonl_and_migrates(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from kydxbot.chatbot import _save_to_history, flush_history
+
+    with open("chatbot_responses.json", "w", encoding="utf-8") as f:
+        json.dump([{"query_text": "old", "retrieved_response": "r"}], f)
+    _save_to_history("new", "reply", confidence=None)
+    flush_history()
+
+    assert not os.path.exists("chatbot_responses.json")
+    lines = open("chatbot_responses.jsonl", encoding="utf-8").read().splitlines()
+    assert [json.loads(ln)["query_text"] for ln in lines] == ["old", "new"]
+
+
+def test_read_tail_spans_blocks(tmp_path):
+    from kydxbot.history_store import append_record, read_tail
+
+    path = tmp_path / "hist.jsonl"
+    for i in range(500):
+        append_record({"query_text": f"q{i}", "retrieved_response": "x" * 50}, path)
+    tail = read_tail(200, path)
+    assert len(tail) == 200
+    assert tail[0]["query_text"] == "q300"
+    assert tail[-1]["query_text"] == "q499"
+
+
+def test_sessions_are_isolated_and_clearable(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from kydxbot.chatbot import (
+        _save_to_history,
+        clear_conversation,
+        flush_history,
+    )
+
+    _save_to_history("a1", "r", confidence=None, session_id="a")
+    _save_to_history("b1", "r", confidence=None, session_id="b")
+    _save_to_history("a2", "r", confidence=None, session_id="a")
+    flush_history()
+
+    hist = load_recent_history(5, session_id="a")
+    assert [d["query_text"] for d in hist] == ["a1", "a2"]
+    assert clear_conversation("a")
+    assert load_recent_history(5, session_id="a") == []
+    assert [d["query_text"] for d in load_recent_history(5, session_id="b")] == ["b1"]
+
+
+def test_session_memory_bounds():
+    from kydxbot.session_memory import SessionMemory
+
+    mem = SessionMemory(max_turns=2, idle_seconds=60, max_sessions=2)
+    for i in range(3):
+        mem.add("s1", {"query_text": f"q{i}"})
+    assert [r["query_text"] for r in mem.recent("s1", 5)] == ["q1", "q2"]
+
+    mem.add("s2", {"query_text": "x"})
+    mem.add("s3", {"query_text": "y"})
+    assert mem.recent("s1", 5) == []
+    assert mem.stats()["sessions"] == 2
+
+    idle = SessionMemory(max_turns=2, idle_seconds=0.01, max_sessions=10)
+    idle.add("s1", {"query_text": "q"})
+    time.sleep(0.02)
+    assert idle.recent("s1", 1) == []
@@ -0,0 +1,65 @@
+import numpy as np
+
+from kydxbot.metadata_filter import filter_mask, infer_filter, metadata_columns
+from kydxbot.vector_index import LocalIndex
+
+CATEGORIES = ["Jeans", "Outerwear & Coats", "Tops & Tees"]
+COUNTRIES = ["Australia", "United States"]
+
+
+def test_infer_filter_from_question_wording():
+    assert infer_filter("which customers return the most?") == {"source": "customer"}
+    assert infer_filter("best selling jeans", CATEGORIES, COUNTRIES) == {
+        "source": "product", "product_category": {"$in": ["Jeans"]},
+    }
+    assert infer_filter("Shoppers in Australia", CATEGORIES, COUNTRIES) == {
+        "source": "customer", "country": {"$in": ["Australia"]},
+    }
+    assert infer_filter("warehouse stock of products") == {
+        "source": {"$in": ["product", "distribution_center_inventory"]},
+    }
+    assert infer_filter("tell me something interesting", CATEGORIES, COUNTRIES) is None
+
+
+def test_filter_mask_operators():
+    meta = [
+        {"source": "customer", "country": "Australia"},
+        {"source": "product", "product_category": "Jeans"},
+        {"source": "customer", "country": "United States"},
+    ]
+    cols = metadata_columns(meta)
+    assert filter_mask(cols, {"source": "customer"}, 3).tolist() == [True, False, True]
+    assert filter_mask(cols, {"country": {"$in": ["Australia"]}}, 3).tolist() == [True, False, False]
+    assert filter_mask(cols, {"$and": [{"source": {"$eq": "customer"}}, {"country": "United States"}]}, 3).tolist() == [False, False, True]
+    assert not filter_mask(cols, {"unknown": 1}, 3).any()
+
+
+def test_local_index_scores_only_filtered_rows(monkeypatch):
+    idx = LocalIndex(path=None, dim=4)
+    idx.upsert(vectors=[
+        ("cust_1", [1, 0, 0, 0], {"source": "customer"}),
+        ("prod_1", [1, 0.1, 0, 0], {"source": "product"}),
+        ("prod_2", [0, 1, 0, 0], {"source": "product"}),
+    ])
+    scanned = []
+    real_scores = LocalIndex._scores
+    monkeypatch.setattr(LocalIndex, "_scores", staticmethod(lambda m, q, s=None: scanned.append(len(m)) or real_scores(m, q, s)))
+
+    res = idx.query(vector=[1, 0, 0, 0], top_k=5, filter={"source": "product"}, include_metadata=True)
+    assert [m.id for m in res.matches] == ["prod_1", "prod_2"]
+    assert scanned == [2]
+    assert idx.query(vector=[1, 0, 0, 0], top_k=5, filter={"source": "dc"}).matches == []
+
+    idx.upsert(vectors=[("prod_1", [1, 0, 0, 0], {"source": "customer"})])
+    res = idx.query(vector=[1, 0, 0, 0], top_k=5, filter={"source": "customer"})
+    assert sorted(m.id for m in res.matches) == ["cust_1", "prod_1"]
+
+
+def test_quantized_index_applies_filter_before_rerank():
+    idx = LocalIndex(path=None, dim=4, dtype="int8", rerank=1)
+    idx.upsert(vectors=[
+        ("cust_1", [1, 0, 0, 0], {"source": "customer"}),
+        ("prod_1", [0.9, 0.3, 0, 0], {"source": "product"}),
+    ])
+    res = idx.query(vector=np.array([1, 0, 0, 0]), top_k=1, filter={"source": "product"})
+    assert [m.id for m in res.matches] == ["prod_1"]
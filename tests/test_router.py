@@ -0,0 +1,85 @@
+import os
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import numpy as np
+import pytest
+
+from kydxbot.router import DATA_KEYWORDS, KeywordMatcher, QuestionModel, Router
+
+
+@pytest.fixture
+def questions(tmp_path):
+    path = tmp_path / "questions.txt"
+    path.write_text(
+        "Which regions are underperforming in terms of sales targets?\n"
+        "How is our customer retention rate trending?\n\n"
+        "What is the churn rate among subscribers?\n",
+        encoding="utf-8",
+    )
+    return path
+
+
+def test_model_is_fitted_once_then_memory_mapped(questions, tmp_path):
+    store = str(tmp_path / "router" / "tfidf")
+    fitted = QuestionModel(questions, store)
+    assert fitted.source == "fitted"
+    loaded = QuestionModel(questions, store)
+    assert loaded.source == "disk"
+    base = loaded.matrix.data
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert base is not None and not loaded.matrix.data.flags.writeable
+
+    question = "how is customer retention trending lately"
+    assert loaded.nearest(question) == pytest.approx(fitted.nearest(question))
+    nearest, score = loaded.nearest(question)
+    assert nearest == "How is our customer retention rate trending?" and score > 0.5
+
+    # Editing the questions invalidates the stored model
+    questions.write_text("What is the churn rate among subscribers?\n", encoding="utf-8")
+    assert QuestionModel(questions, store).source == "fitted"
+
+
+def test_missing_questions_file_never_matches(tmp_path):
+    model = QuestionModel(tmp_path / "missing.txt", None)
+    assert model.source == "empty"
+    assert model.nearest("anything") == (None, 0.0)
+
+
+def test_keywords_match_whole_words_only():
+    matcher = KeywordMatcher(["per", "top", "sum(", "the data"])
+    assert matcher.search("Sales per region") == "per"
+    assert matcher.search("What is the sum(total)?") == "sum("
+    assert matcher.search("Summarize the data") == "the data"
+    assert matcher.search("My laptop paper jam") is None
+
+    # Longer words are stems: their inflections still route to SQL
+    data = KeywordMatcher(DATA_KEYWORDS)
+    assert data.search("Show profits by category") == "profits"
+    assert data.search("What are the averages by region") == "averages"
+    assert data.search("profitability of each distribution center") == "profitability"
+    assert data.search("Any good topics for a paper?") is None
+
+
+def test_route_decisions_and_stats(questions):
+    router = Router(QuestionModel(questions, None), threshold=0.5)
+
+    decision = router.route("Where is the database file?")
+    assert (decision.route, decision.keyword) == ("db_path", "where is the database")
+
+    decision = router.route("Show me the top 10 customers by revenue")
+    assert (decision.route, decision.reason, decision.keyword) == ("data", "keyword", "top")
+
+    decision = router.route("churn rate among our subscribers")
+    assert (decision.route, decision.reason) == ("data", "preloaded")
+    assert decision.nearest == "What is the churn rate among subscribers?"
+
+    decision = router.route("Tell me about your return policy.")
+    assert decision.route == "other" and not decision.is_data
+
+    stats = router.stats()
+    assert stats["routed"] == 4 and stats["data:preloaded"] == 1 and stats["other"] == 1
+    assert stats["max_ms"] >= stats["avg_ms"] > 0
+    assert stats["recent"][-1]["route"] == "other"
+    assert "Tell me about your return policy." not in repr(stats)
@@ -0,0 +1,68 @@
+import os
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import duckdb
+import pytest
+
+from kydxbot.schema_context import SchemaContext
+
+
+@pytest.fixture
+def marts(tmp_path):
+    path = str(tmp_path / "marts.db")
+    con = duckdb.connect(path)
+    con.execute(
+        "CREATE TABLE customers (user_id INTEGER, customer_first_name VARCHAR,"
+        " customer_country VARCHAR, first_order TIMESTAMP, num_web_sessions BIGINT)"
+    )
+    con.execute(
+        "INSERT INTO customers SELECT i, 'name' || i,"
+        " CASE WHEN i % 3 = 0 THEN 'Brasil' ELSE 'China' END,"
+        " TIMESTAMP '2024-01-01' + INTERVAL (i) DAY, i * 2 FROM range(40) t(i)"
+    )
+    con.execute(
+        "CREATE TABLE products (product_id INTEGER, product_category VARCHAR, profit DECIMAL(10, 2))"
+    )
+    con.execute("INSERT INTO products VALUES (1, 'Jeans', 10.5), (2, 'Outerwear', 99.25)")
+    con.close()
+    return path
+
+
+def _context(path, version=lambda: "v1"):
+    return SchemaContext(
+        ["customers", "products"], connect=lambda: duckdb.connect(path), version=version
+    )
+
+
+def test_render_is_one_compact_line_per_table(marts):
+    text = _context(marts).render()
+    customers, products = text.splitlines()
+    assert customers.startswith("customers: user_id int [0..39], customer_first_name text (e.g. ")
+    assert "customer_country text ('China'|'Brasil')" in customers
+    assert "first_order timestamp [2024-01-01..2024-02-09]" in customers
+    assert products == (
+        "products: product_id int [1..2], product_category text ('Jeans'|'Outerwear'),"
+        " profit decimal [10.50..99.25]"
+    )
+
+
+def test_select_tables_by_name_column_or_value(marts):
+    ctx = _context(marts)
+    assert ctx.select_tables("Which customers have the most web sessions?") == ["customers"]
+    assert ctx.select_tables("total profit for Outerwear") == ["products"]
+    assert ctx.select_tables("how many people live in Brasil") == ["customers"]
+    assert ctx.select_tables("give me an overview") == ["customers", "products"]
+    assert ctx.render(["products"]).startswith("products:")
+    assert ctx.stats()["tables_sent"] == 1
+
+
+def test_snapshot_rebuilds_only_on_new_version(marts):
+    version = ["v1"]
+    ctx = _context(marts, version=lambda: version[0])
+    ctx.render()
+    ctx.select_tables("customers")
+    assert ctx.stats()["builds"] == 1
+    version[0] = "v2"
+    ctx.render()
+    assert ctx.stats()["builds"] == 2
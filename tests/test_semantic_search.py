@@ -0,0 +1,236 @@
+import os
+import threading
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import duckdb
+import pytest
+from sqlalchemy import create_engine
+
+from kydxbot import chatbot
+from kydxbot.dimension_cache import DimensionCache
+from kydxbot.lexical_index import LexicalIndex
+
+
+@pytest.fixture(autouse=True)
+def no_lexical_matches(monkeypatch):
+    empty = LexicalIndex(records=lambda: [], version=lambda: "v1")
+    monkeypatch.setattr(chatbot, "get_lexical_index", lambda: empty)
+
+
+@pytest.fixture
+def marts_db(tmp_path):
+    path = str(tmp_path / "marts.db")
+    con = duckdb.connect(path)
+    con.execute(
+        "CREATE TABLE customers (user_id INTEGER, customer_first_name VARCHAR,"
+        " customer_last_name VARCHAR, num_orders_cancelled INTEGER,"
+        " num_orders_returned INTEGER, num_web_sessions INTEGER)"
+    )
+    con.execute("INSERT INTO customers VALUES (1, 'Ada', 'Lovelace', 0, 1, 7), (2, 'Alan', 'Turing', 2, 0, 3)")
+    con.execute(
+        "CREATE TABLE products (product_id INTEGER, product_name VARCHAR,"
+        " product_category VARCHAR, sales_amount DOUBLE,"
+        " cost_of_goods_sold DOUBLE, profit DOUBLE)"
+    )
+    con.execute("INSERT INTO products VALUES (10, 'Chateau Jacket', 'Outerwear', 1000, 400, 600)")
+    con.execute(
+        "CREATE TABLE distribution_center_inventory (distribution_center_id INTEGER,"
+        " distribution_center_name VARCHAR, total_items INTEGER, items_sold INTEGER,"
+        " items_in_stock INTEGER, total_sales DOUBLE, total_inventory_cost DOUBLE)"
+    )
+    con.execute("INSERT INTO distribution_center_inventory VALUES (5, 'Memphis TN', 10, 4, 6, 250, 90)")
+    con.close()
+    return path
+
+
+class _Match(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+class _Index:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def query(self, **kwargs):
+        return {"matches": [_Match(id=i, score=1.0 - n / 10, metadata={}) for n, i in enumerate(self.ids)]}
+
+
+IDS = ["prod_10", "cust_2", "dc_5", "cust_1", "cust_99", "cust_x", "other"]
+
+
+def _check_lines(text):
+    lines = text.splitlines()
+    assert lines[0].startswith("Product 'Chateau Jacket' (ID 10)")
+    assert lines[1].startswith("Customer Alan Turing (ID 2)")
+    assert lines[2].startswith("Center 'Memphis TN' (ID 5)")
+    assert lines[3].startswith("Customer Ada Lovelace (ID 1)")
+    assert lines[4] == "Customer ID 99 not found (score=0.600)"
+    assert lines[5].startswith("Unparsable customer ID='cust_x'")
+    assert lines[6].startswith("(Match ID=other")
+
+
+def test_semantic_search_uses_dimension_cache(marts_db, monkeypatch):
+    cache = DimensionCache(connect=lambda: duckdb.connect(marts_db), version=lambda: "v1")
+    monkeypatch.setattr(chatbot, "get_dimension_cache", lambda: cache)
+    monkeypatch.setattr(chatbot, "index", _Index(IDS))
+
+    _check_lines(chatbot.handle_semantic_search("jackets", top_k=7))
+    _check_lines(chatbot.handle_semantic_search("jackets", top_k=7))
+    assert cache.loads == 3
+    usage = cache.memory_usage()
+    assert usage["customers"]["rows"] == 2
+    assert usage["products"]["bytes"] > 0
+
+
+def test_dimension_cache_reloads_on_new_version(marts_db):
+    version = ["v1"]
+    cache = DimensionCache(connect=lambda: duckdb.connect(marts_db), version=lambda: version[0])
+    assert cache.lookup("customers", [1], ["customer_first_name"]) == {1: ("Ada",)}
+    con = duckdb.connect(marts_db)
+    con.execute("UPDATE customers SET customer_first_name = 'Augusta' WHERE user_id = 1")
+    con.close()
+    assert cache.lookup("customers", [1], ["customer_first_name"]) == {1: ("Ada",)}
+    version[0] = "v2"
+    assert cache.lookup("customers", [1, 3], ["customer_first_name"]) == {1: ("Augusta",)}
+    assert cache.loads == 2
+
+
+def test_semantic_search_falls_back_to_batched_sql(marts_db, monkeypatch):
+    engine = create_engine(f"duckdb:///{marts_db}")
+    statements = []
+
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    monkeypatch.setattr(chatbot, "get_engine", lambda: engine)
+    monkeypatch.setattr(chatbot, "get_dimension_cache", lambda: None)
+    monkeypatch.setattr(chatbot, "index", _Index(IDS))
+
+    _check_lines(chatbot.handle_semantic_search("jackets", top_k=7))
+    selects = [s for s in statements if "WHERE" in s]
+    assert len(selects) == 3
+
+
+def test_as_embedding_validates_shape_and_values():
+    import numpy as np
+
+    from kydxbot.pinecone_utils import EMBEDDING_DIM, as_embedding
+
+    vec = as_embedding([0.5] * EMBEDDING_DIM)
+    assert vec.dtype == np.float32 and vec.shape == (EMBEDDING_DIM,)
+    with pytest.raises(ValueError):
+        as_embedding([0.5] * 3)
+    bad = [0.0] * EMBEDDING_DIM
+    bad[7] = float("nan")
+    with pytest.raises(ValueError):
+        as_embedding(bad)
+
+
+def test_semantic_search_queries_index_with_vector(monkeypatch):
+    seen = {}
+
+    class _Recorder:
+        def query(self, **kwargs):
+            seen.update(kwargs)
+            return {"matches": []}
+
+    monkeypatch.setattr(chatbot, "index", _Recorder())
+    assert chatbot.handle_semantic_search("jackets") == "No relevant customers or products found."
+    assert len(seen["vector"]) == 1536
+    assert all(type(x) is float for x in seen["vector"][:3])
+    assert "queries" not in seen
+
+
+CATALOG = [
+    ("prod_10", "Canada Goose Chateau Jacket category=Outerwear sales=$1000.00", {}),
+    ("prod_11", "Columbia Rain Jacket category=Outerwear sales=$80.00", {}),
+    ("prod_12", "Levi's 501 Jeans category=Jeans sales=$60.00", {}),
+    ("cust_1", "Ada Lovelace UK acquired_via=Search", {}),
+]
+
+
+def test_confident_lexical_match_skips_embedding(marts_db, monkeypatch):
+    lexical = LexicalIndex(records=lambda: CATALOG, version=lambda: "v1")
+    cache = DimensionCache(connect=lambda: duckdb.connect(marts_db), version=lambda: "v1")
+
+    def no_embedding(text):
+        raise AssertionError("embedding should be skipped")
+
+    monkeypatch.setattr(chatbot, "get_lexical_index", lambda: lexical)
+    monkeypatch.setattr(chatbot, "get_dimension_cache", lambda: cache)
+    monkeypatch.setattr(chatbot, "get_embedding", no_embedding)
+
+    reply = chatbot.handle_semantic_search("tell me about the Canada Goose Chateau jacket", top_k=1)
+    assert reply.startswith("Product 'Chateau Jacket' (ID 10)")
+    assert lexical.stats()["fast_path"] == 1
+
+
+def test_fusion_promotes_exact_name_matches():
+    lexical = LexicalIndex(records=lambda: CATALOG, version=lambda: "v1")
+    result = lexical.search("rain jacket")
+    assert not result.confident(confidence=0.99)
+
+    vector = [("prod_12", 0.82, {}), ("prod_10", 0.80, {}), ("prod_11", 0.79, {})]
+    fused = lexical.fuse(vector, result, top_k=2)
+    assert [doc_id for doc_id, _, _ in fused] == ["prod_11", "prod_10"]
+
+    nothing = lexical.search("zzz")
+    assert lexical.fuse(vector, nothing, top_k=2) == vector[:2]
+    assert lexical.stats()["fused"] == 1 and lexical.stats()["vector_only"] == 1
+
+
+def test_rebuild_runs_in_background_and_serves_previous_index():
+    version, gate = ["v1"], threading.Event()
+
+    def records():
+        if version[0] == "v1":
+            return CATALOG
+        gate.wait(5)
+        return CATALOG + [("prod_13", "Patagonia Fleece Vest category=Outerwear", {})]
+
+    lexical = LexicalIndex(records=records, version=lambda: version[0])
+    assert lexical.search("fleece vest").best == 0.0
+
+    # New data: the query does not wait for the rebuild
+    version[0] = "v2"
+    assert lexical.search("rain jacket").top(1)[0][0] == "prod_11"
+    assert lexical.stats()["rebuilding"]
+    gate.set()
+    for thread in threading.enumerate():
+        if thread.name == "kydxbot-lexical-build":
+            thread.join()
+    assert lexical.search("fleece vest").top(1)[0][0] == "prod_13"
+    stats = lexical.stats()
+    assert (stats["builds"], stats["background_builds"], stats["documents"]) == (2, 1, 5)
+
+
+def test_inferred_filter_is_pushed_into_index_query(monkeypatch):
+    seen = []
+
+    class _Recorder:
+        def query(self, **kwargs):
+            seen.append(kwargs.get("filter"))
+            return {"matches": []}
+
+    monkeypatch.setattr(chatbot, "index", _Recorder())
+    monkeypatch.setattr(chatbot, "get_dimension_cache", lambda: None)
+    chatbot.handle_semantic_search("which customers browse the most?")
+    # The inferred filter found nothing, so the search is retried unfiltered
+    assert seen == [{"source": "customer"}, None]
+
+    seen.clear()
+    chatbot.handle_semantic_search("anything", filter={"source": "product"})
+    assert seen == [{"source": "product"}]
+
+
+def test_lexical_search_honours_filter():
+    lexical = LexicalIndex(
+        records=lambda: [(i, t, {"source": "product" if i.startswith("prod") else "customer"}) for i, t, _ in CATALOG],
+        version=lambda: "v1",
+    )
+    unfiltered = lexical.search("Ada jacket")
+    filtered = lexical.search("Ada jacket", filter={"source": "customer"})
+    assert len(unfiltered.top(5)) > 1
+    assert filtered.top(5) == [("cust_1", pytest.approx(unfiltered.score("cust_1")))]
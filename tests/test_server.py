@@ -0,0 +1,50 @@
+import os
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+from fastapi.testclient import TestClient
+
+from kydxbot import server
+
+
+def _parse_sse(body: str) -> list[tuple[str, str]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], lines["data"]))
+    return events
+
+
+def test_chat_rejects_empty_query():
+    client = TestClient(server.app)
+    assert client.post("/chat", json={"query": "  "}).status_code == 400
+
+
+def test_chat_stream_emits_stages(monkeypatch):
+    def fake_handle_query(query, on_event=None, session_id=None):
+        on_event("routed", {"route": "fallback"})
+        on_event("token", {"text": "Hel"})
+        on_event("token", {"text": "lo"})
+        return "Hello"
+
+    monkeypatch.setattr(server, "handle_query", fake_handle_query)
+    client = TestClient(server.app)
+    resp = client.post("/chat/stream", json={"query": "hi"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    names = [name for name, _ in _parse_sse(resp.text)]
+    assert names == ["accepted", "routed", "token", "token", "done"]
+    assert '"Hello"' in _parse_sse(resp.text)[-1][1]
+
+
+def test_chat_returns_503_when_pool_full(monkeypatch):
+    from kydxbot import executor
+
+    def reject(endpoint):
+        raise executor.PoolFullError(endpoint, retry_after=7)
+
+    monkeypatch.setattr(executor, "_admit", reject)
+    client = TestClient(server.app)
+    resp = client.post("/chat", json={"query": "hi"})
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "7"
@@ -0,0 +1,101 @@
+import os
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from kydxbot.sql_cache import SqlCache
+
+# Stands in for the router's preloaded-question model
+VOCABULARY = TfidfVectorizer().fit([
+    "Which customers have the highest total revenue?",
+    "Who are the bottom customers by their revenue?",
+    "How many orders were returned or cancelled?",
+    "What is the total revenue of our products by month and by year?",
+    "How many customers and products do we have?",
+])
+
+
+def _cache(tmp_path=None, fingerprint="s1", valid=True, checked=None):
+    schema = {"fp": fingerprint}
+
+    def validate(sql):
+        if checked is not None:
+            checked.append(sql)
+        return valid
+
+    cache = SqlCache(
+        disk_path=tmp_path / "sql.sqlite" if tmp_path else None,
+        fingerprint=lambda: schema["fp"],
+        validate=validate,
+        vocabulary=lambda: VOCABULARY,
+    )
+    return cache, schema
+
+
+def test_exact_and_reworded_questions_hit():
+    cache, _ = _cache()
+    cache.put("Top 5 customers by total revenue?", "SELECT 5")
+    hit = cache.lookup("top 5 customers by total revenue")
+    assert hit.sql == "SELECT 5" and hit.exact
+
+    near = cache.lookup("The top 5 customers by total revenue")
+    assert near is not None and not near.exact and near.score >= cache.threshold
+    assert cache.lookup("average order value by month") is None
+    assert cache.stats()["exact_hits"] == 1 and cache.stats()["neighbour_hits"] == 1
+
+
+def test_different_numbers_never_share_sql():
+    cache, _ = _cache()
+    cache.put("top 5 customers by total revenue", "SELECT 5")
+    assert cache.lookup("top 10 customers by total revenue") is None
+
+
+def test_schema_change_revalidates_or_drops(tmp_path):
+    checked = []
+    cache, schema = _cache(checked=checked)
+    cache.put("how many customers", "SELECT COUNT(*) FROM customers")
+    schema["fp"] = "s2"
+    assert cache.lookup("how many customers") is not None
+    assert cache.lookup("how many customers") is not None
+    assert checked == ["SELECT COUNT(*) FROM customers"]
+    assert cache.stats()["revalidated"] == 1
+
+    broken, schema = _cache(tmp_path, valid=False)
+    broken.put("how many customers", "SELECT COUNT(*) FROM customers")
+    schema["fp"] = "s2"
+    assert broken.lookup("how many customers") is None
+    assert broken.stats()["invalidated"] == 1
+    reopened, _ = _cache(tmp_path)
+    assert reopened.lookup("how many customers") is None
+
+
+def test_entries_persist_on_disk(tmp_path):
+    cache, _ = _cache(tmp_path)
+    cache.put("how many products", "SELECT COUNT(*) FROM products")
+    reopened, _ = _cache(tmp_path)
+    assert reopened.lookup("How many products?").sql == "SELECT COUNT(*) FROM products"
+
+
+def test_neighbours_must_agree_on_meaning():
+    cache, _ = _cache()
+    cache.put("how many orders were returned", "SELECT returned")
+    cache.put("top 5 customers by total revenue", "SELECT top customers")
+    cache.put("what is the total revenue by month", "SELECT by month")
+    for question in (
+        "how many orders were not returned",  # negation
+        "bottom 5 customers by total revenue",  # direction
+        "top 5 products by total revenue",  # entity
+        "what is the total revenue by year",  # time grain
+        "how many orders were refunded",  # unseen word
+    ):
+        assert cache.lookup(question) is None, question
+    assert cache.lookup("how many orders were returned?").exact
+    assert cache.stats()["neighbour_hits"] == 0
+
+
+def test_without_a_vocabulary_only_exact_questions_hit():
+    cache = SqlCache(disk_path=None, fingerprint=lambda: "s1", vocabulary=lambda: None)
+    cache.put("top 5 customers by total revenue", "SELECT 5")
+    assert cache.lookup("Top 5 customers by total revenue?").exact
+    assert cache.lookup("top 5 customers by their total revenue") is None
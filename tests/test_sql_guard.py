@@ -0,0 +1,85 @@
+import os
+
+os.environ["KYDXBOT_TESTING"] = "1"
+
+import time
+
+import duckdb
+import pytest
+
+from kydxbot import db
+from kydxbot.sql_guard import SqlGuard, SqlRejected, apply_limit
+
+
+@pytest.fixture
+def events_db(monkeypatch):
+    con = duckdb.connect()
+    con.execute("CREATE TABLE raw_events AS SELECT i AS id, i % 100 AS user_id FROM range(200000) t(i)")
+    con.execute("CREATE TABLE users AS SELECT i AS user_id, 'u' || i AS name FROM range(100) t(i)")
+    monkeypatch.setattr(db, "_pool", db.DuckDBPool(connect=lambda: con))
+    return con
+
+
+def test_apply_limit_appends_or_lowers():
+    assert apply_limit("SELECT * FROM t;", 10) == "SELECT * FROM t\nLIMIT 10"
+    assert apply_limit("SELECT * FROM t LIMIT 5", 10) == "SELECT * FROM t LIMIT 5"
+    assert apply_limit("select * from t limit 500 offset 2", 10) == "select * from t limit 10 offset 2"
+
+
+def test_apply_limit_ignores_trailing_comments(events_db):
+    assert apply_limit("SELECT 1 LIMIT 5 -- top five", 10) == "SELECT 1 LIMIT 5"
+    assert apply_limit("SELECT 1 LIMIT 50 /* many */;\n-- done", 10) == "SELECT 1 LIMIT 10"
+    # Comment markers inside strings are not comments
+    assert apply_limit("SELECT '--' AS a, 'it''s -- /*' AS b", 10) == (
+        "SELECT '--' AS a, 'it''s -- /*' AS b\nLIMIT 10"
+    )
+    guard = SqlGuard()
+    result = guard.run(guard.check("SELECT * FROM users ORDER BY user_id LIMIT 5 -- top five"))
+    assert len(result) == 5 and guard.stats()["limited"] == 0
+
+
+def test_check_caps_rows_with_question_limit(events_db):
+    guard = SqlGuard()
+    guarded = guard.check("SELECT * FROM users ORDER BY user_id DESC", limit=3)
+    result = guard.run(guarded)
+    assert len(result) == 3 and result[0] == (99, "u99")
+    assert not result.truncated
+    assert len(guard.run(guard.check("SELECT * FROM raw_events"))) == guard.row_cap
+    assert guard.stats()["limited"] == 2
+
+
+def test_result_cut_by_row_cap_is_marked_truncated(events_db):
+    guard = SqlGuard(row_cap=100)
+    assert guard.run(guard.check("SELECT * FROM raw_events")).truncated
+    assert guard.run(guard.check("SELECT * FROM raw_events", limit=5000)).truncated
+    # The question's own N, the SQL's own smaller LIMIT, or fewer rows than the cap
+    assert not guard.run(guard.check("SELECT * FROM raw_events", limit=100)).truncated
+    assert not guard.run(guard.check("SELECT * FROM raw_events LIMIT 50")).truncated
+    assert not guard.run(guard.check("SELECT * FROM users WHERE user_id < 99")).truncated
+    assert guard.stats()["truncated"] == 2
+
+
+def test_only_single_select_is_allowed(events_db):
+    guard = SqlGuard()
+    for sql in ("DROP TABLE users", "SELECT 1; DELETE FROM users", "INSERT INTO users VALUES (1, 'x')"):
+        with pytest.raises(SqlRejected):
+            guard.check(sql)
+    assert events_db.execute("SELECT count(*) FROM users").fetchone() == (100,)
+    assert guard.stats()["rejected_statement"] == 3
+
+
+def test_exploding_join_is_rejected_before_running(events_db):
+    guard = SqlGuard(max_cardinality=1_000_000)
+    with pytest.raises(SqlRejected, match="rows"):
+        guard.check("SELECT * FROM raw_events a JOIN raw_events b ON a.user_id = b.user_id")
+    assert guard.check("SELECT count(*) FROM raw_events").estimated_rows <= 1_000_000
+    assert guard.stats()["rejected_plan"] == 1
+
+
+def test_slow_query_is_interrupted(events_db):
+    guard = SqlGuard(timeout=0.2, max_cardinality=10**15)
+    start = time.perf_counter()
+    with pytest.raises(SqlRejected, match="longer than"):
+        guard.run(guard.check("SELECT count(*) FROM range(100000000000) a"))
+    assert time.perf_counter() - start < 5
+    assert guard.stats()["timeouts"] == 1
@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from kydxbot.vector_index import LocalIndex, quantization_report
+
+
+def _vec(*head, dim=8):
+    v = np.zeros(dim, dtype=np.float32)
+    v[: len(head)] = head
+    return v
+
+
+def test_query_ranks_by_cosine_similarity():
+    idx = LocalIndex(path=None, dim=8)
+    idx.upsert(vectors=[
+        ("a", _vec(1, 0), {"source": "product"}),
+        ("b", _vec(1, 1), {"source": "customer"}),
+        {"id": "c", "values": _vec(0, 5).tolist()},
+    ])
+    res = idx.query(vector=_vec(2, 0), top_k=2, include_metadata=True)
+    assert [m.id for m in res.matches] == ["a", "b"]
+    assert res["matches"][0]["score"] == pytest.approx(1.0)
+    assert res.matches[1].metadata == {"source": "customer"}
+    assert res.matches[0].get("score") == res.matches[0].score
+
+
+def test_upsert_overwrites_and_delete_removes():
+    idx = LocalIndex(path=None, dim=8)
+    idx.upsert(vectors=[("a", _vec(1, 0), {}), ("b", _vec(0, 1), {})])
+    idx.upsert(vectors=[("a", _vec(0, 1), {"v": 2})])
+    assert idx.describe_index_stats()["total_vector_count"] == 2
+    idx.delete(ids=["b"])
+    res = idx.query(vector=_vec(0, 1), top_k=5, include_metadata=True)
+    assert [(m.id, m.metadata) for m in res.matches] == [("a", {"v": 2})]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_repeated_id_in_one_batch_keeps_the_last_copy(dtype):
+    idx = LocalIndex(path=None, dim=8, dtype=dtype)
+    idx.upsert(vectors=[("a", _vec(1, 0), {"v": 1}), ("a", _vec(0, 1), {"v": 2})])
+    res = idx.query(vector=_vec(0, 1), top_k=5, include_metadata=True)
+    assert [(m.id, m.metadata) for m in res.matches] == [("a", {"v": 2})]
+    assert res.matches[0].score == pytest.approx(1.0)
+
+
+def test_rejects_wrong_dimension():
+    idx = LocalIndex(path=None, dim=8)
+    with pytest.raises(ValueError):
+        idx.upsert(vectors=[("a", [1.0, 2.0], {})])
+    with pytest.raises(ValueError):
+        idx.query(vector=[1.0], top_k=1)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_persists_and_reloads_memory_mapped(tmp_path, dtype):
+    path = tmp_path / "vectors"
+    idx = LocalIndex(path=path, dim=8, dtype=dtype)
+    idx.upsert(vectors=[("a", _vec(1, 0), {"n": 1}), ("b", _vec(0, 1), {"n": 2})])
+    idx.save()
+
+    reopened = LocalIndex(path=path, dim=8)
+    assert isinstance(reopened._matrix, np.memmap)
+    assert reopened.dtype == np.dtype(dtype)
+    res = reopened.query(vector=_vec(0, 1), top_k=1, include_metadata=True)
+    assert res.matches[0].id == "b" and res.matches[0].metadata == {"n": 2}
+
+    # A save by another process is picked up on the next query
+    idx.upsert(vectors=[("c", _vec(0, 0, 1), {})])
+    idx.save()
+    assert reopened.query(vector=_vec(0, 0, 1), top_k=1).matches[0].id == "c"
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_batched_upserts_append_without_recopying(tmp_path, dtype):
+    path = tmp_path / "vectors"
+    idx = LocalIndex(path=path, dim=8, dtype=dtype)
+    idx.upsert(vectors=[("a", _vec(1, 0), {})])
+    idx.save()
+    stored = idx._matrix
+    assert isinstance(stored, np.memmap)
+
+    for i in range(5):
+        idx.upsert(vectors=[(f"n{i}", _vec(0, 1, i), {})])
+    # New rows wait in the buffer; the memory-mapped matrix is untouched
+    assert idx._matrix is stored and len(idx._pending) == 5
+
+    idx.upsert(vectors=[("n2", _vec(0, 0, 0, 1), {"v": 2})])  # a buffered row
+    idx.upsert(vectors=[("a", _vec(0, 0, 0, 0, 1), {"v": 1})])  # a mapped row
+    assert not isinstance(idx._matrix, np.memmap)
+    assert LocalIndex(path=path, dim=8).query(vector=_vec(1, 0), top_k=1).matches[0].id == "a"
+
+    assert idx.query(vector=_vec(0, 0, 0, 1), top_k=1).matches[0].id == "n2"
+    assert idx.query(vector=_vec(0, 0, 0, 0, 1), top_k=1).matches[0].score == pytest.approx(1.0)
+    assert idx.describe_index_stats()["total_vector_count"] == 6
+    idx.save()
+    reopened = LocalIndex(path=path, dim=8)
+    assert reopened.query(vector=_vec(0, 1, 4), top_k=1).matches[0].id == "n4"
+
+
+def _catalog(n=400, dim=64, seed=3):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(8, dim))
+    return (centers[rng.integers(0, 8, n)] + rng.normal(scale=0.7, size=(n, dim))).astype(np.float32)
+
+
+def test_int8_rerank_returns_exact_scores():
+    vectors = _catalog()
+    exact = LocalIndex(path=None, dim=64)
+    quantized = LocalIndex(path=None, dim=64, dtype="int8", rerank=5)
+    for idx in (exact, quantized):
+        idx.upsert(vectors=[(f"v{i}", v, {}) for i, v in enumerate(vectors)])
+
+    for q in vectors[:20]:
+        want = exact.query(vector=q, top_k=5).matches
+        got = quantized.query(vector=q, top_k=5).matches
+        assert [m.id for m in got] == [m.id for m in want]
+        assert [m.score for m in got] == pytest.approx([m.score for m in want], abs=1e-5)
+
+    stats = quantized.describe_index_stats()
+    assert stats["bytes"] < exact.describe_index_stats()["bytes"] / 3
+
+
+def test_quantization_report_measures_size_and_recall():
+    idx = LocalIndex(path=None, dim=64, dtype="int8")
+    idx.upsert(vectors=[(f"v{i}", v, {}) for i, v in enumerate(_catalog())])
+    report = quantization_report(idx, n_queries=30, top_k=5)
+    assert report["vectors"] == 400 and report["dtype"] == "int8"
+    assert report["compression"] > 3.5
+    assert report["recall@5_reranked"] == 1.0
+    assert report["recall@5"] <= report["recall@5_reranked"]
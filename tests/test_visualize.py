@@ -59,3 +59,14 @@ def test_generate_context_questions_fallback(monkeypatch):
     qs = generate_context_questions([{"sender": "user", "text": "Hello"}])
     assert qs[0].startswith("To create a visualization for you")
     assert len(qs) == 4
+
+
+def test_create_table_visual_from_query_result(tmp_path, monkeypatch):
+    import numpy as np
+
+    from ..db import QueryResult
+
+    monkeypatch.chdir(tmp_path)
+    result = QueryResult(["id", "name"], [np.arange(3), np.ma.masked_array(["a", "b", "c"], [0, 1, 0])])
+    path = create_table_visual(result, limit=2)
+    assert path.endswith(".png") and os.path.exists(path)
@@ -0,0 +1,494 @@
+from __future__ import annotations
+
+"""Embedded vector index with the same ``upsert``/``query`` calls as Pinecone.
+
+Vectors live in one row-per-id matrix that is L2-normalised on upsert, so a
+cosine query is a single matrix-vector product followed by ``argpartition``.
+For the catalog sizes we embed (thousands of customers, products and
+distribution centers) brute force is both exact and faster than any ANN
+structure.
+
+The index is persisted as ``<path>.npy`` (the matrix, opened with
+``mmap_mode="r"`` so every uvicorn worker shares the page cache) and
+``<path>.json`` (ids, metadata, dtype).  Workers notice a rewrite by another
+process and reload on their next query.  Select it with
+``KYDXBOT_VECTOR_BACKEND=local``; ``KYDXBOT_VECTOR_PATH`` and
+``KYDXBOT_VECTOR_DTYPE`` tune storage.
+
+With ``KYDXBOT_VECTOR_DTYPE=float16`` or ``int8`` (per-row symmetric scale,
+``<path>.scales.npy``) the scanned matrix is quantized, cutting resident
+memory 2× or 4×.  Full-precision rows are kept in ``<path>.full.npy``, which
+is memory-mapped but only touched to re-rank the best
+``KYDXBOT_VECTOR_RERANK × top_k`` candidates, so returned scores are exact.
+:func:`quantization_report` measures size and recall against a float32 scan.
+"""
+
+import atexit
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+if __package__:
+    from .metadata_filter import filter_mask, metadata_columns
+else:  # imported by ``python pinecone_utils.py``
+    from metadata_filter import filter_mask, metadata_columns
+
+VECTOR_PATH = os.getenv(
+    "KYDXBOT_VECTOR_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "vector_index"),
+)
+VECTOR_DTYPE = os.getenv("KYDXBOT_VECTOR_DTYPE", "float32")
+VECTOR_RERANK = int(os.getenv("KYDXBOT_VECTOR_RERANK", "10"))
+_DTYPES = ("float32", "float16", "int8")
+_CHUNK_ROWS = 256  # rows upcast at a time; small enough to stay in cache
+
+
+class Match(dict):
+    """One query hit; readable as ``m.id`` or ``m["id"]`` like Pinecone's."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class QueryResponse(dict):
+    @property
+    def matches(self) -> list[Match]:
+        return self["matches"]
+
+
+def _normalise(rows: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return rows / norms
+
+
+def _quantize(rows: np.ndarray, dtype: np.dtype) -> tuple[np.ndarray, np.ndarray | None]:
+    """Return ``rows`` stored as ``dtype`` plus per-row scales for int8."""
+    if dtype == np.int8:
+        scales = np.abs(rows).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        q = np.rint(rows / scales[:, None]).astype(np.int8)
+        return q, scales.astype(np.float32)
+    return rows.astype(dtype), None
+
+
+def _writable(arr: np.ndarray | None) -> np.ndarray | None:
+    return None if arr is None else np.array(arr)
+
+
+def _parse_vectors(vectors: Iterable) -> tuple[list[str], list, list[dict]]:
+    """Accept Pinecone's tuple ``(id, values, metadata)`` or dict forms."""
+    ids, values, metas = [], [], []
+    for item in vectors:
+        if isinstance(item, dict):
+            ids.append(str(item["id"]))
+            values.append(item["values"])
+            metas.append(dict(item.get("metadata") or {}))
+        else:
+            ids.append(str(item[0]))
+            values.append(item[1])
+            metas.append(dict(item[2]) if len(item) > 2 and item[2] else {})
+    return ids, values, metas
+
+
+class LocalIndex:
+    """Cosine-similarity index over an in-process (memory-mapped) matrix."""
+
+    def __init__(
+        self,
+        path: str | os.PathLike | None = VECTOR_PATH,
+        dim: int = 1536,
+        dtype: str = VECTOR_DTYPE,
+        rerank: int = VECTOR_RERANK,
+    ):
+        if dtype not in _DTYPES:
+            raise ValueError(f"unsupported vector dtype {dtype!r}")
+        self.path = Path(path) if path else None
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.rerank = max(rerank, 1)
+        self._lock = threading.RLock()
+        self._matrix = np.empty((0, dim), dtype=self.dtype)
+        # Per-row scales (int8 only) and full-precision rows (quantized only)
+        self._scales: np.ndarray | None = None
+        self._full: np.ndarray | None = None
+        self._reset_sidecars()
+        self._ids: list[str] = []
+        self._metadata: list[dict] = []
+        self._positions: dict[str, int] = {}
+        self._columns: dict[str, np.ndarray] | None = None
+        self._fingerprint: tuple | None = None
+        self._dirty = False
+        # Rows appended by upsert() since the matrices were last merged, as
+        # (stored, scales, full) chunks, and whether the matrices are private
+        # heap arrays (not memory-mapped) that may be written in place
+        self._pending: list[tuple] = []
+        self._owned = True
+        if self.path is not None:
+            self._load()
+            atexit.register(self.save)
+
+    @property
+    def quantized(self) -> bool:
+        return self.dtype != np.float32
+
+    def _reset_sidecars(self) -> None:
+        n = len(self._matrix)
+        self._scales = np.ones(n, dtype=np.float32) if self.dtype == np.int8 else None
+        self._full = np.empty((n, self.dim), dtype=np.float32) if self.quantized else None
+
+    # ── persistence ──────────────────────────────────────────────────────────
+    def _files(self) -> dict[str, Path]:
+        return {
+            "matrix": self.path.with_suffix(".npy"),
+            "scales": self.path.with_suffix(".scales.npy"),
+            "full": self.path.with_suffix(".full.npy"),
+            "meta": self.path.with_suffix(".json"),
+        }
+
+    def _stat(self) -> tuple | None:
+        try:
+            st = os.stat(self._files()["meta"])
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self) -> None:
+        files = self._files()
+        fingerprint = self._stat()
+        if fingerprint is None:
+            return
+        try:
+            meta = json.loads(files["meta"].read_text(encoding="utf-8"))
+            matrix = np.load(files["matrix"], mmap_mode="r")
+            dtype = np.dtype(meta.get("dtype", matrix.dtype.name))
+            scales = np.load(files["scales"]) if dtype == np.int8 else None
+            full = (
+                np.load(files["full"], mmap_mode="r")
+                if dtype != np.float32 and files["full"].exists()
+                else None
+            )
+        except Exception as e:  # noqa: BLE001
+            print("vector index load error", e)
+            return
+        n = len(meta["ids"])
+        if (
+            matrix.shape != (n, self.dim)
+            or (scales is not None and scales.shape != (n,))
+            or (full is not None and full.shape != (n, self.dim))
+        ):
+            # Caught between the file writes of a save; retry next query
+            return
+        self._matrix, self._scales, self._full = matrix, scales, full
+        self.dtype = dtype
+        self._ids = list(meta["ids"])
+        self._metadata = list(meta["metadata"])
+        self._positions = {vid: i for i, vid in enumerate(self._ids)}
+        self._columns = None
+        self._fingerprint = fingerprint
+        self._dirty = False
+        self._pending = []
+        self._owned = False
+
+    def _refresh(self) -> None:
+        """Reload if another process saved a newer copy since we last looked."""
+        if self.path is None or self._dirty:
+            return
+        if self._stat() != self._fingerprint:
+            self._load()
+
+    @staticmethod
+    def _write_npy(target: Path, arr: np.ndarray) -> None:
+        tmp = target.with_name(target.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(arr))
+        os.replace(tmp, target)
+
+    def _merge_pending(self) -> None:
+        """Append the rows buffered by :meth:`upsert` in one copy."""
+        if not self._pending:
+            return
+        stored, scales, full = zip(*self._pending)
+        self._matrix = np.concatenate([self._matrix, *stored])
+        if self._scales is not None:
+            self._scales = np.concatenate([self._scales, *scales])
+        if self._full is not None:
+            self._full = np.concatenate([self._full, *full])
+        self._pending = []
+        self._owned = True
+
+    def _make_writable(self) -> None:
+        """Copy memory-mapped matrices to the heap before changing a row."""
+        if self._owned:
+            return
+        self._matrix = np.array(self._matrix)
+        self._scales = _writable(self._scales)
+        self._full = _writable(self._full)
+        self._owned = True
+
+    def save(self) -> None:
+        """Write pending upserts/deletes to disk (atomically per file)."""
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+            self._merge_pending()
+            files = self._files()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._write_npy(files["matrix"], self._matrix)
+            if self._scales is not None:
+                self._write_npy(files["scales"], self._scales)
+            if self._full is not None:
+                self._write_npy(files["full"], self._full)
+            tmp_meta = files["meta"].with_name(files["meta"].name + ".tmp")
+            tmp_meta.write_text(
+                json.dumps(
+                    {"dtype": self.dtype.name, "ids": self._ids, "metadata": self._metadata}
+                ),
+                encoding="utf-8",
+            )
+            os.replace(tmp_meta, files["meta"])
+            self._fingerprint = self._stat()
+            self._dirty = False
+            # Re-open read-only so the heap copies made for writing can be freed
+            self._matrix = np.load(files["matrix"], mmap_mode="r")
+            if self._full is not None:
+                self._full = np.load(files["full"], mmap_mode="r")
+            self._owned = False
+
+    # ── Pinecone-compatible API ──────────────────────────────────────────────
+    def upsert(self, vectors: Iterable, **_) -> dict:
+        ids, values, metas = _parse_vectors(vectors)
+        if not ids:
+            return {"upserted_count": 0}
+        if len(set(ids)) != len(ids):
+            # The last copy of an id repeated within the batch wins
+            last = list({vid: i for i, vid in enumerate(ids)}.values())
+            ids = [ids[i] for i in last]
+            values = [values[i] for i in last]
+            metas = [metas[i] for i in last]
+        rows = np.asarray(values, dtype=np.float32)
+        if rows.ndim != 2 or rows.shape[1] != self.dim:
+            raise ValueError(f"vectors must have dimension {self.dim}, got {rows.shape}")
+        full = _normalise(rows).astype(np.float32)
+        stored, scales = _quantize(full, self.dtype)
+
+        with self._lock:
+            self._refresh()
+            # New rows are buffered and merged once, on the next query or
+            # save, so a batched ingest does not re-copy the matrix per batch
+            new_rows: list[int] = []
+            updates: list[tuple[int, int]] = []
+            for i, (vid, meta) in enumerate(zip(ids, metas)):
+                pos = self._positions.get(vid)
+                if pos is None:
+                    self._positions[vid] = len(self._ids)
+                    self._ids.append(vid)
+                    self._metadata.append(meta)
+                    new_rows.append(i)
+                else:
+                    self._metadata[pos] = meta
+                    updates.append((pos, i))
+            if updates:
+                if any(pos >= len(self._matrix) for pos, _ in updates):
+                    self._merge_pending()  # rewriting a row still in the buffer
+                self._make_writable()
+                pos, src = (np.array(x) for x in zip(*updates))
+                self._matrix[pos] = stored[src]
+                if self._scales is not None:
+                    self._scales[pos] = scales[src]
+                if self._full is not None:
+                    self._full[pos] = full[src]
+            if new_rows:
+                self._pending.append((
+                    stored[new_rows],
+                    scales[new_rows] if scales is not None else None,
+                    full[new_rows],
+                ))
+            self._dirty = True
+            self._columns = None
+        return {"upserted_count": len(ids)}
+
+    def delete(self, ids: Iterable[str] | None = None, delete_all: bool = False, **_) -> dict:
+        with self._lock:
+            self._refresh()
+            self._merge_pending()
+            if delete_all:
+                drop = set(range(len(self._ids)))
+            else:
+                drop = {self._positions[i] for i in (ids or ()) if i in self._positions}
+            if not drop:
+                return {}
+            keep = [i for i in range(len(self._ids)) if i not in drop]
+            self._matrix = np.array(self._matrix[keep])
+            if self._scales is not None:
+                self._scales = np.array(self._scales[keep])
+            if self._full is not None:
+                self._full = np.array(self._full[keep])
+            self._ids = [self._ids[i] for i in keep]
+            self._metadata = [self._metadata[i] for i in keep]
+            self._positions = {vid: i for i, vid in enumerate(self._ids)}
+            self._owned = True
+            self._dirty = True
+            self._columns = None
+        return {}
+
+    @staticmethod
+    def _scores(matrix: np.ndarray, q: np.ndarray, scales: np.ndarray | None = None) -> np.ndarray:
+        if matrix.dtype == np.float32:
+            return matrix @ q
+        # NumPy has no fast half-precision/int8 GEMV; upcast a chunk at a time
+        out = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), _CHUNK_ROWS):
+            chunk = matrix[start:start + _CHUNK_ROWS].astype(np.float32)
+            out[start:start + len(chunk)] = chunk @ q
+        if scales is not None:
+            out *= scales
+        return out
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def _filter_columns(self) -> dict[str, np.ndarray]:
+        """Column arrays of the filterable metadata fields (built on demand)."""
+        if self._columns is None:
+            self._columns = metadata_columns(self._metadata)
+        return self._columns
+
+    def query(
+        self,
+        vector=None,
+        top_k: int = 10,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        filter: dict | None = None,
+        rerank: bool = True,
+        **_,
+    ) -> QueryResponse:
+        """Return the ``top_k`` most similar vectors.
+
+        ``filter`` (Pinecone syntax, see :mod:`metadata_filter`) is applied
+        before scoring, so rows it excludes are never read or ranked.
+        """
+        q = np.asarray(vector, dtype=np.float32)
+        if q.shape != (self.dim,):
+            raise ValueError(f"query vector must have dimension {self.dim}, got {q.shape}")
+        q = _normalise(q)
+
+        with self._lock:
+            self._refresh()
+            self._merge_pending()
+            matrix, scales, full = self._matrix, self._scales, self._full
+            ids, metadata = self._ids, self._metadata
+            n = len(ids)
+            columns = self._filter_columns() if filter else None
+
+        if n == 0 or top_k <= 0:
+            return QueryResponse(matches=[])
+        rows = None
+        scan, scan_scales = matrix, scales
+        if filter:
+            rows = np.flatnonzero(filter_mask(columns, filter, n))
+            if not len(rows):
+                return QueryResponse(matches=[])
+            scan = matrix[rows]
+            scan_scales = scales[rows] if scales is not None else None
+
+        scores = self._scores(scan, q, scan_scales)
+        if full is not None and rerank:
+            # Exact scores for the best approximate candidates only (sorted so
+            # the memory-mapped full-precision rows are read in file order)
+            candidates = np.sort(self._top(scores, top_k * self.rerank))
+            if rows is not None:
+                candidates = rows[candidates]
+            exact = full[candidates] @ q
+            best = self._top(exact, top_k)
+            top, top_scores = candidates[best], exact[best]
+        else:
+            local = self._top(scores, top_k)
+            top = local if rows is None else rows[local]
+            top_scores = scores[local]
+
+        matches = []
+        for i, score in zip(top.tolist(), top_scores.tolist()):
+            match = Match(id=ids[i], score=float(score))
+            if include_metadata:
+                match["metadata"] = metadata[i]
+            if include_values:
+                source = full if full is not None else matrix
+                match["values"] = source[i].astype(np.float32).tolist()
+            matches.append(match)
+        return QueryResponse(matches=matches)
+
+    def describe_index_stats(self, **_) -> dict:
+        with self._lock:
+            self._refresh()
+            self._merge_pending()
+            resident = self._matrix.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+            return {
+                "dimension": self.dim,
+                "total_vector_count": len(self._ids),
+                "dtype": self.dtype.name,
+                "bytes": int(resident),
+                "full_precision_bytes": int(self._full.nbytes) if self._full is not None else 0,
+            }
+
+
+def quantization_report(
+    index: LocalIndex, n_queries: int = 100, top_k: int = 10, seed: int = 0
+) -> dict:
+    """Compare ``index`` (quantized) with an exact float32 scan of its vectors.
+
+    Queries are stored vectors sampled from the index itself, perturbed with
+    a little noise.  Reports the resident size of the quantized matrix and
+    recall@``top_k`` with and without the full-precision re-rank.
+    """
+    with index._lock:
+        index._refresh()
+        index._merge_pending()
+        full = index._full if index._full is not None else index._matrix
+        n = len(index._ids)
+    if n == 0:
+        return {"vectors": 0}
+    full = np.asarray(full, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(n, size=min(n_queries, n), replace=False)
+    queries = full[picks] + rng.normal(scale=0.01, size=(len(picks), index.dim)).astype(np.float32)
+
+    hits = {"approximate": 0, "reranked": 0}
+    k = min(top_k, n)
+    for q in queries:
+        truth = {index._ids[i] for i in LocalIndex._top(full @ _normalise(q), k).tolist()}
+        for mode, rerank in (("approximate", False), ("reranked", True)):
+            got = index.query(vector=q, top_k=k, rerank=rerank).matches
+            hits[mode] += len(truth & {m.id for m in got})
+
+    stats = index.describe_index_stats()
+    baseline = n * index.dim * 4
+    total = len(queries) * k
+    return {
+        "vectors": n,
+        "dtype": stats["dtype"],
+        "bytes": stats["bytes"],
+        "float32_bytes": baseline,
+        "compression": round(baseline / stats["bytes"], 2) if stats["bytes"] else None,
+        f"recall@{k}": round(hits["approximate"] / total, 4),
+        f"recall@{k}_reranked": round(hits["reranked"] / total, 4),
+    }
+
+
+__all__ = ["LocalIndex", "Match", "QueryResponse", "VECTOR_PATH", "quantization_report"]
+
+
+if __name__ == "__main__":
+    # Size / recall report for the configured local index
+    print(json.dumps(quantization_report(LocalIndex()), indent=2))
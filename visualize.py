@@ -6,7 +6,7 @@ from pathlib import Path
 import pandas as pd
 import matplotlib.pyplot as plt
 from openai import OpenAI
-from .db import get_engine
+from .db import QueryResult, get_engine
 from .chart_style import set_default_style
 
 set_default_style()
@@ -179,33 +179,46 @@ def create_matplotlib_visual(answers: list[str]) -> str:
 
 
 def create_table_visual(
-    rows: list[tuple],
+    rows: list[tuple] | QueryResult,
     limit: int | None = None,
     headers: list[str] | None = None,
     cell_char_limit: int = 20,
+    caption: str | None = None,
 ) -> str:
     """Create a table image from ``rows`` and return the path.
 
-    ``rows`` is a list of tuples representing table rows. Optional
-    ``headers`` may be provided to label the columns. When ``headers`` is
-    omitted or does not match the number of columns, generic labels are used.
-    The resulting PNG has a transparent background and subtle styling so it
-    can be displayed over any UI theme.
+    ``rows`` is a list of tuples representing table rows, or a columnar
+    :class:`db.QueryResult` whose column names become the default headers.
+    Optional ``headers`` may be provided to label the columns. When
+    ``headers`` is omitted or does not match the number of columns, generic
+    labels are used. The resulting PNG has a transparent background and
+    subtle styling so it can be displayed over any UI theme. ``caption`` is
+    drawn above the table.
     """
 
-    if not rows:
+    if not len(rows):
         return ""
 
-    display_rows = rows[:limit] if limit is not None else rows
-
     def _truncate(x: object) -> str:
         s = str(x)
         return s if len(s) <= cell_char_limit else s[: cell_char_limit - 1] + "\u2026"
 
-    # ``applymap`` is deprecated so use ``DataFrame.map`` for element-wise
-    # transformation across the entire DataFrame. This avoids the FutureWarning
-    # seen in tests and is slightly faster.
-    df = pd.DataFrame(display_rows).map(_truncate)
+    if isinstance(rows, QueryResult):
+        # Build the frame straight from the column arrays, no row tuples
+        # (tolist turns masked NULLs into None, as in the tuple rows)
+        df = pd.DataFrame({
+            i: pd.Series(col[:limit].tolist(), dtype=object)
+            for i, col in enumerate(rows.arrays)
+        }).map(_truncate)
+        if not headers or len(headers) != len(rows.columns):
+            headers = rows.columns
+        display_rows = None
+    else:
+        display_rows = rows[:limit] if limit is not None else rows
+        # ``applymap`` is deprecated so use ``DataFrame.map`` for element-wise
+        # transformation across the entire DataFrame. This avoids the FutureWarning
+        # seen in tests and is slightly faster.
+        df = pd.DataFrame(display_rows).map(_truncate)
 
     if headers and len(headers) == df.shape[1]:
         df.columns = headers
@@ -233,6 +246,8 @@ def create_table_visual(
         table.set_fontsize(14)
         table.scale(1, 1.4)
         table.auto_set_column_width(col=list(range(len(df.columns))))
+        if caption:
+            ax.set_title(caption, color="#e0e0e0", fontsize=12, loc="left")
 
         for (row, col), cell in table.get_celld().items():
             cell.set_edgecolor("#777777")